@@ -6,10 +6,8 @@ Simple script to populate CESM test database with test results.
 
 from standard_script_setup import *
 
-from CIME.XML.env_build             import EnvBuild
-from CIME.XML.env_case              import EnvCase
-from CIME.XML.env_test              import EnvTest
 from CIME.XML.test_reporter         import TestReporter
+from CIME.test_utils                import get_case_values, scan_test_dirs
 from CIME.utils                     import expect
 from CIME.XML.generic_xml import GenericXML
 
@@ -43,168 +41,163 @@ def parse_command_line(args):
     return args.testroot, args.testid, args.tagname, args.testtype, args.dryrun, args.dumpxml
 
 ###############################################################################
-def get_testreporter_xml(testroot, testid, tagname, testtype):
+def get_test_status(test_name):
 ###############################################################################
-    os.chdir(testroot)
+    """
+    Returns the results of test test_name for the test database, or None if
+    it has no TestStatus file
+    """
+    #
+    # Check to see if TestStatus is present, if not then skip the test
+    # I might want to set the status to fail
+    #
+    try:
+        with open(test_name+"/TestStatus") as fd:
+            lines = [line.rstrip('\n') for line in fd]
+    except (IOError, OSError):
+        return None
+    test_status={}
+    test_status['COMMENT']=""
+    test_status['BASELINE']='----'
+    test_status['MEMCOMP']='----'
+    test_status['MEMLEAK']='----'
+    test_status['NLCOMP']='----'
+    test_status['STATUS']='----'
+    test_status['TPUTCOMP']='----'
+    #
+    # Loop over each line of TestStatus, and check for different types of failures.
+    #
+    for line in lines:
+        if "NLCOMP" in line:
+            test_status['NLCOMP']=line[0:4]
+        if "MEMLEAK" in line:
+            test_status['MEMLEAK']=line[0:4]
+        if "MEMCOMP" in line:
+            test_status['MEMCOMP']=line[0:4]
+        if "BASELINE" in line:
+            test_status['BASELINE']=line[0:4]
+        if "TPUTCOMP" in line:
+            test_status['TPUTCOMP']=line[0:4]
+            if "FAIL PFS" in line:
+                test_status['STATUS']="FAIL"
+        if "INIT" in line:
+            test_status['INIT']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="SFAIL"
+                test_status['COMMENT']+="INIT fail! "
+                break
+        if "CREATE_NEWCASE" in line:
+            test_status['CREATE_NEWCASE']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="SFAIL"
+                test_status['COMMENT']+="CREATE_NEWCASE fail! "
+                break
+        if "XML" in line:
+            test_status['XML']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="SFAIL"
+                test_status['COMMENT']+="XML fail! "
+                break
+        if "SETUP" in line:
+            test_status['SETUP']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="SFAIL"
+                test_status['COMMENT']+="SETUP fail! "
+                break
+        if "SHAREDLIB_BUILD" in line:
+            test_status['SHAREDLIB_BUILD']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="CFAIL"
+                test_status['COMMENT']+="SHAREDLIB_BUILD fail! "
+                break
+        if "MODEL_BUILD" in line:
+            test_status['MODEL_BUILD']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['STATUS']="CFAIL"
+                test_status['COMMENT']+="MODEL_BUILD fail! "
+                break
+        if "SUBMIT" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="SUBMIT fail! "
+                break
+        if "RUN" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="RUN fail! "
+                break
+        if "COMPARE_base_rest" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="Restart fail! "
+                break
+        if "COMPARE_base_hybrid" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="Hybrid fail! "
+                break
+        if "COMPARE_base_multiinst" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="Multi instance fail! "
+                break
+        if "COMPARE_base_test" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="Base test fail! "
+                break
+        if "COMPARE_base_single_thread" in line:
+            test_status['STATUS']=line[0:4]
+            if line[0:4] in ("FAIL","PEND"):
+                test_status['COMMENT']+="Thread test fail! "
+                break
 
-    #
-    # Retrieve compiler name and mpi library
-    #
-    xml_file=glob.glob("*"+testid+"/env_build.xml")
-    expect(len(xml_file) > 0, "Tests not found.  It's possible your testid, {} is wrong.".format(testid))
-    envxml=(EnvBuild(".",infile=xml_file[0]))
-    compiler=envxml.get_value("COMPILER")
-    mpilib=envxml.get_value("MPILIB")
+        #
+        #  Do not include time comments.  Just a preference to have cleaner comments in the test database
+        #
+        try:
+            if 'time=' not in line and 'GENERATE' not in line:
+                if 'BASELINE' not in line:
+                    test_status['COMMENT']+=line.split(' ',3)[3]+' '
+                else:
+                    test_status['COMMENT']+=line.split(' ',4)[4]+' '
+        except Exception: # Probably want to be more specific here
+            pass
 
-    #
-    # Retrieve machine name
-    #
-    xml_file=glob.glob("*"+testid+"/env_case.xml")
-    envxml=(EnvCase(".",infile=xml_file[0]))
-    machine=envxml.get_value("MACH")
+    return test_status
+
+###############################################################################
+def get_testreporter_xml(testroot, testid, tagname, testtype):
+###############################################################################
+    os.chdir(testroot)
 
     #
-    # Retrieve baseline tag to compare to
+    # Retrieve compiler name, mpi library, machine name and baseline tag to
+    # compare to, reading the few values needed rather than opening a case
     #
-    xml_file=glob.glob("*"+testid+"/env_test.xml")
-    envxml=(EnvTest(".",infile=xml_file[0]))
-    baseline = envxml.get_value("BASELINE_NAME_CMP")
+    case_dirs=sorted(os.path.dirname(xml_file) for xml_file in glob.glob("*"+testid+"/env_case.xml"))
+    expect(len(case_dirs) > 0, "Tests not found.  It's possible your testid, {} is wrong.".format(testid))
+    values=get_case_values(case_dirs[0], ["COMPILER", "MPILIB", "MACH", "BASELINE_NAME_CMP"])
 
     #
     # Create XML header
     #
 
     testxml=TestReporter()
-    testxml.setup_header(tagname,machine,compiler,mpilib,testroot,testtype,baseline)
+    testxml.setup_header(tagname,values["MACH"],values["COMPILER"],values["MPILIB"],testroot,testtype,
+                         values["BASELINE_NAME_CMP"])
 
     #
     # Create lists on tests based on the testid in the testroot directory.
     #
-    test_names=glob.glob("*"+testid)
+    test_names=sorted(glob.glob("*"+testid))
     #
-    # Loop over all tests and parse the test results
+    # Parse the test results of all tests concurrently, the file system
+    # latency dominates
     #
-    test_status={}
-    for test_name in test_names:
-        if not os.path.isfile(test_name+"/TestStatus"):
+    for test_name, test_status in zip(test_names, scan_test_dirs(get_test_status, test_names)):
+        if test_status is None:
             continue
-        test_status['COMMENT']=""
-        test_status['BASELINE']='----'
-        test_status['MEMCOMP']='----'
-        test_status['MEMLEAK']='----'
-        test_status['NLCOMP']='----'
-        test_status['STATUS']='----'
-        test_status['TPUTCOMP']='----'
-        #
-        # Check to see if TestStatus is present, if not then continue
-        # I might want to set the status to fail
-        #
-        try:
-            lines = [line.rstrip('\n') for line in open(test_name+"/TestStatus")]
-        except (IOError, OSError):
-            test_status['STATUS']="FAIL"
-            test_status['COMMENT']="TestStatus missing. "
-            continue
-        #
-        # Loop over each line of TestStatus, and check for different types of failures.
-        #
-        for line in lines:
-            if "NLCOMP" in line:
-                test_status['NLCOMP']=line[0:4]
-            if "MEMLEAK" in line:
-                test_status['MEMLEAK']=line[0:4]
-            if "MEMCOMP" in line:
-                test_status['MEMCOMP']=line[0:4]
-            if "BASELINE" in line:
-                test_status['BASELINE']=line[0:4]
-            if "TPUTCOMP" in line:
-                test_status['TPUTCOMP']=line[0:4]
-                if "FAIL PFS" in line:
-                    test_status['STATUS']="FAIL"
-            if "INIT" in line:
-                test_status['INIT']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="SFAIL"
-                    test_status['COMMENT']+="INIT fail! "
-                    break
-            if "CREATE_NEWCASE" in line:
-                test_status['CREATE_NEWCASE']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="SFAIL"
-                    test_status['COMMENT']+="CREATE_NEWCASE fail! "
-                    break
-            if "XML" in line:
-                test_status['XML']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="SFAIL"
-                    test_status['COMMENT']+="XML fail! "
-                    break
-            if "SETUP" in line:
-                test_status['SETUP']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="SFAIL"
-                    test_status['COMMENT']+="SETUP fail! "
-                    break
-            if "SHAREDLIB_BUILD" in line:
-                test_status['SHAREDLIB_BUILD']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="CFAIL"
-                    test_status['COMMENT']+="SHAREDLIB_BUILD fail! "
-                    break
-            if "MODEL_BUILD" in line:
-                test_status['MODEL_BUILD']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['STATUS']="CFAIL"
-                    test_status['COMMENT']+="MODEL_BUILD fail! "
-                    break
-            if "SUBMIT" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="SUBMIT fail! "
-                    break
-            if "RUN" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="RUN fail! "
-                    break
-            if "COMPARE_base_rest" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="Restart fail! "
-                    break
-            if "COMPARE_base_hybrid" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="Hybrid fail! "
-                    break
-            if "COMPARE_base_multiinst" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="Multi instance fail! "
-                    break
-            if "COMPARE_base_test" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="Base test fail! "
-                    break
-            if "COMPARE_base_single_thread" in line:
-                test_status['STATUS']=line[0:4]
-                if line[0:4] in ("FAIL","PEND"):
-                    test_status['COMMENT']+="Thread test fail! "
-                    break
-
-            #
-            #  Do not include time comments.  Just a preference to have cleaner comments in the test database
-            #
-            try:
-                if 'time=' not in line and 'GENERATE' not in line:
-                    if 'BASELINE' not in line:
-                        test_status['COMMENT']+=line.split(' ',3)[3]+' '
-                    else:
-                        test_status['COMMENT']+=line.split(' ',4)[4]+' '
-            except Exception: # Probably want to be more specific here
-                pass
-
         #
         # Fill in the xml with the test results
         #
@@ -0,0 +1,150 @@
+"""
+Concurrent download of many files from one inputdata server.
+
+Files are collected first with add, which drops duplicates, then fetched by
+download using at most server.max_connections threads. Each thread gets its
+own server object from server.connect, so servers that support it keep a
+single connection open for all the files a thread downloads. Every file is
+downloaded to full_path.part and renamed into place once complete, so other
+cases never see a partial file; with resumable servers a .part file left by
+an interrupted download is continued rather than started over. The .part
+file is locked while it is downloaded so that processes fetching the same
+file at the same time (e.g. a background prefetch and a case submission)
+download it once.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.utils import flock_exclusive
+from multiprocessing.dummy import Pool as ThreadPool
+
+import threading, time
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = ".part"
+
+class DownloadManager(object):
+
+    def __init__(self, server, nthreads=None):
+        """
+        server is an object handle of type CIME.Servers, nthreads limits the
+        number of simultaneous downloads (default server.max_connections)
+        """
+        self._server = server
+        self._nthreads = max(1, min(nthreads or server.max_connections, server.max_connections))
+        self._downloads = [] # list of (rel_path, full_path)
+        self._queued = set()
+        self._local = None
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._downloads)
+
+    def add(self, rel_path, full_path):
+        """
+        Queue download of rel_path on the server to local file full_path,
+        returns False if full_path is already queued
+        """
+        if full_path in self._queued:
+            return False
+        self._queued.add(full_path)
+        self._downloads.append((rel_path, full_path))
+        return True
+
+    def download(self):
+        """
+        Download all queued files, returns a dict mapping full_path to True
+        if that file was downloaded successfully
+        """
+        if not self._downloads:
+            return {}
+
+        nthreads = min(self._nthreads, len(self._downloads))
+        logger.info("Downloading {:d} files using {} protocol with {:d} connections".
+                    format(len(self._downloads), type(self._server).__name__, nthreads))
+        start = time.time()
+        self._local = threading.local()
+        pool = ThreadPool(nthreads)
+        try:
+            results = pool.map(self._download_file, self._downloads)
+        finally:
+            pool.close()
+            pool.join()
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+
+        nbytes = sum(result[1] for result in results)
+        nfailed = len([result for result in results if not result[0]])
+        elapsed = time.time() - start
+        logger.info("Downloaded {:d} files ({:d} bytes) in {:.2f} seconds, {:.1f} MB/s, {:d} failed".
+                    format(len(results) - nfailed, nbytes, elapsed,
+                           nbytes / (1024. * 1024. * max(elapsed, 1e-6)), nfailed))
+
+        downloaded = dict((full_path, result[0]) for (_, full_path), result in zip(self._downloads, results))
+        self._downloads = []
+        self._queued = set()
+        return downloaded
+
+    def _get_session(self):
+        """
+        The server object of the calling thread
+        """
+        if not hasattr(self._local, "session"):
+            self._local.session = self._server.connect()
+            if self._local.session is not None and self._local.session is not self._server:
+                with self._lock:
+                    self._sessions.append(self._local.session)
+        return self._local.session
+
+    def _download_file(self, download):
+        """
+        Worker for download, returns (success, bytes downloaded)
+        """
+        rel_path, full_path = download
+        session = self._get_session()
+        if session is None:
+            logger.warning("Could not connect to server to download {}".format(rel_path))
+            return False, 0
+
+        dirname = os.path.dirname(full_path)
+        if dirname and not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # another thread may have created it
+                expect(os.path.isdir(dirname), "Could not create directory {}".format(dirname))
+
+        partial_path = full_path + PARTIAL_SUFFIX
+        with open(partial_path, "ab") as lock_fd:
+            flock_exclusive(lock_fd)
+            if os.path.isfile(full_path):
+                # Downloaded by another process while we waited for the lock
+                _remove_file(partial_path)
+                return True, 0
+
+            # Servers that cannot resume download to a file of their own,
+            # the partial file is then only used as a lock
+            download_path = partial_path if session.resumable else "{}.{:d}".format(partial_path, os.getpid())
+            if download_path != partial_path:
+                _remove_file(download_path)
+
+            logger.info("Trying to download file: '{}' to path '{}' using {} protocol.".format(rel_path, full_path, type(session).__name__))
+            if not session.getfile(rel_path, download_path) or not os.path.isfile(download_path):
+                if download_path != partial_path:
+                    _remove_file(download_path)
+                    _remove_file(partial_path)
+                elif os.path.isfile(partial_path) and os.path.getsize(partial_path) == 0:
+                    _remove_file(partial_path)
+                return False, 0
+
+            os.rename(download_path, full_path)
+            if download_path != partial_path:
+                _remove_file(partial_path)
+        return True, os.path.getsize(full_path)
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
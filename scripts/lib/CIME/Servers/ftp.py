@@ -13,6 +13,9 @@ logger = logging.getLogger(__name__)
 # I think that multiple inheritence would be useful here, but I couldnt make it work
 # in a py2/3 compatible way.
 class FTP(GenericServer):
+    max_connections = 4
+    resumable = True
+
     def __init__(self, address, user='', passwd='', server=None):
         if not user:
             user = ''
@@ -22,6 +25,8 @@ class FTP(GenericServer):
         root_address = address.split('/', 1)[1]
         self.ftp = server
         self._ftp_server = address
+        self._user = user
+        self._passwd = passwd
         stat = self.ftp.login(user, passwd)
         logger.debug("login stat {}".format(stat))
         if "Login successful" not in stat:
@@ -50,6 +55,29 @@ class FTP(GenericServer):
             return None
         return cls(address, user=user, passwd=passwd, server=ftp)
 
+    @classmethod
+    def ftp_connect(cls, address, user='', passwd='', timeout=60):
+        """
+        Same as ftp_login but usable outside of the main thread, where the
+        signal based Timeout is not available.
+        """
+        ftp_server = address.split('/', 1)[0]
+        try:
+            ftp = FTPpy(ftp_server, timeout=timeout)
+        except (socket.error, all_ftp_errors) as e:
+            logger.warning("ftp login failed! {} ".format(e))
+            return None
+        return cls(address, user=user, passwd=passwd, server=ftp)
+
+    def connect(self):
+        return FTP.ftp_connect(self._ftp_server, self._user, self._passwd)
+
+    def close(self):
+        try:
+            self.ftp.quit()
+        except all_ftp_errors:
+            self.ftp.close()
+
     def fileexists(self, rel_path):
         try:
             stat = self.ftp.nlst(rel_path)
@@ -64,9 +92,16 @@ class FTP(GenericServer):
         return True
 
     def getfile(self, rel_path, full_path):
+        # Continue a partial download of full_path if there is one
+        offset = os.path.getsize(full_path) if os.path.isfile(full_path) else 0
         try:
-            stat = self.ftp.retrbinary('RETR {}'.format(rel_path), open(full_path, "wb").write)
+            with open(full_path, "ab" if offset else "wb") as fd:
+                stat = self.ftp.retrbinary('RETR {}'.format(rel_path), fd.write, rest=offset or None)
         except all_ftp_errors:
+            if offset:
+                # The server may not support restarts, try again from the beginning
+                os.remove(full_path)
+                return self.getfile(rel_path, full_path)
             if os.path.isfile(full_path):
                 os.remove(full_path)
             logger.warning("ERROR from ftp server, trying next server")
@@ -10,6 +10,11 @@ from socket import _GLOBAL_DEFAULT_TIMEOUT
 logger = logging.getLogger(__name__)
 
 class GenericServer(object):
+    # Number of connections a DownloadManager may hold open to the server at once
+    max_connections = 1
+    # True if getfile continues a partially downloaded full_path rather than starting over
+    resumable = False
+
     def __init__(self, host=' ',user=' ', passwd=' ', acct=' ', timeout=_GLOBAL_DEFAULT_TIMEOUT):
         raise NotImplementedError
 
@@ -21,3 +26,12 @@ class GenericServer(object):
         ''' Get file from rel_path on server and place in location full_path on client
         fail if full_path already exists on client, return True if successful '''
         raise NotImplementedError
+
+    def connect(self):
+        ''' Return a server object that another thread may use for its downloads,
+        servers without connection state may return self '''
+        return self
+
+    def close(self):
+        ''' Close any connection held by this server object '''
+        pass
@@ -9,6 +9,8 @@ from CIME.utils import run_cmd
 logger = logging.getLogger(__name__)
 
 class GridFTP(GenericServer):
+    max_connections = 4
+
     def __init__(self, address, user='', passwd=''):
         self._root_address = address
 
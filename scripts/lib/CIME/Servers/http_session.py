@@ -0,0 +1,145 @@
+"""
+HTTP Server class.  Interact with a http or https server over a single persistent connection
+"""
+# pylint: disable=super-init-not-called
+from CIME.XML.standard_module_setup import *
+from CIME.Servers.generic_server import GenericServer
+from six.moves import http_client
+from six.moves.urllib.parse import urlparse, urljoin, quote
+
+import base64, socket, ssl
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK = 1024 * 1024
+_MAX_REDIRECTS = 5
+
+class HTTPSession(GenericServer):
+    """
+    Downloads files from the http(s) server at address over one keep-alive
+    connection, reopened as needed. Not thread safe, use connect to get a
+    session for each thread.
+    """
+    max_connections = 4
+    resumable = True
+
+    def __init__(self, address, user='', passwd='', timeout=60):
+        url = urlparse(address)
+        expect(url.scheme in ("http", "https"), "Unsupported url '{}' for http server".format(address))
+        self._address = address
+        self._user = user
+        self._passwd = passwd
+        self._timeout = timeout
+        self._scheme = url.scheme
+        self._netloc = url.netloc
+        self._root = url.path.rstrip("/")
+        self._headers = {}
+        if user or passwd:
+            credentials = "{}:{}".format(user or "", passwd or "").encode("utf-8")
+            self._headers["Authorization"] = "Basic {}".format(base64.b64encode(credentials).decode("ascii"))
+        self._conn = None
+
+    def connect(self):
+        return HTTPSession(self._address, user=self._user, passwd=self._passwd, timeout=self._timeout)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _new_connection(self, scheme, netloc):
+        if scheme == "https":
+            # Same as wget --no-check-certificate
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            return http_client.HTTPSConnection(netloc, timeout=self._timeout, context=context)
+        return http_client.HTTPConnection(netloc, timeout=self._timeout)
+
+    def _request(self, method, rel_path, headers=None):
+        """
+        Send a request for rel_path, following redirects, and return the response.
+        The body of the response must be read before the next request.
+        """
+        request_headers = dict(self._headers)
+        request_headers.update(headers or {})
+        scheme, netloc, path = self._scheme, self._netloc, quote("{}/{}".format(self._root, rel_path))
+        for _ in range(_MAX_REDIRECTS + 1):
+            if (scheme, netloc) == (self._scheme, self._netloc):
+                response = self._send(method, path, request_headers)
+            else:
+                # Redirected to another server, do not keep that connection
+                conn = self._new_connection(scheme, netloc)
+                conn.request(method, path, headers=request_headers)
+                response = conn.getresponse()
+
+            location = response.getheader("Location")
+            if response.status not in (301, 302, 303, 307, 308) or not location:
+                return response
+
+            response.read()
+            url = urlparse(urljoin("{}://{}{}".format(scheme, netloc, path), location))
+            scheme, netloc = url.scheme, url.netloc
+            path = url.path + ("?" + url.query if url.query else "")
+
+        expect(False, "Too many redirects for {}".format(rel_path), exc_type=http_client.HTTPException)
+
+    def _send(self, method, path, headers):
+        # The server may have closed the kept-alive connection since the
+        # last request, so retry once on a fresh connection
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = self._new_connection(self._scheme, self._netloc)
+            try:
+                self._conn.request(method, path, headers=headers)
+                return self._conn.getresponse()
+            except (http_client.HTTPException, socket.error):
+                self.close()
+                if attempt:
+                    raise
+
+    def fileexists(self, rel_path):
+        try:
+            response = self._request("HEAD", rel_path)
+            response.read()
+        except (http_client.HTTPException, socket.error) as e:
+            self.close()
+            logging.warning("FAIL: Repo '{}' does not have file '{}'\nReason:{}\n".format(self._address, rel_path, e))
+            return False
+
+        if response.status != 200:
+            logging.warning("FAIL: Repo '{}' does not have file '{}'\nReason:{} {}\n".format(self._address, rel_path, response.status, response.reason))
+            return False
+        return True
+
+    def getfile(self, rel_path, full_path):
+        # Continue a partial download of full_path if there is one
+        offset = os.path.getsize(full_path) if os.path.isfile(full_path) else 0
+        headers = {"Range" : "bytes={}-".format(offset)} if offset else {}
+        try:
+            response = self._request("GET", rel_path, headers)
+            if response.status == 416 and offset:
+                # full_path already holds the whole file
+                response.read()
+                return True
+            elif response.status == 206 and offset:
+                mode = "ab"
+            elif response.status == 200:
+                mode = "wb"
+            else:
+                response.read()
+                logging.warning("FAIL: Failed to retrieve file '{}' from repo '{}' status={} {}\n".
+                                format(rel_path, self._address, response.status, response.reason))
+                return False
+
+            with open(full_path, mode) as fd:
+                for data in iter(lambda: response.read(_READ_CHUNK), b""):
+                    fd.write(data)
+        except (http_client.HTTPException, socket.error) as e:
+            # Keep what was downloaded so a later attempt can resume
+            self.close()
+            logging.warning("FAIL: Failed to retrieve file '{}' from repo '{}' error={}\n".
+                            format(rel_path, self._address, e))
+            return False
+
+        return True
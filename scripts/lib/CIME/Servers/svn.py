@@ -8,6 +8,8 @@ from CIME.Servers.generic_server import GenericServer
 logger = logging.getLogger(__name__)
 
 class SVN(GenericServer):
+    max_connections = 4
+
     def __init__(self, address, user='', passwd=''):
         self._args = ''
         if user:
@@ -4,10 +4,18 @@ WGET Server class.  Interact with a server using WGET protocol
 # pylint: disable=super-init-not-called
 from CIME.XML.standard_module_setup import *
 from CIME.Servers.generic_server import GenericServer
+from CIME.Servers.http_session import HTTPSession
+try:
+    from CIME.Servers.ftp import FTP
+    has_ftp = True
+except ImportError:
+    has_ftp = False
 logger = logging.getLogger(__name__)
 
 
 class WGET(GenericServer):
+    max_connections = 4
+
     def __init__(self, address, user='', passwd=''):
         self._args = '--no-check-certificate '
         if user:
@@ -15,6 +23,8 @@ class WGET(GenericServer):
         if passwd:
             self._args += "--password {} ".format(passwd)
         self._server_loc = address
+        self._user = user
+        self._passwd = passwd
 
     @classmethod
     def wget_login(cls, address, user='', passwd=''):
@@ -36,6 +46,18 @@ class WGET(GenericServer):
 
         return cls(address, user=user, passwd=passwd)
 
+    def connect(self):
+        """
+        Rather than running one wget per file, threads downloading many files
+        keep a single connection open to http(s) and ftp servers.
+        """
+        scheme, _, location = self._server_loc.partition("://")
+        if scheme in ("http", "https"):
+            return HTTPSession(self._server_loc, user=self._user, passwd=self._passwd)
+        elif scheme == "ftp" and has_ftp:
+            return FTP.ftp_connect(location, user=self._user or "anonymous", passwd=self._passwd)
+        return self
+
     def fileexists(self, rel_path):
         full_url = os.path.join(self._server_loc, rel_path)
         stat, out, err = run_cmd("wget {} --spider {}".format(self._args, full_url))
@@ -9,9 +9,13 @@ from CIME.hist_utils import copy_histfiles, compare_test, generate_teststatus, \
     compare_baseline, get_ts_synopsis, generate_baseline
 from CIME.provenance import save_test_time, get_test_success
 from CIME.locked_files import LOCKED_DIR, lock_file, is_locked
+from CIME.cpl_log import get_cpl_log_summary, write_cpl_log_summary
+from CIME.throughput_history import get_throughput_history, add_throughput_sample, compare_throughput, \
+    DEFAULT_CONFIDENCE
+from CIME.get_timing import compare_timing_reports
 import CIME.build as build
 
-import glob, gzip, time, traceback, six
+import glob, json, time, traceback
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,7 @@ class SystemTestsCommon(object):
         self._old_build = False
         self._ninja     = False
         self._dry_run   = False
+        self._prefetch_inputdata = False
 
     def _init_environment(self, caseroot):
         """
@@ -70,7 +75,8 @@ class SystemTestsCommon(object):
 
             self._case.case_setup(reset=True, test_mode=True)
 
-    def build(self, sharedlib_only=False, model_only=False, old_build=False, ninja=False, dry_run=False):
+    def build(self, sharedlib_only=False, model_only=False, old_build=False, ninja=False, dry_run=False,
+              prefetch_inputdata=False):
         """
         Do NOT override this method, this method is the framework that
         controls the build phase. build_phase is the extension point
@@ -80,6 +86,7 @@ class SystemTestsCommon(object):
         self._old_build = old_build
         self._ninja     = ninja
         self._dry_run   = dry_run
+        self._prefetch_inputdata = prefetch_inputdata
         for phase_name, phase_bool in [(SHAREDLIB_BUILD_PHASE, not model_only),
                                        (MODEL_BUILD_PHASE, not sharedlib_only)]:
             if phase_bool:
@@ -128,7 +135,8 @@ class SystemTestsCommon(object):
         build.case_build(self._caseroot, case=self._case,
                          sharedlib_only=sharedlib_only, model_only=model_only,
                          save_build_provenance=not model=='cesm',
-                         use_old=self._old_build, ninja=self._ninja, dry_run=self._dry_run)
+                         use_old=self._old_build, ninja=self._ninja, dry_run=self._dry_run,
+                         prefetch_inputdata=self._prefetch_inputdata)
 
     def clean_build(self, comps=None):
         if comps is None:
@@ -156,6 +164,7 @@ class SystemTestsCommon(object):
                 self._phase_modifying_call(BASELINE_PHASE,   self._compare_baseline)
                 self._phase_modifying_call(MEMCOMP_PHASE,    self._compare_memory)
                 self._phase_modifying_call(THROUGHPUT_PHASE, self._compare_throughput)
+                self._phase_modifying_call(TIMECOMP_PHASE,   self._compare_timing)
 
             self._phase_modifying_call(MEMLEAK_PHASE, self._check_for_memleak)
 
@@ -280,16 +289,18 @@ class SystemTestsCommon(object):
     def _coupler_log_indicates_run_complete(self):
         newestcpllogfiles = self._get_latest_cpl_logs()
         logger.debug("Latest Coupler log file(s) {}" .format(newestcpllogfiles))
-        # Exception is raised if the file is not compressed
         allgood = len(newestcpllogfiles)
         for cpllog in newestcpllogfiles:
+            if not cpllog.endswith(".gz"):
+                logger.info("{} is not compressed, assuming run failed".format(cpllog))
+                continue
             try:
-                if six.b("SUCCESSFUL TERMINATION") in gzip.open(cpllog, 'rb').read():
+                if get_cpl_log_summary(cpllog)["successful"]:
                     allgood = allgood - 1
             except Exception as e: # Probably want to be more specific here
                 msg = e.__str__()
 
-                logger.info("{} is not compressed, assuming run failed {}".format(cpllog, msg))
+                logger.info("{} could not be read, assuming run failed {}".format(cpllog, msg))
 
         return allgood==0
 
@@ -342,17 +353,8 @@ class SystemTestsCommon(object):
         increases.
         """
         memlist = []
-        meminfo = re.compile(r".*model date =\s+(\w+).*memory =\s+(\d+\.?\d+).*highwater")
         if cpllog is not None and os.path.isfile(cpllog):
-            if '.gz' == cpllog[-3:]:
-                fopen = gzip.open
-            else:
-                fopen = open
-            with fopen(cpllog, "rb") as f:
-                for line in f:
-                    m = meminfo.match(line.decode('utf-8'))
-                    if m:
-                        memlist.append((float(m.group(1)), float(m.group(2))))
+            memlist = [tuple(record) for record in get_cpl_log_summary(cpllog)["memory"]]
         # Remove the last mem record, it's sometimes artificially high
         if len(memlist) > 0:
             memlist.pop()
@@ -364,11 +366,7 @@ class SystemTestsCommon(object):
         increases.
         """
         if cpllog is not None and os.path.isfile(cpllog):
-            with gzip.open(cpllog, "rb") as f:
-                cpltext = f.read().decode('utf-8')
-                m = re.search(r"# simulated years / cmp-day =\s+(\d+\.\d+)\s",cpltext)
-                if m:
-                    return float(m.group(1))
+            return get_cpl_log_summary(cpllog)["throughput"]
         return None
 
     def _phase_modifying_call(self, phase, function):
@@ -487,35 +485,106 @@ class SystemTestsCommon(object):
 
     def _compare_throughput(self):
         with self._test_status:
-            # compare memory usage to baseline
+            # compare throughput to the history of the baseline
             baseline_name = self._case.get_value("BASECMP_CASE")
             basecmp_dir = os.path.join(self._case.get_value("BASELINE_ROOT"), baseline_name)
             newestcpllogfiles = self._get_latest_cpl_logs()
             for cpllog in newestcpllogfiles:
+                baselog = None
+                logname = "{}.log".format(self._cpllog)
                 m = re.search(r"/({}.*.log).*.gz".format(self._cpllog), cpllog)
                 if m is not None:
+                    logname = m.group(1)
                     baselog = os.path.join(basecmp_dir, m.group(1))+".gz"
                 if baselog is None or not os.path.isfile(baselog):
                     # for backward compatibility
                     baselog = os.path.join(basecmp_dir, self._cpllog)
 
-                if os.path.isfile(baselog):
-                    # compare throughput to baseline
-                    current = self._get_throughput(cpllog)
+                samples = get_throughput_history(basecmp_dir, logname)
+                if not samples and os.path.isfile(baselog):
+                    # baseline generated before histories were kept, start one
                     baseline = self._get_throughput(baselog)
-                    #comparing ypd so bigger is better
-                    if baseline is not None and current is not None:
-                        diff = (baseline - current)/baseline
-                        tolerance = self._case.get_value("TEST_TPUT_TOLERANCE")
-                        if tolerance is None:
-                            tolerance = 0.1
-                        expect(tolerance > 0.0, "Bad value for throughput tolerance in test")
-                        if diff < tolerance and self._test_status.get_status(THROUGHPUT_PHASE) is None:
-                            self._test_status.set_status(THROUGHPUT_PHASE, TEST_PASS_STATUS)
-                        elif self._test_status.get_status(THROUGHPUT_PHASE) != TEST_FAIL_STATUS:
-                            comment = "Error: Computation time increase > {:d} pct from baseline".format(int(tolerance*100))
-                            self._test_status.set_status(THROUGHPUT_PHASE, TEST_FAIL_STATUS, comments=comment)
-                            append_testlog(comment, self._orig_caseroot)
+                    if baseline is not None:
+                        samples = [baseline]
+                        self._add_throughput_sample(basecmp_dir, logname, baseline, "generate")
+
+                current = self._get_throughput(cpllog)
+                #comparing ypd so bigger is better
+                if samples and current is not None:
+                    tolerance = self._case.get_value("TEST_TPUT_TOLERANCE")
+                    if tolerance is None:
+                        tolerance = 0.1
+                    expect(tolerance > 0.0, "Bad value for throughput tolerance in test")
+                    confidence = self._case.get_value("TEST_TPUT_CONFIDENCE")
+                    if confidence is None:
+                        confidence = DEFAULT_CONFIDENCE
+                    success, comment = compare_throughput(current, samples, tolerance, confidence)
+                    if comment is not None:
+                        append_testlog(comment, self._orig_caseroot)
+                    if success and self._test_status.get_status(THROUGHPUT_PHASE) is None:
+                        self._test_status.set_status(THROUGHPUT_PHASE, TEST_PASS_STATUS)
+                    elif not success and self._test_status.get_status(THROUGHPUT_PHASE) != TEST_FAIL_STATUS:
+                        self._test_status.set_status(THROUGHPUT_PHASE, TEST_FAIL_STATUS, comments=comment)
+
+                    if success:
+                        self._add_throughput_sample(basecmp_dir, logname, current, "compare")
+
+    def _compare_timing(self):
+        with self._test_status:
+            # compare the time of each component and timer to the baseline
+            baseline_name = self._case.get_value("BASECMP_CASE")
+            basecmp_dir = os.path.join(self._case.get_value("BASELINE_ROOT"), baseline_name)
+            tolerance = self._case.get_value("TEST_TPUT_TOLERANCE")
+            if tolerance is None:
+                tolerance = 0.1
+            expect(tolerance > 0.0, "Bad value for throughput tolerance in test")
+            for name, report in sorted(self._get_latest_timing_reports().items()):
+                basereport = os.path.join(basecmp_dir, name)
+                if not os.path.isfile(basereport):
+                    # baseline generated before timing reports were saved
+                    continue
+
+                with open(report, "r") as fd:
+                    current = json.load(fd)
+                with open(basereport, "r") as fd:
+                    baseline = json.load(fd)
+                success, regressions = compare_timing_reports(current, baseline, tolerance)
+                if regressions:
+                    append_testlog("{}: times increased > {:d} pct from baseline:\n  {}".
+                                   format(name, int(tolerance*100), "\n  ".join(regressions)), self._orig_caseroot)
+                if success and self._test_status.get_status(TIMECOMP_PHASE) is None:
+                    self._test_status.set_status(TIMECOMP_PHASE, TEST_PASS_STATUS)
+                elif not success and self._test_status.get_status(TIMECOMP_PHASE) != TEST_FAIL_STATUS:
+                    comment = "Error: Time increase > {:d} pct from baseline: {}".\
+                        format(int(tolerance*100), "; ".join(regressions[:3]))
+                    self._test_status.set_status(TIMECOMP_PHASE, TEST_FAIL_STATUS, comments=comment)
+
+    def _get_latest_timing_reports(self):
+        """
+        Returns name -> path of the json timing reports of the latest run, the
+        name drops the case and run id from the name of the report so that it
+        is the same for all runs (e.g. e3sm_timing_0001.json)
+        """
+        newestcpllogfiles = self._get_latest_cpl_logs()
+        if not newestcpllogfiles:
+            return {}
+
+        # coupler logs are named <cpl>.log.<lid>[.gz]
+        lid = os.path.basename(newestcpllogfiles[0]).split(".")[2]
+        suffix = ".{}.{}.json".format(self._case.get_value("CASE"), lid)
+        reports = glob.glob(os.path.join(self._case.get_value("CASEROOT"), "timing",
+                                         "{}_timing*{}".format(self._case.get_value("MODEL"), suffix)))
+        return dict((os.path.basename(report)[:-len(suffix)] + ".json", report) for report in reports)
+
+    def _add_throughput_sample(self, baseline_dir, logname, throughput, source):
+        """
+        Add throughput to the history of the baseline, baselines we cannot
+        write to (e.g. shared ones) are skipped
+        """
+        try:
+            add_throughput_sample(baseline_dir, logname, throughput, source)
+        except (IOError, OSError) as e:
+            logger.info("Could not update throughput history in {}: {}".format(baseline_dir, e))
 
     def _compare_baseline(self):
         """
@@ -551,6 +620,16 @@ class SystemTestsCommon(object):
                     baselog = os.path.join(basegen_dir, m.group(1))+".gz"
                     safe_copy(cpllog,
                               os.path.join(basegen_dir,baselog))
+                    # Save the summary with the baseline so comparisons
+                    # against it do not need to decompress the log
+                    summary = get_cpl_log_summary(cpllog)
+                    write_cpl_log_summary(baselog, summary)
+                    if summary["throughput"] is not None:
+                        self._add_throughput_sample(basegen_dir, m.group(1), summary["throughput"], "generate")
+
+            # copy the json timing reports of the run for the timing comparison
+            for name, report in self._get_latest_timing_reports().items():
+                safe_copy(report, os.path.join(basegen_dir, name))
 
 class FakeTest(SystemTestsCommon):
     """
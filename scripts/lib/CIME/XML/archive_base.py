@@ -58,11 +58,12 @@ class ArchiveBase(GenericXML):
             return self.text(node)
         return None
 
-    def get_latest_hist_files(self, casename, model, from_dir, suffix="", ref_case=None):
+    def get_latest_hist_files(self, casename, model, from_dir, suffix="", ref_case=None, filenames=None):
         """
         get the most recent history files in directory from_dir with suffix if provided
         """
-        test_hists = self.get_all_hist_files(casename, model, from_dir, suffix=suffix, ref_case=ref_case)
+        test_hists = self.get_all_hist_files(casename, model, from_dir, suffix=suffix, ref_case=ref_case,
+                                             filenames=filenames)
         latest_files = {}
         histlist = []
         for hist in test_hists:
@@ -73,10 +74,11 @@ class ArchiveBase(GenericXML):
             histlist.append(latest_files[key])
         return histlist
 
-    def get_all_hist_files(self, casename, model, from_dir, suffix="", ref_case=None):
+    def get_all_hist_files(self, casename, model, from_dir, suffix="", ref_case=None, filenames=None):
         """
         gets all history files in directory from_dir with suffix (if provided)
         ignores files with ref_case in the name if ref_case is provided
+        if filenames is provided, those names are searched instead of the contents of from_dir
         """
         dmodel = model
         if model == "cpl":
@@ -91,6 +93,9 @@ class ArchiveBase(GenericXML):
         else:
             has_suffix = False
 
+        if filenames is None:
+            filenames = os.listdir(from_dir)
+
         # Strip any trailing $ if suffix is present and add it back after the suffix
         for ext in extensions:
             if ext.endswith('$') and has_suffix:
@@ -102,7 +107,7 @@ class ArchiveBase(GenericXML):
 
             logger.debug ("Regex is {}".format(string))
             pfile = re.compile(string)
-            hist_files.extend([f for f in os.listdir(from_dir) if pfile.search(f) and ( (f.startswith(casename) or f.startswith(model)) and not f.endswith("cprnc.out") )])
+            hist_files.extend([f for f in filenames if pfile.search(f) and ( (f.startswith(casename) or f.startswith(model)) and not f.endswith("cprnc.out") )])
 
         if ref_case:
             expect(ref_case not in casename,"ERROR: ref_case name {} conflicts with casename {}".format(ref_case,casename))
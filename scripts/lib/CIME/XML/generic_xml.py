@@ -8,7 +8,7 @@ from CIME.utils import safe_copy
 import xml.etree.ElementTree as ET
 #pylint: disable=import-error
 from distutils.spawn import find_executable
-import getpass
+import getpass, json, tempfile
 import six
 from copy import deepcopy
 from collections import namedtuple
@@ -40,6 +40,11 @@ class GenericXML(object):
     DISABLE_CACHING = False
     CacheEntry = namedtuple("CacheEntry", ["tree", "root", "modtime"])
 
+    # Files that passed schema validation, with the size and modification
+    # time of the file and schema, remembered between runs so that unchanged
+    # files are not validated again
+    VALIDATION_CACHE = os.path.join(os.path.expanduser("~"), ".cime", "xml_validation_cache.json")
+
     @classmethod
     def invalidate(cls, filename):
         if filename in cls._FILEMAP:
@@ -540,11 +545,60 @@ class GenericXML(object):
         expect(os.path.isfile(schema),"schema file not found {}".format(schema))
         xmllint = find_executable("xmllint")
         if xmllint is not None:
+            stamp = self._get_validation_stamp(filename, schema)
+            validated = self._read_validation_cache()
+            if stamp is not None and validated.get(stamp[0]) == stamp[1:]:
+                logger.debug("File {} already checked against schema {}".format(filename, schema))
+                return
+
             logger.debug("Checking file {} against schema {}".format(filename, schema))
             run_cmd_no_fail("{} --xinclude --noout --schema {} {}".format(xmllint, schema, filename))
+            if stamp is not None:
+                validated[stamp[0]] = stamp[1:]
+                self._write_validation_cache(validated)
         else:
             logger.warning("xmllint not found, could not validate file {}".format(filename))
 
+    def _get_validation_stamp(self, filename, schema):
+        """
+        Returns [filename, schema, file size, file mtime, schema size, schema mtime]
+        or None if the validation of filename cannot be cached
+        """
+        if self.DISABLE_CACHING or not self.VALIDATION_CACHE:
+            return None
+        with open(filename, "rb") as fd:
+            # Changes to included files would not be noticed
+            if b"xi:include" in fd.read():
+                return None
+        file_stat = os.stat(filename)
+        schema_stat = os.stat(schema)
+        return [os.path.abspath(filename), os.path.abspath(schema),
+                file_stat.st_size, file_stat.st_mtime, schema_stat.st_size, schema_stat.st_mtime]
+
+    @classmethod
+    def _read_validation_cache(cls):
+        try:
+            with open(cls.VALIDATION_CACHE, "r") as fd:
+                return json.load(fd)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    @classmethod
+    def _write_validation_cache(cls, validated):
+        # Write to a temporary file and rename it so that processes validating
+        # at the same time never read a partial file, a failure to write only
+        # means that files are validated again next time
+        try:
+            cache_dir = os.path.dirname(cls.VALIDATION_CACHE)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".xml_validation_cache")
+            with os.fdopen(fd, "w") as tmp_fd:
+                json.dump(validated, tmp_fd)
+            os.rename(tmp_path, cls.VALIDATION_CACHE)
+        except (IOError, OSError) as e:
+            logger.debug("Could not write {}: {}".format(cls.VALIDATION_CACHE, e))
+
     def get_raw_record(self, root=None):
         logger.debug("writing file {}".format(self.filename))
         if root is None:
@@ -12,6 +12,7 @@ This module contains only one class, `NamelistDefinition`, inheriting from
 
 import re
 import collections
+from collections import namedtuple
 
 from CIME.namelist import fortran_namelist_base_value, \
     is_valid_fortran_namelist_literal, character_literal_to_string, \
@@ -69,6 +70,13 @@ class NamelistDefinition(EntryID):
     - validate
     """
 
+    # The entry data computed by set_nodes, shared by all definitions of the
+    # same file in this process (e.g. every instance of a multi-instance
+    # component). Maps (infile, skip_groups) to a NodeCacheEntry, which is
+    # only used while the file's xml tree is the one cached by GenericXML.
+    _NODE_CACHE = {}
+    NodeCacheEntry = namedtuple("NodeCacheEntry", ["root", "entries", "default_nodes"])
+
     def __init__(self, infile, files=None):
         """Construct a `NamelistDefinition` from an XML file."""
 
@@ -94,32 +102,35 @@ class NamelistDefinition(EntryID):
         populates the object data types for all nodes that are not part of the skip_groups array
         returns nodes that do not have attributes of `skip_default_entry` or `per_stream_entry`
         """
-        default_nodes = []
-        for node in self.get_children("entry"):
-            name = self.get(node, "id")
-            skip_default_entry = self.get(node, "skip_default_entry") == "true"
-            per_stream_entry = self.get(node, "per_stream_entry") == "true"
-            set_node_values = False
-            if skip_groups:
+        key = (self.filename, tuple(sorted(skip_groups)) if skip_groups else None)
+        cached = self._NODE_CACHE.get(key)
+        if self.DISABLE_CACHING or cached is None or cached.root != self.root:
+            entries = []
+            default_nodes = []
+            for node in self.get_children("entry"):
+                name = self.get(node, "id")
                 group_name = self._get_group_name(node)
-                if not group_name in skip_groups:
-                    self._entry_nodes.append(node)
-                    set_node_values = True
-                    if not skip_default_entry and not per_stream_entry:
-                        default_nodes.append(node)
-            else:
-                self._entry_nodes.append(node)
-                set_node_values = True
+                if skip_groups and group_name in skip_groups:
+                    continue
+                entries.append((name, node, self._get_type(node), self._get_valid_values(node), group_name))
+                skip_default_entry = self.get(node, "skip_default_entry") == "true"
+                per_stream_entry = self.get(node, "per_stream_entry") == "true"
                 if not skip_default_entry and not per_stream_entry:
                     default_nodes.append(node)
-            if set_node_values:
+            cached = self.NodeCacheEntry(self.root, entries, default_nodes)
+            self._NODE_CACHE[key] = cached
+
+        for name, node, type_info, valid_values, group_name in cached.entries:
+            # Entries set by an earlier call (e.g. for the previous instance)
+            # are not added again
+            if name not in self._nodes:
                 self._entry_nodes.append(node)
                 self._entry_ids.append(name)
-                self._nodes[name] = node
-                self._entry_types[name] = self._get_type(node)
-                self._valid_values[name] = self._get_valid_values(node)
-                self._group_names[name] = self._get_group_name(node)
-        return default_nodes
+            self._nodes[name] = node
+            self._entry_types[name] = type_info
+            self._valid_values[name] = valid_values
+            self._group_names[name] = group_name
+        return list(cached.default_nodes)
 
     def _get_group_name(self, node=None):
         if self.get_version() == 1.0:
@@ -339,7 +350,7 @@ class NamelistDefinition(EntryID):
         """Used to get a better error message for an unexpected variable.
              case insensitve match"""
 
-        expect(name in self._entry_ids,
+        expect(name in self._nodes,
                (variable_template + " is not in the namelist definition.").format(str(name)))
 
     def _user_modifiable_in_variable_definition(self, name):
@@ -0,0 +1,277 @@
+"""
+Content-addressed storage of baseline history files.
+
+Most history files of a new baseline are identical to the files of the
+baseline it replaces or of the baselines of other branches. With
+BASELINE_OBJECT_STORE, baseline generation stores each history file once in
+BASELINE_ROOT/.objects, named after its md5 checksum (the one already
+recorded in the baseline manifest, see hist_hash), and the manifest of the
+baseline references the stored object instead of keeping a copy of the file.
+Identical files are then stored once across all baselines, tagging a
+baseline from another only copies its manifest and small files, and
+comparisons resolve the baseline files through the manifest.
+
+Objects are never modified once stored. Objects no longer referenced by any
+manifest are removed by collect_garbage, unless they were used recently.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.hist_hash import BASELINE_MANIFEST_NAME, get_file_md5, is_stored_elsewhere, \
+    read_baseline_manifest, write_baseline_manifest
+from CIME.utils import safe_copy, SharedArea
+
+import errno, fcntl, shutil, stat, threading, time
+
+logger = logging.getLogger(__name__)
+
+BASELINE_OBJECTS_DIR = ".objects"
+
+# Objects younger than this are not garbage collected: their manifest may
+# still be being written
+DEFAULT_GC_MIN_AGE = 24 * 3600
+
+# Suffix of the stamp recording the use of an object by a user who cannot
+# touch the object itself
+_USED_SUFFIX = ".used"
+
+# Linux ioctl making a file share the data of another file (a reflink)
+_FICLONE = 0x40049409
+
+def clone_file(src_path, tgt_path):
+    """
+    Copy src_path to tgt_path, which must not exist. Where the file system
+    supports it (e.g. btrfs or xfs) the copy is a reflink: it shares the
+    data of src_path until either file is modified, so no data is copied.
+    Otherwise this is a regular copy.
+
+    Unlike a hard link, a reflink is safe when the model later rewrites the
+    file in the run directory in place.
+    """
+    try:
+        with open(src_path, "rb") as src_fd:
+            with open(tgt_path, "wb") as tgt_fd:
+                fcntl.ioctl(tgt_fd.fileno(), _FICLONE, src_fd.fileno())
+        return
+    except (IOError, OSError):
+        if os.path.exists(tgt_path):
+            os.remove(tgt_path)
+
+    safe_copy(src_path, tgt_path, preserve_meta=False)
+
+def get_object_store(baseline_root):
+    return os.path.join(os.path.abspath(baseline_root), BASELINE_OBJECTS_DIR)
+
+def get_baseline_root(baseline_dir):
+    """
+    Returns the root of baseline_dir, the baselines of a test in
+    <baseline root>/<baseline name>/<test>. Objects must be stored there for
+    collect_garbage on that root to see the manifests referencing them.
+
+    >>> get_baseline_root("/baselines/master/ERS.f19_g16.A.mach_gnu")
+    '/baselines'
+    """
+    return os.path.dirname(os.path.dirname(os.path.abspath(baseline_dir)))
+
+def _get_object_file(store_dir, md5):
+    """
+    >>> _get_object_file("/baselines/.objects", "0123abcd")
+    '/baselines/.objects/01/0123abcd'
+    """
+    return os.path.join(store_dir, md5[:2], md5)
+
+def add_object(store_dir, filepath, md5):
+    """
+    Store filepath, whose checksum is md5, in store_dir unless an identical
+    file is already stored there. Returns the path of the stored object.
+    """
+    object_file = _get_object_file(store_dir, md5)
+    if os.path.exists(object_file):
+        # Keep it from being collected before the manifest referencing it is written
+        _touch_object(object_file)
+        return object_file
+
+    object_dir = os.path.dirname(object_file)
+    if not os.path.isdir(object_dir):
+        try:
+            os.makedirs(object_dir)
+        except OSError:
+            # created concurrently by another generation
+            expect(os.path.isdir(object_dir), "Could not create object store directory {}".format(object_dir))
+
+    # Concurrent generations of identical files each write their own temporary
+    # file, the first rename wins and the others replace it by the same content
+    tmp_file = "{}.tmp.{:d}.{:d}".format(object_file, os.getpid(), threading.current_thread().ident)
+    clone_file(filepath, tmp_file)
+    mode = os.stat(tmp_file).st_mode
+    os.chmod(tmp_file, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+    os.rename(tmp_file, object_file)
+    return object_file
+
+def _touch_object(object_file):
+    """
+    Record that object_file was just used. Only its owner may touch a
+    read-only object, anyone else touches a group writable stamp next to it.
+    """
+    try:
+        os.utime(object_file, None)
+        return
+    except OSError as e:
+        if e.errno not in (errno.EACCES, errno.EPERM):
+            raise
+
+    try:
+        with SharedArea():
+            with open(object_file + _USED_SUFFIX, "a"):
+                pass
+        os.utime(object_file + _USED_SUFFIX, None)
+    except (IOError, OSError) as e:
+        logger.warning("Could not record the use of {}, it may be collected before it is referenced: {}".
+                       format(object_file, e))
+
+def _get_last_use(object_file):
+    """
+    Time object_file was last stored or used
+    """
+    last_use = os.path.getmtime(object_file)
+    if os.path.exists(object_file + _USED_SUFFIX):
+        last_use = max(last_use, os.path.getmtime(object_file + _USED_SUFFIX))
+    return last_use
+
+def copy_baseline_dir(src_dir, tgt_dir):
+    """
+    Copy baseline directory src_dir to tgt_dir, which must not exist.
+    History files are hard links to the files of src_dir: baseline
+    generation replaces them rather than writing to them. Everything else is
+    copied, since it may be updated in place. Symbolic links are kept as links.
+    Object references stay valid as long as tgt_dir is as deep in the
+    baseline root as src_dir.
+    """
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        tgt_dirpath = os.path.normpath(os.path.join(tgt_dir, os.path.relpath(dirpath, src_dir)))
+        os.makedirs(tgt_dirpath)
+        for name in list(dirnames) + filenames:
+            src_path = os.path.join(dirpath, name)
+            tgt_path = os.path.join(tgt_dirpath, name)
+            if os.path.islink(src_path):
+                os.symlink(os.readlink(src_path), tgt_path)
+            elif name in filenames:
+                if name.endswith(".nc"):
+                    try:
+                        os.link(src_path, tgt_path)
+                        continue
+                    except OSError:
+                        # e.g. hard links to files of other users may not be allowed
+                        pass
+                shutil.copy2(src_path, tgt_path)
+
+        # Symbolic links to directories were copied as links, do not walk them
+        dirnames[:] = [name for name in dirnames if not os.path.islink(os.path.join(dirpath, name))]
+
+def tag_baselines(baseline_root, src_name, tgt_name, allow_overwrite=False):
+    """
+    Make baselines tgt_name (e.g. a release tag) a copy of baselines src_name
+    (e.g. master). History files in the object store are not copied, only
+    the manifests referencing them, so this only copies metadata for object
+    store baselines.
+    """
+    expect(src_name != tgt_name, "Cannot tag baselines {} as themselves".format(src_name))
+    src_dir = os.path.join(baseline_root, src_name)
+    tgt_dir = os.path.join(baseline_root, tgt_name)
+    expect(os.path.isdir(src_dir), "No baselines {}".format(src_dir))
+    # Both must be as deep in the baseline root for the object references to stay valid
+    expect(os.path.dirname(os.path.normpath(src_name)) == os.path.dirname(os.path.normpath(tgt_name)),
+           "Baselines {} and {} must be in the same directory".format(src_name, tgt_name))
+    expect(allow_overwrite or not os.path.exists(tgt_dir),
+           "Cowardly refusing to overwrite existing baselines {}".format(tgt_dir))
+
+    tmp_dir = "{}.tag.{:d}".format(tgt_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    copy_baseline_dir(src_dir, tmp_dir)
+
+    old_dir = None
+    if os.path.exists(tgt_dir):
+        old_dir = "{}.old.{:d}".format(tgt_dir, os.getpid())
+        os.rename(tgt_dir, old_dir)
+    os.rename(tmp_dir, tgt_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+def store_baseline_dir(baseline_dir, store_dir):
+    """
+    Move the history files of baseline_dir recorded in its manifest into
+    the object store store_dir. Returns the number of files moved.
+    """
+    manifest = read_baseline_manifest(baseline_dir)
+    stored = []
+    for name, entry in sorted(manifest.items()):
+        filepath = os.path.join(baseline_dir, name)
+        if is_stored_elsewhere(manifest, name) or not os.path.isfile(filepath):
+            continue
+
+        # The recorded checksum may be stale if the file was replaced since
+        md5 = get_file_md5(filepath)
+        if md5 != entry.get("md5"):
+            logger.warning("Checksum of {} does not match its manifest, skipping it".format(filepath))
+            continue
+
+        object_file = add_object(store_dir, filepath, md5)
+        entry.pop("mtime", None)
+        entry["object"] = os.path.relpath(object_file, baseline_dir)
+        stored.append(filepath)
+
+    if stored:
+        # The manifest must reference the objects before the files are removed
+        write_baseline_manifest(baseline_dir, manifest)
+        for filepath in stored:
+            os.remove(filepath)
+
+    return len(stored)
+
+def get_referenced_objects(baseline_root):
+    """
+    Returns the set of the paths of all objects referenced by the manifests
+    of the baselines in baseline_root
+    """
+    store_dir = get_object_store(baseline_root)
+    referenced = set()
+    for dirpath, dirnames, filenames in os.walk(os.path.dirname(store_dir)):
+        if dirpath == os.path.dirname(store_dir) and BASELINE_OBJECTS_DIR in dirnames:
+            dirnames.remove(BASELINE_OBJECTS_DIR)
+        if BASELINE_MANIFEST_NAME in filenames:
+            for entry in read_baseline_manifest(dirpath).values():
+                if "object" in entry:
+                    referenced.add(os.path.normpath(os.path.join(dirpath, entry["object"])))
+
+    return set(path for path in referenced if path.startswith(store_dir + os.sep))
+
+def collect_garbage(baseline_root, min_age=DEFAULT_GC_MIN_AGE, dry_run=False):
+    """
+    Remove the objects of the object store of baseline_root that no manifest
+    references and that are older than min_age seconds. Returns the paths of
+    the objects removed (or that would be, if dry_run).
+    """
+    store_dir = get_object_store(baseline_root)
+    if not os.path.isdir(store_dir):
+        return []
+
+    referenced = get_referenced_objects(baseline_root)
+    cutoff = time.time() - min_age
+    removed = []
+    for dirpath, _, filenames in os.walk(store_dir):
+        for name in filenames:
+            object_file = os.path.join(dirpath, name)
+            if name.endswith(_USED_SUFFIX):
+                # Stamps are removed with their object, or later if it was removed by someone else
+                if not dry_run and os.path.exists(object_file) and \
+                   not os.path.exists(object_file[:-len(_USED_SUFFIX)]) and os.path.getmtime(object_file) <= cutoff:
+                    os.remove(object_file)
+                continue
+            if object_file in referenced or _get_last_use(object_file) > cutoff:
+                continue
+            removed.append(object_file)
+            if not dry_run:
+                os.remove(object_file)
+                if os.path.exists(object_file + _USED_SUFFIX):
+                    os.remove(object_file + _USED_SUFFIX)
+
+    return sorted(removed)
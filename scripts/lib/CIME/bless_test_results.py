@@ -1,10 +1,10 @@
 import CIME.compare_namelists, CIME.simple_compare
 from CIME.test_scheduler import NAMELIST_PHASE
-from CIME.utils import run_cmd, get_scripts_root, get_model, EnvironmentContext
+from CIME.utils import run_cmd, get_scripts_root, get_model, EnvironmentContext, SharedArea, CIMEError
 from CIME.test_status import *
 from CIME.hist_utils import generate_baseline, compare_baseline
 from CIME.case import Case
-from CIME.test_utils import get_test_status_files
+from CIME.test_utils import get_test_status_files, get_case_values, scan_test_dirs
 import os,  time, six
 logger = logging.getLogger(__name__)
 
@@ -34,6 +34,27 @@ def bless_namelists(test_name, report_only, force, baseline_name, baseline_root,
     else:
         return True, None
 
+###############################################################################
+def _ask_to_bless_history(cmp_result, cmp_comments, report_only, force):
+###############################################################################
+    if cmp_result:
+        logger.info("Diff appears to have been already resolved.")
+        return False
+    else:
+        logger.info(cmp_comments)
+        return (not report_only and
+                (force or six.moves.input("Update this diff (y/n)? ").upper() in ["Y", "YES"]))
+
+###############################################################################
+def _check_generated_history(test_name, gen_result, gen_comments):
+###############################################################################
+    if not gen_result:
+        logger.warning("Hist file bless FAILED for test {}".format(test_name))
+        return False, "Generate baseline failed: {}".format(gen_comments)
+    else:
+        logger.info(gen_comments)
+        return True, None
+
 ###############################################################################
 def bless_history(test_name, case, baseline_name, baseline_root, report_only, force):
 ###############################################################################
@@ -43,28 +64,164 @@ def bless_history(test_name, case, baseline_name, baseline_root, report_only, fo
         baseline_full_dir = os.path.join(baseline_root, baseline_name, case.get_value("CASEBASEID"))
 
         cmp_result, cmp_comments = compare_baseline(case, baseline_dir=baseline_full_dir, outfile_suffix=None)
-        if cmp_result:
-            logger.info("Diff appears to have been already resolved.")
+        if _ask_to_bless_history(cmp_result, cmp_comments, report_only, force):
+            gen_result, gen_comments = generate_baseline(case, baseline_dir=baseline_full_dir, staged=True)
+            return _check_generated_history(test_name, gen_result, gen_comments)
+        else:
             return True, None
+
+###############################################################################
+def _run_by_user(func, blesses, jobs):
+###############################################################################
+    """
+    Returns [func(bless) for bless in blesses], running up to jobs at a time.
+    USER and the umask are set for the whole process, so the calls for each
+    real user run together, with the settings applied around them rather
+    than in each thread.
+    """
+    results = [None] * len(blesses)
+    for real_user in sorted(set(bless["real_user"] for bless in blesses)):
+        idxs = [idx for idx, bless in enumerate(blesses) if bless["real_user"] == real_user]
+        with EnvironmentContext(USER=real_user), SharedArea():
+            for idx, result in zip(idxs, scan_test_dirs(func, [blesses[idx] for idx in idxs], nthreads=jobs)):
+                results[idx] = result
+
+    return results
+
+###############################################################################
+def _compare_history(bless):
+###############################################################################
+    return compare_baseline(bless["case"], baseline_dir=bless["baseline_dir"], outfile_suffix=None)
+
+###############################################################################
+def _generate_history(bless):
+###############################################################################
+    try:
+        return generate_baseline(bless["case"], baseline_dir=bless["baseline_dir"], staged=True)
+    except CIMEError as e:
+        return False, str(e)
+
+###############################################################################
+def bless_histories(hist_blesses, report_only, force, jobs):
+###############################################################################
+    """
+    Bless the history files of the tests in hist_blesses, a list of
+    (test_name, test_dir, baseline_name, baseline_root), comparing with and
+    generating up to jobs baselines at a time. Only asking whether to update
+    a baseline is done one test at a time. Returns the list of
+    (test_name, reason) of the blesses that failed.
+    """
+    # Cases are opened here, reading their files is not thread safe. Blessing
+    # only reads the cases, so there is nothing to flush.
+    blesses = []
+    for test_name, test_dir, baseline_name, baseline_root in hist_blesses:
+        case = Case(test_dir, read_only=True)
+        blesses.append({"test_name" : test_name, "case" : case, "real_user" : case.get_value("REALUSER"),
+                        "baseline_dir" : os.path.join(baseline_root, baseline_name, case.get_value("CASEBASEID"))})
+
+    to_generate = []
+    for bless, (cmp_result, cmp_comments) in zip(blesses, _run_by_user(_compare_history, blesses, jobs)):
+        logger.info("Test '{}' history comparison:".format(bless["test_name"]))
+        if _ask_to_bless_history(cmp_result, cmp_comments, report_only, force):
+            to_generate.append(bless)
+
+    broken_blesses = []
+    for bless, (gen_result, gen_comments) in zip(to_generate, _run_by_user(_generate_history, to_generate, jobs)):
+        success, reason = _check_generated_history(bless["test_name"], gen_result, gen_comments)
+        if not success:
+            broken_blesses.append((bless["test_name"], reason))
+
+    return broken_blesses
+
+###############################################################################
+def _scan_test(test_status_file, ts, baseline_name, baseline_root, namelists_only, hist_only, bless_tests, no_skip_pass):
+###############################################################################
+    """
+    Work out what needs blessing for the test of test_status_file, whose
+    TestStatus is ts. This only reads files so that tests can be scanned
+    concurrently. Returns None for tests not to be blessed, otherwise a dict
+    of what to bless, broken blesses and warnings to report.
+    """
+    test_dir = os.path.dirname(test_status_file)
+    test_name = ts.get_name()
+    if test_name is None:
+        case_dir = os.path.basename(test_dir)
+        test_name = CIME.utils.normalize_case_id(case_dir)
+        if (bless_tests in [[], None] or CIME.utils.match_any(test_name, bless_tests)):
+            return {"test_name" : test_name, "test_dir" : test_dir, "nl_bless" : False, "hist_bless" : False,
+                    "overall_result" : None, "warnings" : [], "skip" : True,
+                    "broken_blesses" : [("unknown", "test had invalid TestStatus file: '{}'".format(test_status_file))]}
         else:
-            logger.info(cmp_comments)
-            if (not report_only and
-                (force or six.moves.input("Update this diff (y/n)? ").upper() in ["Y", "YES"])):
-                gen_result, gen_comments = generate_baseline(case, baseline_dir=baseline_full_dir)
-                if not gen_result:
-                    logger.warning("Hist file bless FAILED for test {}".format(test_name))
-                    return False, "Generate baseline failed: {}".format(gen_comments)
-                else:
-                    logger.info(gen_comments)
-                    return True, None
-            else:
-                return True, None
+            return None
+
+    if not (bless_tests in [[], None] or CIME.utils.match_any(test_name, bless_tests)):
+        return None
+
+    scan = {"test_name" : test_name, "test_dir" : test_dir, "overall_result" : ts.get_overall_test_status(),
+            "warnings" : [], "broken_blesses" : [], "skip" : False}
+
+    # See if we need to bless namelist
+    if (not hist_only):
+        if no_skip_pass:
+            scan["nl_bless"] = True
+        else:
+            scan["nl_bless"] = ts.get_status(NAMELIST_PHASE) != TEST_PASS_STATUS
+    else:
+        scan["nl_bless"] = False
+
+    # See if we need to bless baselines
+    if (not namelists_only):
+        run_result = ts.get_status(RUN_PHASE)
+        if (run_result is None):
+            scan["broken_blesses"].append((test_name, "no run phase"))
+            scan["warnings"].append("Test '{}' did not make it to run phase".format(test_name))
+            scan["hist_bless"] = False
+        elif (run_result != TEST_PASS_STATUS):
+            scan["broken_blesses"].append((test_name, "test did not pass"))
+            scan["warnings"].append("Test '{}' did not pass, not safe to bless".format(test_name))
+            scan["hist_bless"] = False
+        elif no_skip_pass:
+            scan["hist_bless"] = True
+        else:
+            scan["hist_bless"] = ts.get_status(BASELINE_PHASE) != TEST_PASS_STATUS
+    else:
+        scan["hist_bless"] = False
+
+    # Resolve baseline_name and baseline_root from the env files of the case.
+    # If they refer to something the env files lack, the case is opened by
+    # _resolve_scan once the scans are done: opening a case is not thread safe.
+    if scan["nl_bless"] or scan["hist_bless"]:
+        values = get_case_values(test_dir, ["BASELINE_NAME_CMP", "BASELINE_ROOT"])
+        scan["unresolved"] = any("$" in value for value in values.values() if value)
+        scan["baseline_name"] = baseline_name if baseline_name is not None else values["BASELINE_NAME_CMP"]
+        scan["baseline_root"] = baseline_root if baseline_root is not None else values["BASELINE_ROOT"]
+
+    return scan
+
+###############################################################################
+def _resolve_scan(scan, baseline_name, baseline_root):
+###############################################################################
+    """
+    Resolve the baseline name and root of scan, as returned by _scan_test,
+    through the case if its env files could not
+    """
+    if scan.get("unresolved"):
+        with Case(scan["test_dir"], read_only=True) as case:
+            scan["baseline_name"] = baseline_name if baseline_name is not None else case.get_value("BASELINE_NAME_CMP")
+            scan["baseline_root"] = baseline_root if baseline_root is not None else case.get_value("BASELINE_ROOT")
+        scan["unresolved"] = False
 
 ###############################################################################
 def bless_test_results(baseline_name, baseline_root, test_root, compiler, test_id=None, namelists_only=False, hist_only=False,
-                       report_only=False, force=False, bless_tests=None, no_skip_pass=False, new_test_root=None, new_test_id=None):
+                       report_only=False, force=False, bless_tests=None, no_skip_pass=False, new_test_root=None, new_test_id=None,
+                       jobs=1):
 ###############################################################################
-    test_status_files = get_test_status_files(test_root, compiler, test_id=test_id)
+    """
+    Bless the results of the tests in test_root. With jobs > 1, history
+    files of up to jobs tests are compared and blessed at a time, after all
+    namelists are blessed.
+    """
+    test_status_files = sorted(get_test_status_files(test_root, compiler, test_id=test_id))
 
     # auto-adjust test-id if multiple rounds of tests were matched
     timestamps = set()
@@ -78,104 +235,84 @@ def bless_test_results(baseline_name, baseline_root, test_root, compiler, test_i
     most_recent = sorted(timestamps)[-1]
     logger.info("Matched test batch is {}".format(most_recent))
 
-    broken_blesses = []
+    recent_test_status_files = []
     for test_status_file in test_status_files:
         if not most_recent in test_status_file:
             logger.info("Skipping {}".format(test_status_file))
+        else:
+            recent_test_status_files.append(test_status_file)
+
+    # Scan the tests concurrently, then bless them one at a time in order
+    # since blessing may ask the user
+    scans = scan_test_dirs(lambda item: _scan_test(item[0], item[1], baseline_name, baseline_root, namelists_only,
+                                                   hist_only, bless_tests, no_skip_pass),
+                           zip(recent_test_status_files, get_test_statuses(recent_test_status_files)))
+
+    broken_blesses = []
+    hist_blesses = []
+    current_branch = None
+    for scan in scans:
+        if scan is None:
+            continue
+
+        for warning in scan["warnings"]:
+            logger.warning(warning)
+        broken_blesses.extend(scan["broken_blesses"])
+        if scan["skip"]:
             continue
 
-        test_dir = os.path.dirname(test_status_file)
-        ts = TestStatus(test_dir=test_dir)
-        test_name = ts.get_name()
-        if test_name is None:
-            case_dir = os.path.basename(test_dir)
-            test_name = CIME.utils.normalize_case_id(case_dir)
-            if (bless_tests in [[], None] or CIME.utils.match_any(test_name, bless_tests)):
-                broken_blesses.append(("unknown", "test had invalid TestStatus file: '{}'".format(test_status_file)))
+        _resolve_scan(scan, baseline_name, baseline_root)
+
+        test_name, test_dir = scan["test_name"], scan["test_dir"]
+        if not scan["nl_bless"] and not scan["hist_bless"]:
+            logger.info("Nothing to bless for test: {}, overall status: {}".format(test_name, scan["overall_result"]))
+        else:
+
+            logger.info("###############################################################################")
+            logger.info("Blessing results for test: {}, most recent result: {}".format(test_name, scan["overall_result"]))
+            logger.info("Case dir: {}".format(test_dir))
+            logger.info("###############################################################################")
+            if not force:
+                time.sleep(2)
+
+            baseline_name_resolved = scan["baseline_name"]
+            if not baseline_name_resolved:
+                if current_branch is None:
+                    current_branch = CIME.utils.get_current_branch(repo=CIME.utils.get_cime_root())
+                baseline_name_resolved = current_branch
+            baseline_root_resolved = scan["baseline_root"]
+
+            if baseline_name_resolved is None:
+                broken_blesses.append((test_name, "Could not determine baseline name"))
                 continue
-            else:
+
+            if baseline_root_resolved is None:
+                broken_blesses.append((test_name, "Could not determine baseline root"))
                 continue
 
-        if (bless_tests in [[], None] or CIME.utils.match_any(test_name, bless_tests)):
-            overall_result = ts.get_overall_test_status()
+            # Bless namelists
+            if scan["nl_bless"]:
+                success, reason = bless_namelists(test_name, report_only, force, baseline_name_resolved, baseline_root_resolved, new_test_root=new_test_root, new_test_id=new_test_id)
+                if not success:
+                    broken_blesses.append((test_name, reason))
 
-            # See if we need to bless namelist
-            if (not hist_only):
-                if no_skip_pass:
-                    nl_bless = True
+            # Bless hist files
+            if scan["hist_bless"]:
+                if "HOMME" in test_name:
+                    success = False
+                    reason = "HOMME tests cannot be blessed with bless_for_tests"
+                elif jobs > 1:
+                    hist_blesses.append((test_name, test_dir, baseline_name_resolved, baseline_root_resolved))
+                    continue
                 else:
-                    nl_bless = ts.get_status(NAMELIST_PHASE) != TEST_PASS_STATUS
-            else:
-                nl_bless = False
-
-            # See if we need to bless baselines
-            if (not namelists_only):
-                run_result = ts.get_status(RUN_PHASE)
-                if (run_result is None):
-                    broken_blesses.append((test_name, "no run phase"))
-                    logger.warning("Test '{}' did not make it to run phase".format(test_name))
-                    hist_bless = False
-                elif (run_result != TEST_PASS_STATUS):
-                    broken_blesses.append((test_name, "test did not pass"))
-                    logger.warning("Test '{}' did not pass, not safe to bless".format(test_name))
-                    hist_bless = False
-                elif no_skip_pass:
-                    hist_bless = True
-                else:
-                    hist_bless = ts.get_status(BASELINE_PHASE) != TEST_PASS_STATUS
-            else:
-                hist_bless = False
-
-            # Now, do the bless
-            if not nl_bless and not hist_bless:
-                logger.info("Nothing to bless for test: {}, overall status: {}".format(test_name, overall_result))
-            else:
-
-                logger.info("###############################################################################")
-                logger.info("Blessing results for test: {}, most recent result: {}".format(test_name, overall_result))
-                logger.info("Case dir: {}".format(test_dir))
-                logger.info("###############################################################################")
-                if not force:
-                    time.sleep(2)
-
-                with Case(test_dir) as case:
-                    # Resolve baseline_name and baseline_root
-                    if baseline_name is None:
-                        baseline_name_resolved = case.get_value("BASELINE_NAME_CMP")
-                        if not baseline_name_resolved:
-                            baseline_name_resolved = CIME.utils.get_current_branch(repo=CIME.utils.get_cime_root())
-                    else:
-                        baseline_name_resolved = baseline_name
-
-                    if baseline_root is None:
-                        baseline_root_resolved = case.get_value("BASELINE_ROOT")
-                    else:
-                        baseline_root_resolved = baseline_root
-
-                    if baseline_name_resolved is None:
-                        broken_blesses.append((test_name, "Could not determine baseline name"))
-                        continue
-
-                    if baseline_root_resolved is None:
-                        broken_blesses.append((test_name, "Could not determine baseline root"))
-                        continue
-
-                    # Bless namelists
-                    if nl_bless:
-                        success, reason = bless_namelists(test_name, report_only, force, baseline_name_resolved, baseline_root_resolved, new_test_root=new_test_root, new_test_id=new_test_id)
-                        if not success:
-                            broken_blesses.append((test_name, reason))
-
-                    # Bless hist files
-                    if hist_bless:
-                        if "HOMME" in test_name:
-                            success = False
-                            reason = "HOMME tests cannot be blessed with bless_for_tests"
-                        else:
-                            success, reason = bless_history(test_name, case, baseline_name_resolved, baseline_root_resolved, report_only, force)
-
-                        if (not success):
-                            broken_blesses.append((test_name, reason))
+                    with Case(test_dir) as case:
+                        success, reason = bless_history(test_name, case, baseline_name_resolved, baseline_root_resolved, report_only, force)
+
+                if (not success):
+                    broken_blesses.append((test_name, reason))
+
+    if hist_blesses:
+        broken_blesses.extend(bless_histories(hist_blesses, report_only, force, jobs))
 
     # Make sure user knows that some tests were not blessed
     success = True
@@ -533,9 +533,60 @@ def _clean_impl(case, cleanlist, clean_all, clean_depends):
     case.set_value("BUILD_COMPLETE","FALSE")
     case.flush()
 
+###############################################################################
+class InputdataPrefetch(object):
+###############################################################################
+    """
+    Runs the case's check_input_data --download in a background process so
+    that input data downloads overlap with the build. The namelists, and so
+    the input data lists, must already have been generated. Input data is
+    checked again at submission, a failed prefetch only produces a warning.
+    """
+
+    def __init__(self, caseroot, lid):
+        self._caseroot = caseroot
+        self._logfile = os.path.join(caseroot, "logs", "inputdata_prefetch.{}.log".format(lid))
+        self._proc = None
+
+    def start(self):
+        logdir = os.path.dirname(self._logfile)
+        if not os.path.isdir(logdir):
+            os.makedirs(logdir)
+        logger.info("Downloading missing input data in the background with output to {}".format(self._logfile))
+        with open(self._logfile, "w") as fd:
+            self._proc = subprocess.Popen([os.path.join(self._caseroot, "check_input_data"), "--download"],
+                                          cwd=self._caseroot, stdout=fd, stderr=subprocess.STDOUT)
+
+    def join(self):
+        """
+        Wait for the download to finish, returns True if all input data is present
+        """
+        if self._proc is None:
+            return True
+
+        t1 = time.time()
+        stat = self._proc.wait()
+        self._proc = None
+        if stat != 0:
+            logger.warning("Background input data download failed, missing input data will be "
+                           "downloaded again when the case is submitted, see {}".format(self._logfile))
+        else:
+            logger.info("Background input data download finished, waited {:f} sec".format(time.time() - t1))
+        return stat == 0
+
+    def cancel(self):
+        """
+        Stop the download. Partial downloads are resumed the next time input data is checked.
+        """
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+
 ###############################################################################
 def _case_build_impl(caseroot, case, sharedlib_only, model_only, buildlist,
-                     save_build_provenance, use_old, ninja, dry_run):
+                     save_build_provenance, use_old, ninja, dry_run, prefetch_inputdata=False):
 ###############################################################################
 
     t1 = time.time()
@@ -650,29 +701,43 @@ def _case_build_impl(caseroot, case, sharedlib_only, model_only, buildlist,
                                debug, compiler, mpilib, complist, ninst_build, smp_value,
                                model_only, buildlist)
 
+    # The namelists are in place, download their input data while building the model
+    prefetch = None
+    if prefetch_inputdata and not (sharedlib_only or buildlist or dry_run):
+        prefetch = InputdataPrefetch(caseroot, lid)
+        prefetch.start()
+
     t2 = time.time()
     logs = []
 
-    if not model_only:
-        logs = _build_libraries(case, exeroot, sharedpath, caseroot,
-                                cimeroot, libroot, lid, compiler, buildlist, comp_interface)
+    try:
+        if not model_only:
+            logs = _build_libraries(case, exeroot, sharedpath, caseroot,
+                                    cimeroot, libroot, lid, compiler, buildlist, comp_interface)
 
-    if not sharedlib_only:
-        if get_model() == "e3sm" and not use_old:
-            logs.extend(_build_model_cmake(exeroot, complist, lid, cimeroot, buildlist,
-                                           comp_interface, sharedpath, ninja, dry_run, case))
-        else:
-            os.environ["INSTALL_SHAREDPATH"] = os.path.join(exeroot, sharedpath) # for MPAS makefile generators
-            logs.extend(_build_model(build_threaded, exeroot, incroot, complist,
-                                     lid, caseroot, cimeroot, compiler, buildlist, comp_interface))
+        if not sharedlib_only:
+            if get_model() == "e3sm" and not use_old:
+                logs.extend(_build_model_cmake(exeroot, complist, lid, cimeroot, buildlist,
+                                               comp_interface, sharedpath, ninja, dry_run, case))
+            else:
+                os.environ["INSTALL_SHAREDPATH"] = os.path.join(exeroot, sharedpath) # for MPAS makefile generators
+                logs.extend(_build_model(build_threaded, exeroot, incroot, complist,
+                                         lid, caseroot, cimeroot, compiler, buildlist, comp_interface))
+
+            if not buildlist:
+                # in case component build scripts updated the xml files, update the case object
+                case.read_xml()
+                # Note, doing buildlists will never result in the system thinking the build is complete
 
-        if not buildlist:
-            # in case component build scripts updated the xml files, update the case object
-            case.read_xml()
-            # Note, doing buildlists will never result in the system thinking the build is complete
+        post_build(case, logs, build_complete=not (buildlist or sharedlib_only),
+                   save_build_provenance=save_build_provenance)
+    except BaseException:
+        if prefetch is not None:
+            prefetch.cancel()
+        raise
 
-    post_build(case, logs, build_complete=not (buildlist or sharedlib_only),
-               save_build_provenance=save_build_provenance)
+    if prefetch is not None:
+        prefetch.join()
 
     t3 = time.time()
 
@@ -705,10 +770,12 @@ def post_build(case, logs, build_complete=False, save_build_provenance=True):
         lock_file("env_build.xml", caseroot=case.get_value("CASEROOT"))
 
 ###############################################################################
-def case_build(caseroot, case, sharedlib_only=False, model_only=False, buildlist=None, save_build_provenance=True, use_old=False, ninja=False, dry_run=False):
+def case_build(caseroot, case, sharedlib_only=False, model_only=False, buildlist=None, save_build_provenance=True, use_old=False, ninja=False, dry_run=False,
+               prefetch_inputdata=False):
 ###############################################################################
     functor = lambda: _case_build_impl(caseroot, case, sharedlib_only, model_only, buildlist,
-                                       save_build_provenance, use_old, ninja, dry_run)
+                                       save_build_provenance, use_old, ninja, dry_run,
+                                       prefetch_inputdata=prefetch_inputdata)
     cb = "case.build"
     if (sharedlib_only == True):
         cb = cb + " (SHAREDLIB_BUILD)"
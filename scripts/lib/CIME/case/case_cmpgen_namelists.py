@@ -5,7 +5,7 @@ case_cmpgen_namelists is a member of Class case from file case.py
 
 from CIME.XML.standard_module_setup import *
 
-from CIME.compare_namelists import is_namelist_file, compare_namelist_files
+from CIME.compare_namelists import is_namelist_file, compare_namelist_file_pairs
 from CIME.simple_compare import compare_files, compare_runconfigfiles
 from CIME.utils import append_status, safe_copy, SharedArea
 from CIME.test_status import *
@@ -32,19 +32,28 @@ def _do_full_nl_comp(case, test, compare_name, baseline_root=None):
                             and not item.endswith("prescribed")\
                             and not os.path.basename(item).startswith(".")]
 
+    # Namelist files are compared first, files with the same content in the
+    # baseline and the test are only parsed once
+    baseline_counterparts = [os.path.join(baseline_casedocs \
+                                          if os.path.dirname(item).endswith("CaseDocs") \
+                                          else baseline_dir,os.path.basename(item))
+                             for item in all_items_to_compare]
+    namelist_pairs = [(baseline_counterpart, item) for item, baseline_counterpart in zip(all_items_to_compare, baseline_counterparts)
+                      if os.path.exists(baseline_counterpart)
+                      and not item.endswith("runconfig") and not item.endswith("runseq")
+                      and is_namelist_file(item)]
+    namelist_results = dict(zip(namelist_pairs, compare_namelist_file_pairs(namelist_pairs, case=test)))
+
     comments = "NLCOMP\n"
-    for item in all_items_to_compare:
-        baseline_counterpart = os.path.join(baseline_casedocs \
-                                            if os.path.dirname(item).endswith("CaseDocs") \
-                                            else baseline_dir,os.path.basename(item))
+    for item, baseline_counterpart in zip(all_items_to_compare, baseline_counterparts):
         if not os.path.exists(baseline_counterpart):
             comments += "Missing baseline namelist '{}'\n".format(baseline_counterpart)
             all_match = False
         else:
             if item.endswith("runconfig") or item.endswith("runseq"):
                 success, current_comments = compare_runconfigfiles(baseline_counterpart, item, test)
-            elif is_namelist_file(item):
-                success, current_comments = compare_namelist_files(baseline_counterpart, item, test)
+            elif (baseline_counterpart, item) in namelist_results:
+                success, current_comments = namelist_results[(baseline_counterpart, item)]
             else:
                 success, current_comments = compare_files(baseline_counterpart, item, test)
 
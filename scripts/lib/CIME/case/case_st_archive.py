@@ -4,11 +4,13 @@ case_st_archive, restore_from_archive, archive_last_restarts
 are members of class Case from file case.py
 """
 
-import shutil, glob, re, os
+import shutil, glob, re, os, time
+from multiprocessing.dummy import Pool as ThreadPool
 
 from CIME.XML.standard_module_setup import *
 from CIME.utils                     import run_and_log_case_status, ls_sorted_by_mtime, symlink_force, safe_copy, find_files
 from CIME.date                      import get_file_date
+from CIME.rundir_index              import RundirIndex, RPOINTER_FILE
 from CIME.XML.archive       import Archive
 from CIME.XML.files            import Files
 from os.path                        import isdir, join
@@ -16,15 +18,91 @@ from os.path                        import isdir, join
 logger = logging.getLogger(__name__)
 
 ###############################################################################
-def _get_archive_file_fn(copy_only):
+class _ArchiveFileMover(object):
+###############################################################################
+    """
+    Callable used to archive files: archive_file_fn(srcfile, destfile) moves
+    (or copies, if copy_only) srcfile to destfile.
+
+    A move within a filesystem is a rename and is done right away. Copies and
+    moves across filesystems are queued, batched by destination filesystem,
+    and performed by a bounded pool of nthreads threads when flush is called.
+    """
+
+    def __init__(self, copy_only, nthreads=1):
+        self._copy_only = copy_only
+        self._nthreads = max(1, nthreads)
+        self._pending = {} # destination device -> list of (srcfile, destfile, move)
+        self._devices = {} # directory -> device
+
+    def _device(self, dirname):
+        if dirname not in self._devices:
+            self._devices[dirname] = os.stat(dirname).st_dev
+        return self._devices[dirname]
+
+    def __call__(self, srcfile, destfile):
+        if self._copy_only:
+            self.copy(srcfile, destfile)
+        else:
+            dest_device = self._device(os.path.dirname(os.path.abspath(destfile)))
+            if os.stat(srcfile).st_dev == dest_device:
+                os.rename(srcfile, destfile)
+            else:
+                self._pending.setdefault(dest_device, []).append((srcfile, destfile, True))
+
+    def copy(self, srcfile, destfile):
+        """
+        Queue a copy of srcfile to destfile
+        """
+        dest_device = self._device(os.path.dirname(os.path.abspath(destfile)))
+        self._pending.setdefault(dest_device, []).append((srcfile, destfile, False))
+
+    def flush(self):
+        """
+        Perform all queued transfers, one destination filesystem at a time
+        """
+        if not self._pending:
+            return
+
+        start = time.time()
+        nfiles, nbytes = 0, 0
+        pool = ThreadPool(self._nthreads)
+        try:
+            for dest_device in sorted(self._pending):
+                transfers = self._pending[dest_device]
+                nfiles += len(transfers)
+                nbytes += sum(pool.map(_transfer_file, transfers))
+        finally:
+            pool.close()
+            pool.join()
+            self._pending = {}
+
+        elapsed = time.time() - start
+        logger.info("archived {:d} files ({:d} bytes) in {:.2f} seconds, {:.1f} MB/s".
+                    format(nfiles, nbytes, elapsed, nbytes / (1024. * 1024. * max(elapsed, 1e-6))))
+
+def _transfer_file(transfer):
+    """
+    Worker for _ArchiveFileMover, returns the number of bytes transferred
+    """
+    srcfile, destfile, move = transfer
+    nbytes = os.path.getsize(srcfile)
+    if move:
+        shutil.move(srcfile, destfile)
+    else:
+        safe_copy(srcfile, destfile)
+    return nbytes
+
+###############################################################################
+def _get_archive_file_fn(copy_only, nthreads=1):
 ###############################################################################
     """
     Returns the function to use for archiving some files
     """
-    return safe_copy if copy_only else shutil.move
+    return _ArchiveFileMover(copy_only, nthreads=nthreads)
 
 ###############################################################################
-def _get_datenames(casename, rundir):
+def _get_datenames(casename, rundir, rundir_index=None):
 ###############################################################################
     """
     Returns the date objects specifying the times of each file
@@ -32,10 +110,12 @@ def _get_datenames(casename, rundir):
     Not doc-testable due to filesystem dependence
     """
     expect(isdir(rundir), 'Cannot open directory {} '.format(rundir))
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir, casename=casename)
 
-    files = sorted(glob.glob(os.path.join(rundir, casename +      '.cpl.r.*.nc')))
+    files = rundir_index.glob(casename +      '.cpl.r.*.nc')
     if not files:
-        files = sorted(glob.glob(os.path.join(rundir, casename + '.cpl_0001.r.*.nc')))
+        files = rundir_index.glob(casename + '.cpl_0001.r.*.nc')
 
     logger.debug("  cpl files : {} ".format(files))
 
@@ -44,7 +124,7 @@ def _get_datenames(casename, rundir):
 
     datenames = []
     for filename in files:
-        file_date = get_file_date(filename)
+        file_date = rundir_index.get_date(filename)
         datenames.append(file_date)
     return datenames
 
@@ -124,14 +204,13 @@ def _get_component_archive_entries(components, archive):
 
 ###############################################################################
 def _archive_rpointer_files(casename, ninst_strings, rundir, save_interim_restart_files, archive,
-                            archive_entry, archive_restdir, datename, datename_is_last):
+                            archive_entry, archive_restdir, datename, datename_is_last, rundir_index):
 ###############################################################################
 
     if datename_is_last:
         # Copy of all rpointer files for latest restart date
-        rpointers = glob.glob(os.path.join(rundir, 'rpointer.*'))
-        for rpointer in rpointers:
-            safe_copy(rpointer, os.path.join(archive_restdir, os.path.basename(rpointer)))
+        for rpointer in rundir_index.get_files(filetype=RPOINTER_FILE):
+            safe_copy(os.path.join(rundir, rpointer), os.path.join(archive_restdir, rpointer))
     else:
         # Generate rpointer file(s) for interim restarts for the one datename and each
         # possible value of ninst_strings
@@ -175,7 +254,7 @@ def _archive_rpointer_files(casename, ninst_strings, rundir, save_interim_restar
                     logger.info("rpointer_content unset, not creating rpointer file {}".format(rpointer_file))
 
 ###############################################################################
-def _archive_log_files(dout_s_root, rundir, archive_incomplete, archive_file_fn):
+def _archive_log_files(dout_s_root, rundir, archive_incomplete, archive_file_fn, rundir_index=None):
 ###############################################################################
     """
     Find all completed log files, or all log files if archive_incomplete is True, and archive them.
@@ -192,22 +271,29 @@ def _archive_log_files(dout_s_root, rundir, archive_incomplete, archive_file_fn)
     else:
         log_search = '*.log.*'
 
-    logfiles = glob.glob(os.path.join(rundir, log_search))
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir)
+
+    logfiles = rundir_index.glob(log_search)
     for logfile in logfiles:
         srcfile = join(rundir, os.path.basename(logfile))
         destfile = join(archive_logdir, os.path.basename(logfile))
         archive_file_fn(srcfile, destfile)
+        rundir_index.discard(os.path.basename(logfile))
         logger.info("moving {} to {}".format(srcfile, destfile))
 
 ###############################################################################
 def _archive_history_files(archive, compclass, compname, histfiles_savein_rundir,
-                           last_date, archive_file_fn, dout_s_root, casename, rundir):
+                           last_date, archive_file_fn, dout_s_root, casename, rundir,
+                           rundir_index=None):
 ###############################################################################
     """
     perform short term archiving on history files in rundir
 
     Not doc-testable due to case and file system dependence
     """
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir, casename=casename)
 
     # determine history archive directory (create if it does not exist)
 
@@ -227,7 +313,7 @@ def _archive_history_files(archive, compclass, compname, histfiles_savein_rundir
 
         sfxrbld = r'mesh_mask_' + r'[0-9]*'
         pfile = re.compile(sfxrbld)
-        rbldfiles = [f for f in os.listdir(rundir) if pfile.search(f)]
+        rbldfiles = [f for f in rundir_index.filenames if pfile.search(f)]
         logger.debug("rbldfiles = {} ".format(rbldfiles))
 
         if rbldfiles:
@@ -236,10 +322,11 @@ def _archive_history_files(archive, compclass, compname, histfiles_savein_rundir
                 destfile = join(archive_rblddir, rbldfile)
                 logger.info("moving {} to {} ".format(srcfile, destfile))
                 archive_file_fn(srcfile, destfile)
+                rundir_index.discard(os.path.basename(srcfile))
 
         sfxhst = casename + r'_[0-9][mdy]_' + r'[0-9]*'
         pfile = re.compile(sfxhst)
-        hstfiles = [f for f in os.listdir(rundir) if pfile.search(f)]
+        hstfiles = [f for f in rundir_index.filenames if pfile.search(f)]
         logger.debug("hstfiles = {} ".format(hstfiles))
 
         if hstfiles:
@@ -248,16 +335,17 @@ def _archive_history_files(archive, compclass, compname, histfiles_savein_rundir
                 destfile = join(archive_histdir, hstfile)
                 logger.info("moving {} to {} ".format(srcfile, destfile))
                 archive_file_fn(srcfile, destfile)
+                rundir_index.discard(os.path.basename(srcfile))
 
     # determine ninst and ninst_string
 
     # archive history files - the only history files that kept in the
     # run directory are those that are needed for restarts
-    histfiles = archive.get_all_hist_files(casename, compname, rundir)
+    histfiles = rundir_index.get_all_hist_files(archive, casename, compname)
 
     if histfiles:
         for histfile in histfiles:
-            file_date = get_file_date(os.path.basename(histfile))
+            file_date = rundir_index.get_date(histfile)
             if last_date is None or file_date is None or file_date <= last_date:
                 srcfile = join(rundir, histfile)
                 expect(os.path.isfile(srcfile),
@@ -265,19 +353,22 @@ def _archive_history_files(archive, compclass, compname, histfiles_savein_rundir
                 destfile = join(archive_histdir, histfile)
                 if histfile in histfiles_savein_rundir:
                     logger.info("copying {} to {} ".format(srcfile, destfile))
-                    safe_copy(srcfile, destfile)
+                    archive_file_fn.copy(srcfile, destfile)
                 else:
                     logger.info("moving {} to {} ".format(srcfile, destfile))
                     archive_file_fn(srcfile, destfile)
+                    rundir_index.discard(histfile)
 
 ###############################################################################
-def get_histfiles_for_restarts(rundir, archive, archive_entry, restfile, testonly=False):
+def get_histfiles_for_restarts(rundir, archive, archive_entry, restfile, testonly=False, rundir_index=None):
 ###############################################################################
     """
     query restart files to determine history files that are needed for restarts
 
     Not doc-testable due to filesystem dependence
     """
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir)
 
     # Make certain histfiles is a set so we don't repeat
     histfiles = set()
@@ -306,7 +397,7 @@ def get_histfiles_for_restarts(rundir, archive, archive_entry, restfile, testonl
                     # append histfile to the list ONLY if it exists in rundir before the archiving
                     if histfile in histfiles:
                         logger.warning("WARNING, tried to add a duplicate file to histfiles")
-                    if os.path.isfile(os.path.join(rundir,histfile)):
+                    if histfile in rundir_index:
                         histfiles.add(histfile)
                     else:
                         logger.debug(" get_histfiles_for_restarts: histfile {} does not exist ".format(histfile))
@@ -316,7 +407,7 @@ def get_histfiles_for_restarts(rundir, archive, archive_entry, restfile, testonl
 def _archive_restarts_date(case, casename, rundir, archive,
                            datename, datename_is_last, last_date,
                            archive_restdir, archive_file_fn, components=None,
-                           link_to_last_restart_files=False, testonly=False):
+                           link_to_last_restart_files=False, testonly=False, rundir_index=None):
 ###############################################################################
     """
     Archive restart files for a single date
@@ -337,6 +428,9 @@ def _archive_restarts_date(case, casename, rundir, archive,
         components.append('drv')
         components.append('dart')
 
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir, casename=casename)
+
     histfiles_savein_rundir_by_compname = {}
 
     for (archive_entry, compname, compclass) in _get_component_archive_entries(components, archive):
@@ -352,7 +446,8 @@ def _archive_restarts_date(case, casename, rundir, archive,
                                                                   archive_file_fn,
                                                                   link_to_last_restart_files=
                                                                   link_to_last_restart_files,
-                                                                  testonly=testonly)
+                                                                  testonly=testonly,
+                                                                  rundir_index=rundir_index)
             histfiles_savein_rundir_by_compname[compname] = histfiles_savein_rundir
 
     return histfiles_savein_rundir_by_compname
@@ -361,7 +456,7 @@ def _archive_restarts_date(case, casename, rundir, archive,
 def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
                                 compclass, compname, datename, datename_is_last,
                                 last_date, archive_restdir, archive_file_fn,
-                                link_to_last_restart_files=False, testonly=False):
+                                link_to_last_restart_files=False, testonly=False, rundir_index=None):
 ###############################################################################
     """
     Archive restart files for a single date and single component
@@ -372,6 +467,8 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
     history files that are associated with these restart files.)
     """
     datename_str = _datetime_str(datename)
+    if rundir_index is None:
+        rundir_index = RundirIndex(rundir, casename=casename)
 
     if datename_is_last or case.get_value('DOUT_S_SAVE_INTERIM_RESTART_FILES'):
         if not os.path.exists(archive_restdir):
@@ -380,7 +477,8 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
     # archive the rpointer file(s) for this datename and all possible ninst_strings
     _archive_rpointer_files(casename, _get_ninst_info(case, compclass)[1], rundir,
                             case.get_value('DOUT_S_SAVE_INTERIM_RESTART_FILES'),
-                            archive, archive_entry, archive_restdir, datename, datename_is_last)
+                            archive, archive_entry, archive_restdir, datename, datename_is_last,
+                            rundir_index)
 
     # move all but latest restart files into the archive restart directory
     # copy latest restart files to archive restart directory
@@ -405,15 +503,15 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
         if compname.find('mpas') == 0 or compname == 'mali':
             pattern = compname + r'\.' + suffix + r'\.' + '_'.join(datename_str.rsplit('-', 1))
             pfile = re.compile(pattern)
-            restfiles = [f for f in os.listdir(rundir) if pfile.search(f)]
+            restfiles = [f for f in rundir_index.get_component_files(compname) if pfile.search(f)]
         elif compname == 'nemo':
             pattern = r'_*_' + suffix + r'[0-9]*'
             pfile = re.compile(pattern)
-            restfiles = [f for f in os.listdir(rundir) if pfile.search(f)]
+            restfiles = [f for f in rundir_index.filenames if pfile.search(f)]
         else:
             pattern = r"^{}\.{}[\d_]*\.".format(casename, compname)
             pfile = re.compile(pattern)
-            files = [f for f in os.listdir(rundir) if pfile.search(f)]
+            files = [f for f in rundir_index.get_component_files(compname) if pfile.search(f)]
             pattern =  r'_?' + r'\d*' + r'\.' + suffix + r'\.' + r'[^\.]*' + r'\.?' + datename_str
             pfile = re.compile(pattern)
             restfiles = [f for f in files if pfile.search(f)]
@@ -421,7 +519,7 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
         for rfile in restfiles:
             rfile = os.path.basename(rfile)
 
-            file_date = get_file_date(rfile)
+            file_date = rundir_index.get_date(rfile)
             if last_date is not None and file_date > last_date:
                 # Skip this file
                 continue
@@ -433,7 +531,8 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
             # need to do this before archiving restart files
             histfiles_for_restart = get_histfiles_for_restarts(rundir, archive,
                                                                archive_entry, rfile,
-                                                               testonly=testonly)
+                                                               testonly=testonly,
+                                                               rundir_index=rundir_index)
 
             if datename_is_last and histfiles_for_restart:
                 for histfile in histfiles_for_restart:
@@ -463,6 +562,7 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
                     expect(os.path.isfile(srcfile),
                            "restart file {} does not exist ".format(srcfile))
                     archive_file_fn(srcfile, destfile)
+                    rundir_index.discard(rfile)
                     logger.info("moving file {} to {}".format(srcfile, destfile))
 
                     # need to copy the history files needed for interim restarts - since
@@ -509,6 +609,7 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
                                         if (os.path.isfile(srcfile)):
                                             try:
                                                 os.remove(srcfile)
+                                                rundir_index.discard(os.path.basename(srcfile))
                                             except OSError:
                                                 logger.warning("unable to remove interim restart file {}".format(srcfile))
                                         else:
@@ -544,6 +645,7 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
                                         if (os.path.isfile(srcfile)):
                                             try:
                                                 os.remove(srcfile)
+                                                rundir_index.discard(os.path.basename(srcfile))
                                             except OSError:
                                                 logger.warning("unable to remove interim restart file {}".format(srcfile))
                                         else:
@@ -558,6 +660,7 @@ def _archive_restarts_date_comp(case, casename, rundir, archive, archive_entry,
                         if (os.path.isfile(srcfile)):
                             try:
                                 os.remove(srcfile)
+                                rundir_index.discard(rfile)
                             except OSError:
                                 logger.warning("unable to remove interim restart file {}".format(srcfile))
                         else:
@@ -586,14 +689,20 @@ def _archive_process(case, archive, last_date, archive_incomplete_logs, copy_onl
         components.append('drv')
         components.append('dart')
 
-    archive_file_fn = _get_archive_file_fn(copy_only)
+    nthreads = case.get_value("DOUT_S_THREADS")
+    archive_file_fn = _get_archive_file_fn(copy_only, nthreads=1 if nthreads is None else nthreads)
+
+    # one scan of rundir serves the log and restart archiving, files are
+    # discarded from it as they are moved or removed, even those whose move
+    # is still queued, so later queries do not find them again
+    rundir_index = RundirIndex(rundir, casename=casename)
 
     # archive log files
     _archive_log_files(dout_s_root, rundir,
-                       archive_incomplete_logs, archive_file_fn)
+                       archive_incomplete_logs, archive_file_fn, rundir_index=rundir_index)
 
     # archive restarts and all necessary associated files (e.g. rpointer files)
-    datenames = _get_datenames(casename, rundir)
+    datenames = _get_datenames(casename, rundir, rundir_index=rundir_index)
     logger.debug("datenames {} ".format(datenames))
     histfiles_savein_rundir_by_compname = {}
     for datename in datenames:
@@ -607,12 +716,18 @@ def _archive_process(case, archive, last_date, archive_incomplete_logs, copy_onl
 
             histfiles_savein_rundir_by_compname_this_date = _archive_restarts_date(
                 case, casename, rundir, archive, datename, datename_is_last,
-                last_date, archive_restdir, archive_file_fn, components, testonly=testonly)
+                last_date, archive_restdir, archive_file_fn, components, testonly=testonly,
+                rundir_index=rundir_index)
             if datename_is_last:
                 histfiles_savein_rundir_by_compname = histfiles_savein_rundir_by_compname_this_date
 
+    # complete the log and restart transfers so that rundir only holds the
+    # files that remain to be archived
+    archive_file_fn.flush()
+
     # archive history files
 
+    rundir_index = RundirIndex(rundir, casename=casename)
     for (_, compname, compclass) in _get_component_archive_entries(components, archive):
         if compclass:
             logger.info('Archiving history files for {} ({})'.format(compname, compclass))
@@ -621,7 +736,10 @@ def _archive_process(case, archive, last_date, archive_incomplete_logs, copy_onl
             _archive_history_files(archive,
                                    compclass, compname, histfiles_savein_rundir,
                                    last_date, archive_file_fn,
-                                   dout_s_root, casename, rundir)
+                                   dout_s_root, casename, rundir,
+                                   rundir_index=rundir_index)
+
+    archive_file_fn.flush()
 
 ###############################################################################
 def restore_from_archive(self, rest_dir=None, dout_s_root=None, rundir=None, test=False):
@@ -694,6 +812,7 @@ def archive_last_restarts(self, archive_restdir, rundir, last_date=None, link_to
                                archive_restdir=archive_restdir,
                                archive_file_fn=archive_file_fn,
                                link_to_last_restart_files=link_to_restart_files)
+    archive_file_fn.flush()
 
 ###############################################################################
 def case_st_archive(self, last_date_str=None, archive_incomplete_logs=True, copy_only=False, resubmit=True):
@@ -4,14 +4,22 @@ API for checking input for testcase
 from CIME.XML.standard_module_setup import *
 from CIME.utils import SharedArea, find_files, safe_copy, expect
 from CIME.XML.inputdata import Inputdata
+from CIME.Servers.download_manager import DownloadManager
+from CIME.inputdata_index import InputdataIndex
 import CIME.Servers
 
 import glob, hashlib, shutil
+from multiprocessing.dummy import Pool as ThreadPool
 
 logger = logging.getLogger(__name__)
 # The inputdata_checksum.dat file will be read into this hash if it's available
 chksum_hash = dict()
+# The checksum file chksum_hash was read from
+_CHKSUM_HASH_FILE = None
 local_chksum_file = 'inputdata_checksum.dat'
+# Checksums of input files are computed this many at a time
+_CHKSUM_THREADS = 4
+_CHKSUM_READ_SIZE = 8 * 1024 * 1024
 
 def _download_checksum_file(rundir):
     """
@@ -63,7 +71,7 @@ def _download_checksum_file(rundir):
                 _reformat_chksum_file(full_path, new_file)
                 if tmpfile:
                     _merge_chksum_files(full_path, tmpfile)
-                chksum_hash.clear()
+                _reset_chksum_hash()
             else:
                 if tmpfile and os.path.isfile(tmpfile):
                     os.rename(tmpfile, full_path)
@@ -108,7 +116,16 @@ def _merge_chksum_files(new_file, old_file):
 
 
 
-def _download_if_in_repo(server, input_data_root, rel_path, isdirectory=False, ic_filepath=None):
+def _get_download_path(input_data_root, rel_path, ic_filepath=None):
+    """
+    Return the local path that server file rel_path is downloaded to
+    """
+    full_path = os.path.join(input_data_root, rel_path)
+    if ic_filepath:
+        full_path = full_path.replace(ic_filepath, "/")
+    return full_path
+
+def _download_if_in_repo(server, input_data_root, rel_path, isdirectory=False, ic_filepath=None, index=None):
     """
     Return True if successfully downloaded
     server is an object handle of type CIME.Servers
@@ -116,12 +133,11 @@ def _download_if_in_repo(server, input_data_root, rel_path, isdirectory=False, i
     rel_path is the path to the file or directory relative to input_data_root
     user is the user name of the person running the script
     isdirectory indicates that this is a directory download rather than a single file
+    index is the InputdataIndex to record downloaded files in
     """
     if not (rel_path or server.fileexists(rel_path)):
         return False
-    full_path = os.path.join(input_data_root, rel_path)
-    if ic_filepath:
-        full_path = full_path.replace(ic_filepath, "/")
+    full_path = _get_download_path(input_data_root, rel_path, ic_filepath)
     logger.info("Trying to download file: '{}' to path '{}' using {} protocol.".format(rel_path, full_path, type(server).__name__))
     # Make sure local path exists, create if it does not
     if isdirectory or full_path.endswith(os.sep):
@@ -146,6 +162,12 @@ def _download_if_in_repo(server, input_data_root, rel_path, isdirectory=False, i
                 shutil.rmtree(full_path+".tmp")
         else:
             success = server.getfile(rel_path, full_path)
+
+    if success and index is not None:
+        if isdirectory:
+            index.add_files([os.path.join(full_path, f) for f in os.listdir(full_path)])
+        else:
+            index.add_files([full_path])
     return success
 
 def check_all_input_data(self, protocol=None, address=None, input_data_root=None, data_list_dir="Buildconf",
@@ -286,6 +308,8 @@ def check_input_data(case, protocol="svn", address=None, input_data_root=None, d
         logger.warning("WARNING: No .input_data_list files found in dir '{}'".format(data_list_dir))
 
     no_files_missing = True
+    # list of (rel_path, isdirectory) to verify once all files are available
+    chksum_files = []
     if download:
         if protocol not in vars(CIME.Servers):
             logger.info("Client protocol {} not enabled".format(protocol))
@@ -303,118 +327,207 @@ def check_input_data(case, protocol="svn", address=None, input_data_root=None, d
             expect(False, "Unsupported inputdata protocol: {}".format(protocol))
         if not server:
             return None
+        # Missing files are collected while reading the lists and downloaded together afterwards
+        downloads = DownloadManager(server)
+        downloaded_rel_paths = {}
+
+    # Existence checks of files under input_data_root go through the machine-wide index
+    index = InputdataIndex(input_data_root)
+    try:
+        for data_list_file in data_list_files:
+            logger.info("Loading input file list: '{}'".format(data_list_file))
+            with open(data_list_file, "r") as fd:
+                lines = fd.readlines()
 
-    for data_list_file in data_list_files:
-        logger.info("Loading input file list: '{}'".format(data_list_file))
-        with open(data_list_file, "r") as fd:
-            lines = fd.readlines()
-
-        for line in lines:
-            line = line.strip()
-            use_ic_path = False
-            if (line and not line.startswith("#")):
-                tokens = line.split('=')
-                description, full_path = tokens[0].strip(), tokens[1].strip()
-                if description.endswith('datapath'):
-                    continue
-                if(full_path):
-                    # expand xml variables
-                    full_path = case.get_resolved_value(full_path)
-                    rel_path = full_path
-                    if input_ic_root and input_ic_root in full_path \
-                       and ic_filepath:
-                        rel_path = full_path.replace(input_ic_root, ic_filepath)
-                        use_ic_path = True
-                    elif input_data_root in full_path:
-                        rel_path  = full_path.replace(input_data_root, "")
-                    elif input_ic_root and \
-                         (input_ic_root not in input_data_root and input_ic_root in full_path):
-                        if ic_filepath:
-                            rel_path  = full_path.replace(input_ic_root, ic_filepath)
-                        use_ic_path = True
-
-                    model = os.path.basename(data_list_file).split('.')[0]
-
-                    if ("/" in rel_path and rel_path == full_path and not full_path.startswith('unknown')):
-                        # User pointing to a file outside of input_data_root, we cannot determine
-                        # rel_path, and so cannot download the file. If it already exists, we can
-                        # proceed
-                        if not os.path.exists(full_path):
-                            print("Model {} missing file {} = '{}'".format(model, description, full_path))
-                            if download:
-                                logger.warning("    Cannot download file since it lives outside of the input_data_root '{}'".format(input_data_root))
-                            no_files_missing = False
+            for line in lines:
+                line = line.strip()
+                use_ic_path = False
+                if (line and not line.startswith("#")):
+                    tokens = line.split('=')
+                    description, full_path = tokens[0].strip(), tokens[1].strip()
+                    if description.endswith('datapath'):
+                        continue
+                    if(full_path):
+                        # expand xml variables
+                        full_path = case.get_resolved_value(full_path)
+                        rel_path = full_path
+                        if input_ic_root and input_ic_root in full_path \
+                           and ic_filepath:
+                            rel_path = full_path.replace(input_ic_root, ic_filepath)
+                            use_ic_path = True
+                        elif input_data_root in full_path:
+                            rel_path  = full_path.replace(input_data_root, "")
+                        elif input_ic_root and \
+                             (input_ic_root not in input_data_root and input_ic_root in full_path):
+                            if ic_filepath:
+                                rel_path  = full_path.replace(input_ic_root, ic_filepath)
+                            use_ic_path = True
+
+                        model = os.path.basename(data_list_file).split('.')[0]
+
+                        if ("/" in rel_path and rel_path == full_path and not full_path.startswith('unknown')):
+                            # User pointing to a file outside of input_data_root, we cannot determine
+                            # rel_path, and so cannot download the file. If it already exists, we can
+                            # proceed
+                            if not index.exists(full_path):
+                                print("Model {} missing file {} = '{}'".format(model, description, full_path))
+                                if download:
+                                    logger.warning("    Cannot download file since it lives outside of the input_data_root '{}'".format(input_data_root))
+                                no_files_missing = False
+                            else:
+                                logger.debug("  Found input file: '{}'".format(full_path))
                         else:
-                            logger.debug("  Found input file: '{}'".format(full_path))
-                    else:
-                        # There are some special values of rel_path that
-                        # we need to ignore - some of the component models
-                        # set things like 'NULL' or 'same_as_TS' -
-                        # basically if rel_path does not contain '/' (a
-                        # directory tree) you can assume it's a special
-                        # value and ignore it (perhaps with a warning)
-                        isdirectory=rel_path.endswith(os.sep)
-
-                        if ("/" in rel_path and not os.path.exists(full_path) and not full_path.startswith('unknown')):
-                            print("Model {} missing file {} = '{}'".format(model, description, full_path))
-                            no_files_missing = False
-                            if (download):
-                                if use_ic_path:
-                                    no_files_missing = _download_if_in_repo(server,
-                                                                            input_ic_root, rel_path.strip(os.sep),
-                                                                            isdirectory=isdirectory, ic_filepath=ic_filepath)
+                            # There are some special values of rel_path that
+                            # we need to ignore - some of the component models
+                            # set things like 'NULL' or 'same_as_TS' -
+                            # basically if rel_path does not contain '/' (a
+                            # directory tree) you can assume it's a special
+                            # value and ignore it (perhaps with a warning)
+                            isdirectory=rel_path.endswith(os.sep)
+
+                            if ("/" in rel_path and not full_path.startswith('unknown') and not index.exists(full_path)):
+                                print("Model {} missing file {} = '{}'".format(model, description, full_path))
+                                if (download):
+                                    download_root = input_ic_root if use_ic_path else input_data_root
+                                    if isdirectory:
+                                        success = _download_if_in_repo(server,
+                                                                       download_root, rel_path.strip(os.sep),
+                                                                       isdirectory=isdirectory, ic_filepath=ic_filepath,
+                                                                       index=index)
+                                        if success and chksum:
+                                            chksum_files.append((rel_path.strip(os.sep), isdirectory))
+                                        no_files_missing = no_files_missing and success
+                                    else:
+                                        download_path = _get_download_path(download_root, rel_path.strip(os.sep), ic_filepath)
+                                        downloads.add(rel_path.strip(os.sep), download_path)
+                                        downloaded_rel_paths[download_path] = rel_path.strip(os.sep)
                                 else:
-                                    no_files_missing = _download_if_in_repo(server,
-                                                                            input_data_root, rel_path.strip(os.sep),
-                                                                            isdirectory=isdirectory, ic_filepath=ic_filepath)
-                                if no_files_missing and chksum:
-                                    verify_chksum(input_data_root, rundir, rel_path.strip(os.sep), isdirectory)
-                        else:
-                            if chksum:
-                                verify_chksum(input_data_root, rundir, rel_path.strip(os.sep), isdirectory)
-                                logger.info("Chksum passed for file {}".format(os.path.join(input_data_root,rel_path)))
-                            logger.debug("  Already had input file: '{}'".format(full_path))
-                else:
-                    model = os.path.basename(data_list_file).split('.')[0]
-                    logger.warning("Model {} no file specified for {}".format(model, description))
+                                    no_files_missing = False
+                            else:
+                                if chksum:
+                                    chksum_files.append((rel_path.strip(os.sep), isdirectory))
+                                logger.debug("  Already had input file: '{}'".format(full_path))
+                    else:
+                        model = os.path.basename(data_list_file).split('.')[0]
+                        logger.warning("Model {} no file specified for {}".format(model, description))
+
+        if download and downloads:
+            # Use umask to make sure files are group read/writable. As long as parent directories
+            # have +s, then everything should work.
+            with SharedArea():
+                downloaded = downloads.download()
+            index.add_files([download_path for download_path, success in downloaded.items() if success])
+            for download_path, success in sorted(downloaded.items()):
+                if success and chksum:
+                    chksum_files.append((downloaded_rel_paths[download_path], False))
+                no_files_missing = no_files_missing and success
+
+        if chksum_files:
+            verify_chksums(input_data_root, rundir, chksum_files, index=index)
+    finally:
+        index.close()
 
     return no_files_missing
 
+def _reset_chksum_hash():
+    """
+    Forget the checksums read from the checksum file, it will be read again
+    """
+    global _CHKSUM_HASH_FILE
+    chksum_hash.clear()
+    _CHKSUM_HASH_FILE = None
+
+def _load_chksum_hash(hashfile):
+    """
+    Read hashfile into chksum_hash, unless it has already been read.
+    Returns False if there is no hashfile.
+    """
+    global _CHKSUM_HASH_FILE
+    if _CHKSUM_HASH_FILE == hashfile:
+        return True
+    if not os.path.isfile(hashfile):
+        logger.warning("Failed to find or download file {}".format(hashfile))
+        return False
+
+    chksum_hash.clear()
+    with open(hashfile) as fd:
+        for line in fd:
+            fchksum, fname = line.split()
+            if fname in chksum_hash:
+                expect(chksum_hash[fname] == fchksum, " Inconsistent hashes in chksum for file {}".format(fname))
+            else:
+                chksum_hash[fname] = fchksum
+    _CHKSUM_HASH_FILE = hashfile
+    return True
+
 def verify_chksum(input_data_root, rundir, filename, isdirectory):
     """
     For file in filename perform a chksum and compare the result to that stored in
     the local checksumfile, if isdirectory chksum all files in the directory of form *.*
     """
-    hashfile = os.path.join(rundir, local_chksum_file)
-    if not chksum_hash:
-        if not os.path.isfile(hashfile):
-            logger.warning("Failed to find or download file {}".format(hashfile))
-            return
+    verify_chksums(input_data_root, rundir, [(filename, isdirectory)])
 
-        with open(hashfile) as fd:
-            lines = fd.readlines()
-            for line in lines:
-                fchksum, fname = line.split()
-                if fname in chksum_hash:
-                    expect(chksum_hash[fname] == fchksum, " Inconsistent hashes in chksum for file {}".format(fname))
-                else:
-                    chksum_hash[fname] = fchksum
+def verify_chksums(input_data_root, rundir, files, index=None):
+    """
+    Same as verify_chksum for every (filename, isdirectory) in files.
 
-    if isdirectory:
-        filenames = glob.glob(os.path.join(filename,"*.*"))
-    else:
-        filenames = [filename]
-    for fname in filenames:
-        if not os.sep in fname:
-            continue
-        chksum = md5(os.path.join(input_data_root, fname))
-        if chksum_hash:
+    Checksums are computed by a pool of threads (hashlib releases the GIL
+    while hashing). Checksums of unchanged files already verified by any
+    case using input_data_root are taken from the inputdata index instead;
+    index is the InputdataIndex of input_data_root if the caller has one.
+    """
+    hashfile = os.path.join(rundir, local_chksum_file)
+    if not _load_chksum_hash(hashfile) or not chksum_hash:
+        return
+
+    fnames, seen = [], set()
+    for filename, isdirectory in files:
+        if isdirectory:
+            dir_fnames = glob.glob(os.path.join(filename,"*.*"))
+        else:
+            dir_fnames = [filename]
+        for fname in dir_fnames:
+            if not os.sep in fname or fname in seen:
+                continue
+            seen.add(fname)
             if not fname in chksum_hash:
                 logger.warning("Did not find hash for file {} in chksum file {}".format(filename, hashfile))
             else:
+                fnames.append(fname)
+
+    own_index = index is None
+    if own_index:
+        index = InputdataIndex(input_data_root)
+    try:
+        to_compute = []
+        for fname in fnames:
+            full_path = os.path.join(input_data_root, fname)
+            stat = os.stat(full_path)
+            if index.get_chksum(full_path, stat=stat) == chksum_hash[fname]:
+                logger.debug("Chksum already verified for file {}".format(full_path))
+            else:
+                to_compute.append((fname, full_path, stat))
+
+        if to_compute:
+            pool = ThreadPool(min(_CHKSUM_THREADS, len(to_compute)))
+            try:
+                chksums = pool.map(md5, [full_path for _, full_path, _ in to_compute])
+            finally:
+                pool.close()
+                pool.join()
+
+            index.set_chksums([(full_path, stat, chksum)
+                               for (_, full_path, stat), chksum in zip(to_compute, chksums)])
+            for (fname, full_path, _), chksum in zip(to_compute, chksums):
                 expect(chksum == chksum_hash[fname],
                        "chksum mismatch for file {} expected {} found {}".
-                       format(os.path.join(input_data_root,fname),chksum, chksum_hash[fname]))
+                       format(full_path,chksum, chksum_hash[fname]))
+    finally:
+        if own_index:
+            index.close()
+
+    logger.info("Chksum passed for {:d} files, {:d} of them previously verified".
+                format(len(fnames), len(fnames) - len(to_compute)))
 
 def md5(fname):
     """
@@ -422,6 +535,6 @@ def md5(fname):
     """
     hash_md5 = hashlib.md5()
     with open(fname, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(_CHKSUM_READ_SIZE), b""):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
@@ -5,9 +5,13 @@ create_dirs and create_namelists are members of Class case from file case.py
 
 from CIME.XML.standard_module_setup import *
 from CIME.utils import run_sub_or_cmd, safe_copy
-import time, glob
+import time, glob, multiprocessing, shutil, tempfile
 logger = logging.getLogger(__name__)
 
+# The case whose buildnml scripts are run by _buildnml_worker, only set in
+# the worker processes, by _init_buildnml_worker
+_BUILDNML_CASE = None
+
 def create_dirs(self):
     """
     Make necessary directories for case
@@ -43,6 +47,112 @@ def create_dirs(self):
         with open(os.path.join(dir_,"CASEROOT"),"w+") as fd:
             fd.write(caseroot+"\n")
 
+def _run_buildnml(case, caseroot, buildnml):
+    model_str, compname, cmd = buildnml
+    logger.info("  {} {} ".format(time.strftime("%Y-%m-%d %H:%M:%S"),model_str))
+    run_sub_or_cmd(cmd, (caseroot), "buildnml",
+                   (case, caseroot, compname), case=case)
+
+def _init_buildnml_worker(case):
+    """
+    Initializer of the buildnml worker processes. Each pool passes its own
+    case, also to the workers it forks to replace those that are done.
+    """
+    global _BUILDNML_CASE
+    _BUILDNML_CASE = case
+
+def _buildnml_worker(args):
+    """
+    Run one buildnml in a worker process, returns (error, case_modified)
+    """
+    caseroot, model_str, compname, cmd, logfile = args
+    # Output is written to logfile and logged by the parent in model order
+    logging.getLogger().handlers = []
+    case = _BUILDNML_CASE
+    env_file_times = _get_env_file_times(case)
+    try:
+        run_sub_or_cmd(cmd, (caseroot), "buildnml",
+                       (case, caseroot, compname), logfile=logfile, case=case)
+    except BaseException as e: # pylint: disable=broad-except
+        return "{} buildnml failed: {}".format(model_str, e), False
+
+    # Changes to the case made here would be lost with this process. An env
+    # file written while this buildnml ran may have been written by another
+    # one, rerunning both is harmless.
+    return None, (any(env_file.needsrewrite for env_file in case._files) or # pylint: disable=protected-access
+                  _get_env_file_times(case) != env_file_times)
+
+def _get_env_file_times(case):
+    return [(env_file.filename, os.path.getmtime(env_file.filename))
+            for env_file in case._files if os.path.isfile(env_file.filename)] # pylint: disable=protected-access
+
+def _run_buildnmls_concurrently(case, caseroot, buildnmls, nprocs=None):
+    """
+    Run buildnmls, a list of (model, compname, buildnml path), in up to
+    nprocs (default one per cpu) forked worker processes and log their output
+    in order. Returns the buildnmls that have to be run serially instead,
+    after rereading the case: those that failed or changed the case, or all
+    of them if they could not be run concurrently.
+    """
+    nprocs = min(len(buildnmls), nprocs or multiprocessing.cpu_count())
+    if nprocs < 2:
+        return buildnmls
+
+    try:
+        context = multiprocessing.get_context("fork")
+    except AttributeError:
+        # python 2 always forks
+        context = multiprocessing
+    except ValueError:
+        logger.debug("fork not available, running buildnml serially")
+        return buildnmls
+
+    logdir = tempfile.mkdtemp(prefix="buildnml.")
+    env_file_times = _get_env_file_times(case)
+    args = [(caseroot, model_str, compname, cmd, os.path.join(logdir, "{}.log".format(model_str)))
+            for model_str, compname, cmd in buildnmls]
+    logger.info("  Running {:d} buildnml scripts with {:d} processes".format(len(buildnmls), nprocs))
+
+    # A fresh process for each buildnml, so that none sees the changes to the case of another
+    pool = context.Pool(nprocs, initializer=_init_buildnml_worker, initargs=(case,), maxtasksperchild=1)
+    try:
+        results = pool.map(_buildnml_worker, args)
+    finally:
+        pool.close()
+        pool.join()
+
+    rerun = [buildnml for buildnml, (error, case_modified) in zip(buildnmls, results)
+             if error is not None or case_modified]
+    if not rerun and _get_env_file_times(case) != env_file_times:
+        # Written by something other than the buildnmls, which may all have read it partly written
+        rerun = buildnmls
+
+    try:
+        for (_, model_str, _, cmd, logfile), buildnml, (error, case_modified) in zip(args, buildnmls, results):
+            if error is not None:
+                logger.warning(error)
+            elif case_modified:
+                logger.warning("{} buildnml changed the case".format(model_str))
+            if buildnml in rerun:
+                continue
+
+            logger.info("  {} {} ".format(time.strftime("%Y-%m-%d %H:%M:%S"), model_str))
+            logger.info("   Calling {}".format(cmd))
+            if os.path.isfile(logfile):
+                with open(logfile) as fd:
+                    output = fd.read().rstrip()
+                if output:
+                    logger.info(output)
+    finally:
+        shutil.rmtree(logdir, ignore_errors=True)
+
+    if rerun:
+        logger.warning("  Running buildnml serially for {}".format(", ".join(model_str for model_str, _, _ in rerun)))
+        # Pick up any changes made to the env files
+        case.read_xml()
+
+    return rerun
+
 def create_namelists(self, component=None):
     """
     Create component namelists
@@ -69,9 +179,9 @@ def create_namelists(self, component=None):
     # it can use xml vars potentially set by other component's buildnml scripts
     models = self.get_values("COMP_CLASSES")
     models += [models.pop(0)]
+    buildnmls = []
     for model in models:
         model_str = model.lower()
-        logger.info("  {} {} ".format(time.strftime("%Y-%m-%d %H:%M:%S"),model_str))
         config_file = self.get_value("CONFIG_{}_FILE".format(model_str.upper()))
         config_dir = os.path.dirname(config_file)
         if model_str == "cpl":
@@ -87,10 +197,18 @@ def create_namelists(self, component=None):
                 # otherwise look in the component config_dir
                 cmd = os.path.join(config_dir, "buildnml")
             expect(os.path.isfile(cmd), "Could not find buildnml file for component {}".format(compname))
-            run_sub_or_cmd(cmd, (caseroot), "buildnml",
-                           (self, caseroot, compname), case=self)
-
-        logger.debug("Finished creating component namelists, component {} models = {}".format(component, models))
+            buildnmls.append((model_str, compname, cmd))
+
+    # The buildnml of each component other than cpl is independent of the
+    # others, so run them concurrently, then serially those that cannot be
+    concurrent = [buildnml for buildnml in buildnmls if buildnml[0] != "cpl"]
+    for buildnml in _run_buildnmls_concurrently(self, caseroot, concurrent):
+        _run_buildnml(self, caseroot, buildnml)
+    for buildnml in buildnmls:
+        if buildnml[0] == "cpl":
+            _run_buildnml(self, caseroot, buildnml)
+
+    logger.debug("Finished creating component namelists, component {} models = {}".format(component, models))
 
     # Save namelists to docdir
     if (not os.path.isdir(docdir)):
@@ -1,4 +1,4 @@
-import os, re, logging, six
+import os, re, logging, six, hashlib
 
 from collections import OrderedDict
 from CIME.utils  import expect, CIMEError
@@ -6,6 +6,24 @@ logger=logging.getLogger(__name__)
 
 # pragma pylint: disable=unsubscriptable-object
 
+_LIST_SEPARATOR_RE = re.compile(r"('[^']*'?)|[\s,]+")
+_COMMA_RE          = re.compile(r'\s*,\s*')
+_DICT_RE           = re.compile(r"^'(\S+)\s*->\s*(\S+)\s*'")
+_COMMENT_RE        = re.compile(r'^[#!]')
+_NAMELIST_RE       = re.compile(r'^&(\S+)$')
+_NAME_RE           = re.compile(r"^([^\s=']+)\s*=\s*(.+)$")
+_RCLINE_RE         = re.compile(r"^([^&\s':]+)\s*:\s*(.+)$")
+
+# Parsed namelist files keyed by the sha1 of their contents, so that files
+# shared by many tests of a suite (and the baseline copies of unchanged files)
+# are only read once per process. Values are (namelists, group hashes) or the
+# False if the content could not be parsed.
+_PARSED_FILES = OrderedDict()
+_PARSED_FILES_MAX = 2000
+
+# case id -> compiled regex used by _normalize_string_value
+_CASE_RES = {}
+
 ###############################################################################
 def _normalize_lists(value_str):
 ###############################################################################
@@ -21,47 +39,19 @@ def _normalize_lists(value_str):
     >>> _normalize_lists("1 2  3, 4 ,  5")
     '1,2,3,4,5'
     """
-    result = ""
-    inside_quotes = False
-    idx = 0
-    while idx < len(value_str):
-        value_c = value_str[idx]
-        if value_c == "'":
-            inside_quotes = not inside_quotes
-            result += value_c
-            idx += 1
-        elif value_c.isspace() or value_c == ",":
-            if inside_quotes:
-                result += value_c
-                idx += 1
-            else:
-                result += ","
-                idx += 1
-                while idx < len(value_str):
-                    value_c = value_str[idx]
-                    if not value_c.isspace() and value_c != ",":
-                        break
-                    idx += 1
-        else:
-            result += value_c
-            idx += 1
-
-    return result
+    return _LIST_SEPARATOR_RE.sub(lambda m: m.group(1) or ",", value_str)
 
 ###############################################################################
 def _interpret_value(value_str, filename):
 ###############################################################################
-    comma_re = re.compile(r'\s*,\s*')
-    dict_re = re.compile(r"^'(\S+)\s*->\s*(\S+)\s*'")
-
     value_str = _normalize_lists(value_str)
 
-    tokens = [item.strip() for item in comma_re.split(value_str) if item.strip() != ""]
+    tokens = [item.strip() for item in _COMMA_RE.split(value_str) if item.strip() != ""]
     if ("->" in value_str):
         # dict
         rv = OrderedDict()
         for token in tokens:
-            m = dict_re.match(token)
+            m = _DICT_RE.match(token)
             expect(m is not None, "In file '{}', Dict entry '{}' does not match expected format".format(filename, token))
             k, v = m.groups()
             rv[k] = _interpret_value(v, filename)
@@ -174,10 +164,7 @@ def _parse_namelists(namelist_lines, filename):
     OrderedDict([('nml', OrderedDict([('val', ["'a brown cow'", "'a red hen'"])]))])
     """
 
-    comment_re = re.compile(r'^[#!]')
-    namelist_re = re.compile(r'^&(\S+)$')
-    name_re = re.compile(r"^([^\s=']+)\s*=\s*(.+)$")
-    rcline_re = re.compile(r"^([^&\s':]+)\s*:\s*(.+)$")
+    debug = logger.isEnabledFor(logging.DEBUG)
 
     rv = OrderedDict()
     current_namelist = None
@@ -187,19 +174,21 @@ def _parse_namelists(namelist_lines, filename):
         line = line.strip()
         line = line.replace('"',"'")
 
-        logger.debug("Parsing line: '{}'".format(line))
+        if debug:
+            logger.debug("Parsing line: '{}'".format(line))
 
-        if (line == "" or comment_re.match(line) is not None):
-            logger.debug("  Line was whitespace or comment, skipping.")
+        if (line == "" or _COMMENT_RE.match(line) is not None):
+            if debug:
+                logger.debug("  Line was whitespace or comment, skipping.")
             continue
 
-        rcline = rcline_re.match(line)
+        rcline = _RCLINE_RE.match(line)
         if (rcline is not None):
             # Defining a variable (AKA name)
             name, value = rcline.groups()
 
-
-            logger.debug("  Parsing variable '{}' with data '{}'".format(name, value))
+            if debug:
+                logger.debug("  Parsing variable '{}' with data '{}'".format(name, value))
 
             if 'seq_maps.rc' not in rv:
                 rv['seq_maps.rc'] = OrderedDict()
@@ -215,34 +204,38 @@ def _parse_namelists(namelist_lines, filename):
             # Unfortunately, other tools were using the old compare_namelists.pl script
             # to compare files that are not namelist files. We need a special error
             # to signify this event
-            if (namelist_re.match(line) is None):
+            namelist = _NAMELIST_RE.match(line)
+            if (namelist is None):
                 expect(rv != OrderedDict(),
                        "File '{}' does not appear to be a namelist file, skipping".format(filename))
                 expect(False,
                        "In file '{}', Line '{}' did not begin a namelist as expected".format(filename, line))
 
-            current_namelist = namelist_re.match(line).groups()[0]
+            current_namelist = namelist.groups()[0]
             expect(current_namelist not in rv,
                    "In file '{}', Duplicate namelist '{}'".format(filename, current_namelist))
 
             rv[current_namelist] = OrderedDict()
 
-            logger.debug("  Starting namelist '{}'".format(current_namelist))
+            if debug:
+                logger.debug("  Starting namelist '{}'".format(current_namelist))
 
         elif (line == "/"):
             # Ends a namelist
-            logger.debug("  Ending namelist '{}'".format(current_namelist))
+            if debug:
+                logger.debug("  Ending namelist '{}'".format(current_namelist))
 
             expect(multiline_variable is None,
                    "In file '{}', Incomplete multiline variable: '{}'".format(filename, multiline_variable[0] if multiline_variable is not None else ""))
 
             current_namelist = None
 
-        elif (name_re.match(line)):
+        elif (_NAME_RE.match(line)):
             # Defining a variable (AKA name)
-            name, value_str = name_re.match(line).groups()
+            name, value_str = _NAME_RE.match(line).groups()
 
-            logger.debug("  Parsing variable '{}' with data '{}'".format(name, value_str))
+            if debug:
+                logger.debug("  Parsing variable '{}' with data '{}'".format(name, value_str))
 
             expect(multiline_variable is None,
                    "In file '{}', Incomplete multiline variable: '{}'".format(filename, multiline_variable[0] if multiline_variable is not None else ""))
@@ -251,18 +244,21 @@ def _parse_namelists(namelist_lines, filename):
             real_value = _interpret_value(value_str, filename)
 
             rv[current_namelist][name] = real_value
-            logger.debug("    Adding value: {}".format(real_value))
+            if debug:
+                logger.debug("    Adding value: {}".format(real_value))
 
             if (line.endswith(",")):
                 # Value will continue on in subsequent lines
                 multiline_variable = (name, real_value)
 
-                logger.debug("    Var is multiline...")
+                if debug:
+                    logger.debug("    Var is multiline...")
 
         elif (multiline_variable is not None):
             # Continuation of list or dict variable
             current_value = multiline_variable[1]
-            logger.debug("  Continuing multiline variable '{}' with data '{}'".format(multiline_variable[0], line))
+            if debug:
+                logger.debug("  Continuing multiline variable '{}' with data '{}'".format(multiline_variable[0], line))
 
             real_value = _interpret_value(line, filename)
             if (type(current_value) is list):
@@ -277,19 +273,74 @@ def _parse_namelists(namelist_lines, filename):
             else:
                 expect(False, "In file '{}', Continuation should have been for list or dict, instead it was: '{}'".format(filename, type(current_value)))
 
-            logger.debug("    Adding value: {}".format(real_value))
+            if debug:
+                logger.debug("    Adding value: {}".format(real_value))
 
             if (not line.endswith(",")):
                 # Completed
                 multiline_variable = None
 
-                logger.debug("    Terminating multiline variable")
+                if debug:
+                    logger.debug("    Terminating multiline variable")
 
         else:
             expect(False, "In file '{}', Unrecognized line: '{}'".format(filename, line))
 
     return rv
 
+###############################################################################
+def _hash_namelists(namelists):
+###############################################################################
+    """
+    Return {namelist -> hash} of the values in each namelist. Namelists with
+    equal hashes hold identical values, so _compare_namelists can skip them
+    without looking at their variables.
+
+    >>> teststr = '''&nml
+    ...   val = 'foo'
+    ... /
+    ... &nml2
+    ...   val2 = 1, 2
+    ... /'''
+    >>> hashes = _hash_namelists(_parse_namelists(teststr.splitlines(), 'foo'))
+    >>> list(hashes.keys())
+    ['nml', 'nml2']
+    >>> other = _hash_namelists(_parse_namelists(teststr.replace('1, 2', '2*1').splitlines(), 'bar'))
+    >>> hashes['nml'] == other['nml'], hashes['nml2'] == other['nml2']
+    (True, False)
+    """
+    return OrderedDict((namelist, hashlib.sha1(repr(list(names.items())).encode("utf-8")).hexdigest())
+                       for namelist, names in namelists.items())
+
+###############################################################################
+def _read_namelist_file(filename):
+###############################################################################
+    """
+    Return (namelists, namelist hashes) for filename. Each distinct file
+    content is only parsed once per process.
+    """
+    with open(filename, "rb") as fd:
+        content = fd.read()
+
+    digest = hashlib.sha1(content).hexdigest()
+    result = _PARSED_FILES.get(digest)
+    if result is None:
+        try:
+            namelists = _parse_namelists(content.decode("utf-8", "replace").splitlines(), filename)
+            result = (namelists, _hash_namelists(namelists))
+        except CIMEError:
+            result = False
+
+        if len(_PARSED_FILES) >= _PARSED_FILES_MAX:
+            _PARSED_FILES.popitem(last=False)
+        _PARSED_FILES[digest] = result
+
+    if result is False:
+        # Reparse to raise the error against this file's name
+        _parse_namelists(content.decode("utf-8", "replace").splitlines(), filename)
+
+    return result
+
 ###############################################################################
 def _normalize_string_value(name, value, case):
 ###############################################################################
@@ -300,7 +351,10 @@ def _normalize_string_value(name, value, case):
     """
     # Any occurance of case must be normalized because test-ids might not match
     if (case is not None):
-        case_re = re.compile(r'{}[.]([GC]+)[.]([^./\s]+)'.format(case))
+        case_re = _CASE_RES.get(case)
+        if case_re is None:
+            case_re = re.compile(r'{}[.]([GC]+)[.]([^./\s]+)'.format(case))
+            _CASE_RES[case] = case_re
         value = case_re.sub("{}.ACTION.TESTID".format(case), value)
 
     if (name in ["runid", "model_version", "username"]):
@@ -376,7 +430,7 @@ def _compare_values(name, gold_value, comp_value, case):
     return comments
 
 ###############################################################################
-def _compare_namelists(gold_namelists, comp_namelists, case):
+def _compare_namelists(gold_namelists, comp_namelists, case, gold_hashes=None, comp_hashes=None):
 ###############################################################################
     """
     Compare two namelists. Print diff information if any.
@@ -386,6 +440,9 @@ def _compare_namelists(gold_namelists, comp_namelists, case):
     Expect args in form: {namelist -> {key -> value} }.
       value can be an int, string, list, or dict
 
+    gold_hashes and comp_hashes are the optional _hash_namelists of the two,
+    namelists with the same hash in both are skipped.
+
     >>> teststr = '''&nml
     ...   val = 'foo'
     ...   aval = 'one','two', 'three'
@@ -496,6 +553,9 @@ def _compare_namelists(gold_namelists, comp_namelists, case):
     for namelist, gold_names in gold_namelists.items():
         if (namelist not in comp_namelists):
             different_namelists[namelist] = ["Missing namelist: {}\n".format(namelist)]
+        elif (gold_hashes is not None and comp_hashes is not None and
+              gold_hashes[namelist] == comp_hashes[namelist]):
+            continue
         else:
             comp_names = comp_namelists[namelist]
             for name, gold_value in gold_names.items():
@@ -534,16 +594,42 @@ def compare_namelist_files(gold_file, compare_file, case=None):
     expect(os.path.exists(gold_file), "File not found: {}".format(gold_file))
     expect(os.path.exists(compare_file), "File not found: {}".format(compare_file))
 
-    gold_namelists = _parse_namelists(open(gold_file, "r").readlines(), gold_file)
-    comp_namelists = _parse_namelists(open(compare_file, "r").readlines(), compare_file)
-    comments = _compare_namelists(gold_namelists, comp_namelists, case)
+    gold_namelists, gold_hashes = _read_namelist_file(gold_file)
+    comp_namelists, comp_hashes = _read_namelist_file(compare_file)
+    if gold_hashes == comp_hashes:
+        return True, ""
+
+    comments = _compare_namelists(gold_namelists, comp_namelists, case,
+                                  gold_hashes=gold_hashes, comp_hashes=comp_hashes)
     return comments == "", comments
 
+###############################################################################
+def compare_namelist_file_pairs(file_pairs, case=None):
+###############################################################################
+    """
+    compare_namelist_files for each pair of file_pairs, a list of
+    (gold_file, compare_file) or (gold_file, compare_file, case), case
+    defaults to the case argument. Used to compare the namelist files of a
+    test.
+
+    Returns a list of (is_match, comments), one per pair. Parsed files are
+    cached by content for the whole process (see _read_namelist_file), so
+    the baseline and test copies of an unchanged file are parsed once, as
+    are identical files of the tests compared one after the other by
+    compare_test_results.
+    """
+    results = []
+    for file_pair in file_pairs:
+        gold_file, compare_file = file_pair[:2]
+        results.append(compare_namelist_files(gold_file, compare_file,
+                                              file_pair[2] if len(file_pair) > 2 else case))
+    return results
+
 ###############################################################################
 def is_namelist_file(file_path):
 ###############################################################################
     try:
-        compare_namelist_files(file_path, file_path)
+        _read_namelist_file(file_path)
     except CIMEError as e:
         assert "does not appear to be a namelist file" in str(e), str(e)
         return False
@@ -0,0 +1,201 @@
+"""
+Single pass analysis of coupler (cpl/med) log files.
+
+The system tests look at the coupler log of a run, and at the coupler log
+stored with the baselines, for the memory highwater series (memleak and
+memory comparisons), the throughput (throughput comparison) and whether the
+run terminated successfully. get_cpl_log_summary reads a log, gzipped or
+not, once and extracts all of these while streaming through it. The summary
+is cached in a small sidecar file next to the log, so later checks and later
+tests comparing against the same baseline log do not decompress it again.
+"""
+from CIME.XML.standard_module_setup import *
+
+import gzip, json, re
+
+logger = logging.getLogger(__name__)
+
+# Bump when the contents of the summary change, older sidecars are ignored
+_SUMMARY_VERSION = 1
+
+_MEMORY_RE     = re.compile(r".*model date =\s+(\w+).*memory =\s+(\d+\.?\d+).*highwater")
+_THROUGHPUT_RE = re.compile(r"# simulated years / cmp-day =\s+(\d+\.\d+)\s")
+_TIMING_RE     = re.compile(r"(# simulated days \(this run\)|compute time \(hrs\)|# simulated years / cmp-day)\s*=\s*(\S+)")
+
+_TIMING_KEYS = {"# simulated days (this run)" : "simulated_days",
+                "compute time (hrs)"          : "compute_hours",
+                "# simulated years / cmp-day" : "sypd"}
+
+_BLOCK_SIZE = 4 * 1024 * 1024
+
+# realpath -> (stamp, summary) of the logs summarized by this process
+_SUMMARIES = {}
+
+def get_cpl_log_summary_path(cpllog):
+    """
+    Returns the path of the sidecar file caching the summary of cpllog. The
+    name starts with a dot so that it does not match cpl*.log.* globs.
+
+    >>> get_cpl_log_summary_path("/rundir/cpl.log.1234.gz")
+    '/rundir/.cpl.log.1234.gz.summary.json'
+    """
+    return os.path.join(os.path.dirname(cpllog), ".{}.summary.json".format(os.path.basename(cpllog)))
+
+def _get_stamp(cpllog):
+    st = os.stat(cpllog)
+    return [st.st_size, st.st_mtime]
+
+def _parse_cpl_log(fd):
+    r"""
+    Returns the summary of the log read from binary file object fd
+
+    >>> import io
+    >>> log = b'''(seq_mct_drv): ===============      SUCCESSFUL TERMINATION OF CPL7-e3sm ===============
+    ... tStamp_write: model date =   00010102       0 wall clock = 2019-01-01 10:00:00 avg dt =     1.00 dt =     1.00
+    ... memory_write: model date =   00010102       0 memory =    1000.10 MB (highwater)      900.00 MB (usage)  (pe=    0 comps= cpl)
+    ... memory_write: model date =   00010103       0 memory =    1200.00 MB (highwater)      950.00 MB (usage)  (pe=    0 comps= cpl)
+    ... (cime_final) # simulated days (this run) =        5.000
+    ... (cime_final) compute time (hrs)          =        0.010
+    ... (cime_final) # simulated years / cmp-day =       32.877
+    ... '''
+    >>> summary = _parse_cpl_log(io.BytesIO(log))
+    >>> summary["memory"], summary["throughput"], summary["successful"]
+    ([[10102.0, 1000.1], [10103.0, 1200.0]], 32.877, True)
+    >>> sorted(summary["timing"].items())
+    [('compute_hours', 0.01), ('simulated_days', 5.0), ('sypd', 32.877)]
+    """
+    memory = []
+    throughput = None
+    timing = {}
+    successful = False
+    for block in _iter_line_blocks(fd):
+        for line in _iter_lines_containing(block, b"highwater"):
+            m = _MEMORY_RE.match(line.decode("utf-8", "replace"))
+            if m:
+                memory.append([float(m.group(1)), float(m.group(2))])
+
+        for token in (b"# simulated", b"compute time"):
+            for line in _iter_lines_containing(block, token):
+                text = line.decode("utf-8", "replace")
+                if throughput is None:
+                    m = _THROUGHPUT_RE.search(text)
+                    if m:
+                        throughput = float(m.group(1))
+                m = _TIMING_RE.search(text)
+                if m:
+                    try:
+                        timing[_TIMING_KEYS[m.group(1)]] = float(m.group(2))
+                    except ValueError:
+                        pass
+
+        if not successful and b"SUCCESSFUL TERMINATION" in block:
+            successful = True
+
+    return {"memory" : memory, "throughput" : throughput, "timing" : timing, "successful" : successful}
+
+def _iter_line_blocks(fd):
+    r"""
+    Yields the contents of binary file object fd in blocks of whole lines
+
+    >>> import io
+    >>> list(_iter_line_blocks(io.BytesIO(b"one\ntwo\nthree"))) == [b"one\ntwo\n", b"three"]
+    True
+    """
+    rest = b""
+    while True:
+        chunk = fd.read(_BLOCK_SIZE)
+        if not chunk:
+            if rest:
+                yield rest
+            return
+
+        chunk = rest + chunk
+        end = chunk.rfind(b"\n") + 1
+        rest = chunk[end:]
+        if end > 0:
+            yield chunk[:end]
+
+def _iter_lines_containing(block, token):
+    r"""
+    Yields the lines of block that contain token, in order. Scanning with
+    bytes.find is much faster than looping over every line in python.
+
+    >>> list(_iter_lines_containing(b"a = 1\nb\nc = 2 = 3\n", b"=")) == [b"a = 1\n", b"c = 2 = 3\n"]
+    True
+    """
+    pos = block.find(token)
+    while pos >= 0:
+        start = block.rfind(b"\n", 0, pos) + 1
+        end = block.find(b"\n", pos)
+        end = len(block) if end < 0 else end + 1
+        yield block[start:end]
+        pos = block.find(token, end)
+
+def _read_summary_file(cpllog, stamp):
+    """
+    Returns the summary cached in the sidecar of cpllog if it is up to date
+    """
+    summary_path = get_cpl_log_summary_path(cpllog)
+    if not os.path.isfile(summary_path):
+        return None
+
+    try:
+        with open(summary_path, "r") as fd:
+            cached = json.load(fd)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if isinstance(cached, dict) and cached.get("version") == _SUMMARY_VERSION and cached.get("stamp") == stamp:
+        return cached.get("summary")
+    return None
+
+def write_cpl_log_summary(cpllog, summary, stamp=None):
+    """
+    Cache summary, as returned by get_cpl_log_summary, in the sidecar of
+    cpllog. Used to save the summary of a log copied to the baselines
+    without reading the copy. Directories we cannot write to (e.g. shared
+    baselines) are silently skipped.
+    """
+    stamp = _get_stamp(cpllog) if stamp is None else stamp
+    summary_path = get_cpl_log_summary_path(cpllog)
+    tmp_path = "{}.{:d}".format(summary_path, os.getpid())
+    try:
+        with open(tmp_path, "w") as fd:
+            json.dump({"version" : _SUMMARY_VERSION, "stamp" : stamp, "summary" : summary}, fd)
+        os.rename(tmp_path, summary_path)
+    except (IOError, OSError) as e:
+        logger.debug("Could not write coupler log summary {}: {}".format(summary_path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _SUMMARIES[os.path.realpath(cpllog)] = (stamp, summary)
+
+def get_cpl_log_summary(cpllog):
+    """
+    Returns the summary of coupler log cpllog (gzipped if its name ends in
+    .gz), a dict with
+      memory:     list of [model date, memory highwater in MB], in log order
+      throughput: simulated years per compute day, None if not in the log
+      timing:     dict of simulated_days, compute_hours and sypd found in the
+                  final timing lines
+      successful: True if the log reports SUCCESSFUL TERMINATION
+    The log is only read if neither this process nor its sidecar has a
+    summary of its current contents.
+    """
+    stamp = _get_stamp(cpllog)
+    key = os.path.realpath(cpllog)
+    if key in _SUMMARIES and _SUMMARIES[key][0] == stamp:
+        return _SUMMARIES[key][1]
+
+    summary = _read_summary_file(cpllog, stamp)
+    if summary is None:
+        fopen = gzip.open if cpllog.endswith(".gz") else open
+        with fopen(cpllog, "rb") as fd:
+            summary = _parse_cpl_log(fd)
+
+        # The stamp from before the log was read, a log still being
+        # written is summarized again next time
+        write_cpl_log_summary(cpllog, summary, stamp=stamp)
+    else:
+        _SUMMARIES[key] = (stamp, summary)
+
+    return summary
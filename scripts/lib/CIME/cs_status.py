@@ -6,7 +6,7 @@ of the tests in one or more test suites
 from __future__ import print_function
 from CIME.XML.standard_module_setup import *
 from CIME.XML.expected_fails_file import ExpectedFailsFile
-from CIME.test_status import TestStatus
+from CIME.test_status import get_test_statuses
 import os
 import sys
 from collections import defaultdict
@@ -43,11 +43,10 @@ def cs_status(test_paths, summary=False, fails_only=False,
         count_fails_phase_list = []
     non_pass_counts = dict.fromkeys(count_fails_phase_list, 0)
     xfails = _get_xfails(expected_fails_filepath)
-    test_id_output = defaultdict(str)
+    test_id_output = defaultdict(list)
     test_id_counts = defaultdict(int)
-    for test_path in test_paths:
+    for test_path, ts in zip(test_paths, get_test_statuses(test_paths)):
         test_dir=os.path.dirname(test_path)
-        ts = TestStatus(test_dir=test_dir)
         test_id = os.path.basename(test_dir).split(".")[-1]
         if summary:
             output = _overall_output(ts, "  {status} {test_name}\n")
@@ -63,13 +62,13 @@ def cs_status(test_paths, summary=False, fails_only=False,
             if count_fails_phase_list:
                 ts.increment_non_pass_counts(non_pass_counts)
 
-        test_id_output[test_id] += output
+        test_id_output[test_id].append(output)
         test_id_counts[test_id] += 1
 
     for test_id in sorted(test_id_output):
         count = test_id_counts[test_id]
         print("{}: {} test{}".format(test_id, count, 's' if count > 1 else ''), file=out)
-        print(test_id_output[test_id], file=out)
+        print("".join(test_id_output[test_id]), file=out)
         print(' ', file=out)
 
     if count_fails_phase_list:
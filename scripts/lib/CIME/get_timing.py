@@ -3,15 +3,242 @@
 """
 Library for implementing getTiming tool which gets timing
 information from a run.
+
+The timing file of the run (model_timing_stats for the mct driver,
+ESMF_Profile.summary for nuopc) is parsed once into an index of its timers,
+see parse_timing_file, and the report is written from that index. A json
+version of the report, including the index, is written next to the text
+report. compare_timing_reports compares these json reports, system tests use
+it to compare the timing of a run with that of its baseline.
 """
 
 from CIME.XML.standard_module_setup import *
 from CIME.utils import safe_copy
 
-import datetime, re
+import datetime, json, re
 
 logger = logging.getLogger(__name__)
 
+# model_timing_stats: "name" on processes threads count walltotal wallmax (proc thrd) wallmin (proc thrd)
+_MCT_NAME_RE   = re.compile(r'\s*"([^"]*)"')
+_MCT_TIME_RE   = re.compile(r'\s+\S\s+\d+\s*\d+\s*\S+\s*\S+\s*(\d*\.\d+)\s*\(.*\)\s*(\d*\.\d+)\s*\(.*\)')
+_MCT_COUNT_RE  = re.compile(r'\s+\S\s+(\d+)\s*\d+\s*(\S+)')
+_MCT_COUNT1_RE = re.compile(r'\s+\S\s+(\d+)\s')
+
+# ESMF_Profile.summary: name PETs Count Mean (s) Min (s) Min PET Max (s) Max PET
+_NUOPC_TIMER_RE    = re.compile(r'\s*(\S.*?)\s+(\d+)\s+(\d+)\s+(\d*\.\d+)(?:\s+(\d*\.\d+)\s+\d+\s+(\d*\.\d+)\s+\d+)?(?:\s|$)')
+_NUOPC_RUN_RE      = re.compile(r'\[ESM([^\]]*)\] RunPhase1')
+_NUOPC_FINALIZE_RE = re.compile(r'\[ESM([^\]]*)\] Finalize')
+_MED_TIMER_RE      = re.compile(r'\[MED\] med_(phases|connectors|fraction)\S+$')
+_COMM_TIMER_RE     = re.compile(r'\[\S+-TO-\S+\] RunPhase1$')
+
+def _parse_mct_timing(lines):
+    r"""
+    Returns a dict timer name -> {nprocs, ncount, tmin, tmax} of the timers
+    in the lines of a model_timing_stats file. Each field is taken from the
+    first line of the timer that has it, fields no line has are None.
+
+    >>> lines = ['name         on  processes  threads        count      walltotal   wallmax (proc   thrd  )   wallmin (proc   thrd  )\n',
+    ...          '"CPL:RUN_LOOP"   -       4       4 9.600000e+01  3.840e+02    96.010 (  1  0)    95.990 (  0  0)\n']
+    >>> timers = _parse_mct_timing(lines)
+    >>> sorted(timers["CPL:RUN_LOOP"].items())
+    [('ncount', 96), ('nprocs', 4), ('tmax', 96.01), ('tmin', 95.99)]
+    """
+    timers = {}
+    for line in lines:
+        m = _MCT_NAME_RE.match(line)
+        if m is None:
+            continue
+
+        timer = timers.get(m.group(1))
+        if timer is None:
+            timer = timers[m.group(1)] = {"nprocs" : None, "ncount" : None, "tmin" : None, "tmax" : None}
+
+        rest = line[m.end():]
+        if timer["tmax"] is None:
+            t = _MCT_TIME_RE.match(rest)
+            if t:
+                timer["tmax"] = float(t.group(1))
+                timer["tmin"] = float(t.group(2))
+
+        if timer["ncount"] is None:
+            t = _MCT_COUNT_RE.match(rest)
+            if t:
+                timer["nprocs"] = int(float(t.group(1)))
+                timer["ncount"] = int(float(t.group(2)))
+            else:
+                t = _MCT_COUNT1_RE.match(rest)
+                if t:
+                    timer["nprocs"] = 1
+                    timer["ncount"] = int(float(t.group(1)))
+
+    return timers
+
+def _add_nuopc_timer(timers, m):
+    timer = timers.get(m.group(1))
+    if timer is None:
+        timer = timers[m.group(1)] = {"pets" : int(m.group(2)), "count" : int(m.group(3)),
+                                      "mean" : float(m.group(4)), "total_mean" : 0.0,
+                                      "tmin" : None, "tmax" : None}
+
+    timer["total_mean"] += float(m.group(4))
+    if timer["tmax"] is None and m.group(6) is not None:
+        timer["tmin"] = float(m.group(5))
+        timer["tmax"] = float(m.group(6))
+
+def _parse_nuopc_timing(lines):
+    r"""
+    Returns the index of the timers in the lines of an ESMF_Profile.summary
+    file, a dict with
+      timers: timer name -> {pets, count, mean, tmin, tmax, total_mean} over
+              the whole file
+      init:   the same for the timers of the ensemble initialization
+      run:    instance -> the same for the timers of the run phase of the
+              ESM instance
+      finalize: instance -> the same for the finalize phase of the instance
+    pets, count, mean, tmin and tmax are taken from the first line of the
+    timer that has them, total_mean is the sum of the mean times of all its
+    lines (nested regions can appear under several parents).
+
+    >>> lines = ['  [ensemble] Init 1          4    1    2.5000    2.4000    0    2.6000    3\n',
+    ...          '  [ESM0001] RunPhase1        4    1   10.0000    9.9000    1   10.1000    2\n',
+    ...          '    [ATM] RunPhase1          4   48    6.0000    5.9000    1    6.2000    2\n',
+    ...          '    [MED] med_phases_prep    4   48    0.5000    0.4000    1    0.6000    2\n',
+    ...          '    [MED] med_phases_prep    4   48    0.2500    0.2000    1    0.3000    2\n',
+    ...          '  [ESM0002] RunPhase1        4    1   11.0000   10.9000    1   11.1000    2\n',
+    ...          '    [ATM] RunPhase1          4   48    7.0000    6.9000    1    7.2000    2\n',
+    ...          '  [ESM0002] Finalize         4    1    0.1000    0.1000    1    0.1000    2\n']
+    >>> index = _parse_nuopc_timing(lines)
+    >>> index["timers"]["[ensemble] Init 1"]["tmax"], index["timers"]["[ATM] RunPhase1"]["tmax"]
+    (2.6, 6.2)
+    >>> index["run"]["0002"]["[ATM] RunPhase1"]["tmin"], index["run"]["0001"]["[MED] med_phases_prep"]["total_mean"]
+    (6.9, 0.75)
+    >>> sorted(index["finalize"]["0002"])
+    ['[ESM0002] Finalize']
+    """
+    index = {"timers" : {}, "init" : {}, "run" : {}, "finalize" : {}}
+    section = None
+    owner = None
+    for line in lines:
+        if "[ensemble] Init 1" in line:
+            section = index["init"]
+            owner = None
+        elif "[ESM" in line:
+            run = _NUOPC_RUN_RE.search(line)
+            finalize = _NUOPC_FINALIZE_RE.search(line)
+            if run:
+                section = index["run"].setdefault(run.group(1), {})
+                owner = ("run", run.group(1))
+            elif finalize and (owner is None or owner[0] != "run" or owner[1] == finalize.group(1)):
+                # Finalizing another instance leaves a running instance in its run phase
+                section = index["finalize"].setdefault(finalize.group(1), {})
+                owner = ("finalize", finalize.group(1))
+            elif "RunPhase1" in line:
+                section = None
+                owner = None
+
+        m = _NUOPC_TIMER_RE.match(line)
+        if m:
+            _add_nuopc_timer(index["timers"], m)
+            if section is not None:
+                _add_nuopc_timer(section, m)
+
+    return index
+
+def parse_timing_file(filename, driver):
+    """
+    Returns the index of the timers in timing file filename written by a run
+    using driver (mct or nuopc), see _parse_mct_timing and _parse_nuopc_timing
+    """
+    expect(driver in ("mct", "nuopc"), "Unknown driver {}".format(driver))
+    with open(filename, "r") as fd:
+        if driver == "mct":
+            return _parse_mct_timing(fd)
+        else:
+            return _parse_nuopc_timing(fd)
+
+def get_report_timers(report):
+    """
+    Returns timer name -> timer of the timers that have a max time in json
+    timing report report, whatever the driver. The fields of the timers are
+    those of the driver, see _parse_mct_timing and _parse_nuopc_timing.
+
+    >>> get_report_timers({"driver" : "mct", "timers" : {"CPL:RUN" : {"tmax" : 4.0}, "CPL:NONE" : {"tmax" : None}}})
+    {'CPL:RUN': {'tmax': 4.0}}
+    >>> get_report_timers({"driver" : "nuopc", "timers" : {"timers" : {"[ATM] RunPhase1" : {"tmax" : 2.0}}}})
+    {'[ATM] RunPhase1': {'tmax': 2.0}}
+    """
+    timers = report.get("timers") or {}
+    if report.get("driver") == "nuopc":
+        timers = timers.get("timers", {})
+    return dict((name, timer) for name, timer in timers.items() if timer.get("tmax") is not None)
+
+def _get_report_times(report):
+    """
+    Returns (components, timers), dicts name -> seconds per simulated day of
+    the components and timers in json timing report report
+    """
+    days = report.get("run_length_days")
+    if not days:
+        return {}, {}
+    components = dict((name, comp["tmax"] / days) for name, comp in report.get("components", {}).items()
+                      if comp.get("tmax") is not None)
+    timers = dict((name, timer["tmax"] / days) for name, timer in get_report_timers(report).items())
+    return components, timers
+
+def compare_timing_reports(current, baseline, tolerance, min_fraction=0.01, max_regressions=10):
+    """
+    Compare the json timing report current of a run with the report baseline
+    of its baseline. Times are compared per simulated day so runs of
+    different lengths can be compared, components and timers taking less
+    than min_fraction of the run time of the baseline are ignored.
+
+    Returns (success, regressions): regressions describes the (at most
+    max_regressions) components and timers whose time grew by more than
+    tolerance (a fraction of the baseline time), largest increase first.
+    Only regressions of components fail the comparison, the timers are there
+    to find out where in the component the time went.
+
+    >>> baseline = {"driver" : "mct", "run_length_days" : 5, "run_time" : 100.0,
+    ...             "components" : {"ATM" : {"tmax" : 50.0}, "OCN" : {"tmax" : 40.0}},
+    ...             "timers" : {"CPL:ATM_RUN" : {"tmax" : 50.0}, "CPL:OCN_RUN" : {"tmax" : 40.0},
+    ...                         "CPL:TINY" : {"tmax" : 0.1}, "CPL:UNUSED" : {"tmax" : None}}}
+    >>> current = {"driver" : "mct", "run_length_days" : 10, "run_time" : 220.0,
+    ...            "components" : {"ATM" : {"tmax" : 102.0}, "OCN" : {"tmax" : 100.0}},
+    ...            "timers" : {"CPL:ATM_RUN" : {"tmax" : 102.0}, "CPL:OCN_RUN" : {"tmax" : 100.0},
+    ...                        "CPL:TINY" : {"tmax" : 1.0}}}
+    >>> success, regressions = compare_timing_reports(current, baseline, 0.1)
+    >>> success
+    False
+    >>> for regression in regressions: print(regression)
+    OCN 8.000 -> 10.000 s/day (+25.0%)
+    CPL:OCN_RUN 8.000 -> 10.000 s/day (+25.0%)
+    >>> compare_timing_reports(current, baseline, 0.3)
+    (True, [])
+    """
+    base_components, base_timers = _get_report_times(baseline)
+    components, timers = _get_report_times(current)
+    days = baseline.get("run_length_days")
+    min_time = min_fraction * baseline["run_time"] / days if days and baseline.get("run_time") else 0.0
+
+    success = True
+    regressions = []
+    for is_component, base_times, times in [(True, base_components, components), (False, base_timers, timers)]:
+        for name, base_time in base_times.items():
+            cur_time = times.get(name)
+            if cur_time is None or base_time <= 0.0 or base_time < min_time:
+                continue
+
+            change = (cur_time - base_time) / base_time
+            if change > tolerance:
+                success = success and not is_component
+                regressions.append((cur_time - base_time, is_component, name, base_time, cur_time, change))
+
+    # Largest increase first, components before their timers
+    regressions.sort(key=lambda regression: (-regression[0], not regression[1], regression[2]))
+    return success, ["{} {:.3f} -> {:.3f} s/day ({:+.1f}%)".format(name, base_time, cur_time, 100 * change)
+                     for _, _, name, base_time, cur_time, change in regressions[:max_regressions]]
+
 class _GetTimingInfo:
     def __init__(self, name):
         self.name = name
@@ -24,13 +251,14 @@ class _TimingParser:
         self.case = case
         self.caseroot = case.get_value("CASEROOT")
         self.lid = lid
-        self.finlines = None
+        self.timers = None
         self.fout = None
         self.adays=0
         self._driver = case.get_value("COMP_INTERFACE")
         self.models = {}
         self.ncount = 0
         self.nprocs = 0
+        self._indexes = {}
 
     def write(self, text):
         self.fout.write(text)
@@ -69,37 +297,21 @@ class _TimingParser:
             return self._gettime2_nuopc()
 
     def _gettime2_mct(self, heading_padded):
-        nprocs = 0
-        ncount = 0
-
-        heading = '"' + heading_padded.strip() + '"'
-        for line in self.finlines:
-            m = re.match(r'\s*{}\s+\S\s+(\d+)\s*\d+\s*(\S+)'.format(heading), line)
-            if m:
-                nprocs = int(float(m.groups()[0]))
-                ncount = int(float(m.groups()[1]))
-                return (nprocs, ncount)
-            else:
-                m = re.match(r'\s*{}\s+\S\s+(\d+)\s'.format(heading), line)
-                if m:
-                    nprocs = 1
-                    ncount = int(float(m.groups()[0]))
-                    return (nprocs, ncount)
-        return (0, 0)
+        timer = self.timers.get(heading_padded.strip())
+        if timer is None or timer["ncount"] is None:
+            return (0, 0)
+        return (timer["nprocs"], timer["ncount"])
 
     def _gettime2_nuopc(self):
         self.nprocs = 0
         self.ncount = 0
-        expression = re.compile(r'\s*\MED:\(med_fraction_set\)\s+(\d+)\s+(\d+)')
+        timer = self.timers["timers"].get("MED:(med_fraction_set)")
+        if timer is None:
+            return (0, 0)
 
-        for line in self.finlines:
-            match = expression.match(line)
-            if match:
-                self.nprocs = int(match.group(1))
-                self.ncount = int(match.group(2))
-                return (self.nprocs, self.ncount)
-
-        return (0, 0)
+        self.nprocs = timer["pets"]
+        self.ncount = timer["count"]
+        return (self.nprocs, self.ncount)
 
     def gettime(self, heading_padded):
         if self._driver == 'mct':
@@ -107,101 +319,55 @@ class _TimingParser:
         elif self._driver == 'nuopc':
             return self._gettime_nuopc(heading_padded)
 
-
     def _gettime_mct(self, heading_padded):
-        found = False
-        heading = '"' + heading_padded.strip() + '"'
-        minval = 0
-        maxval = 0
-
-        for line in self.finlines:
-            m = re.match(r'\s*{}\s+\S\s+\d+\s*\d+\s*\S+\s*\S+\s*(\d*\.\d+)\s*\(.*\)\s*(\d*\.\d+)\s*\(.*\)'.format(heading), line)
-            if m:
-                maxval = float(m.groups()[0])
-                minval = float(m.groups()[1])
-                found = True
-                return (minval, maxval, found)
-        return (0, 0, False)
+        timer = self.timers.get(heading_padded.strip())
+        if timer is None or timer["tmax"] is None:
+            return (0, 0, False)
+        return (timer["tmin"], timer["tmax"], True)
 
     def _gettime_nuopc(self, heading, instance='0001'):
         if instance == '':
             instance = '0001'
-        minval = 0
-        maxval = 0
-        m = None
-        #  PETs   Count    Mean (s)    Min (s)     Min PET Max (s)     Max PET
-        timeline = re.compile(r'\s*{}\s+\d+\s+\d+\s+(\d*\.\d+)\s+(\d*\.\d+)\s+\d+\s+(\d*\.\d+)\s+\d+'.format(re.escape(heading)))
-        phase = None
-        for line in self.finlines:
-            phase = self._get_nuopc_phase(line, instance, phase)
-            if phase != "run" and not "[ensemble]" in heading:
-                continue
-            if heading in line:
-                m = timeline.match(line)
-                if m:
-                    minval = float(m.group(2))
-                    maxval = float(m.group(3))
-                    return (minval, maxval, True)
-
-        return (0, 0, False)
+        if "[ensemble]" in heading:
+            timers = self.timers["timers"]
+        else:
+            timers = self.timers["run"].get(instance, {})
 
-    @staticmethod
-    def _get_nuopc_phase(line, instance, phase):
-        if "[ensemble] Init 1" in line:
-            phase = "init"
-        elif "[ESM"+instance+"] RunPhase1" in line:
-            phase = "run"
-        elif "[ESM"+instance+"] Finalize" in line:
-            phase = "finalize"
-        elif "[ESM" in line and "RunPhase1" in line:
-            phase = "other"
-        return phase
+        timer = timers.get(heading.strip())
+        if timer is None or timer["tmax"] is None:
+            return (0, 0, False)
+        return (timer["tmin"], timer["tmax"], True)
 
     def getMEDtime(self, instance):
         if instance == '':
             instance = '0001'
-        med_phase_line = re.compile(r'\s*(\[MED\] med_phases\S+)\s+\d+\s+\d+\s+(\d*\.\d+)\s+')
-        med_connector_line = re.compile(r'\s*(\[MED\] med_connectors\S+)\s+\d+\s+\d+\s+(\d*\.\d+)\s+')
-        med_fraction_line = re.compile(r'\s*(\[MED\] med_fraction\S+)\s+\d+\s+\d+\s+(\d*\.\d+)\s+')
+        medtime = sum(timer["total_mean"] for name, timer in self.timers["run"].get(instance, {}).items()
+                      if _MED_TIMER_RE.match(name))
 
-        m = None
-        minval = 0
-        maxval = 0
-        phase = None
-        for line in self.finlines:
-            phase = self._get_nuopc_phase(line, instance, phase)
-            if phase != "run":
-                continue
-            m = med_phase_line.match(line)
-            if not m:
-                m = med_connector_line.match(line)
-            if not m:
-                m = med_fraction_line.match(line)
-            if m:
-                minval += float(m.group(2))
-                maxval += float(m.group(2))
-
-        return(minval, maxval)
+        return(medtime, medtime)
 
     def getCOMMtime(self, instance):
         if instance == '':
             instance = '0001'
-        comm_line = re.compile(r'\s*(\[\S+-TO-\S+\] RunPhase1)\s+\d+\s+\d+\s+(\d*\.\d+)\s+')
-        m = None
         maxval = 0
-        phase = None
-        for line in self.finlines:
-            phase = self._get_nuopc_phase(line, instance, phase)
-            if phase != "run":
-                continue
-            m = comm_line.match(line)
-            if m:
-                heading = m.group(1)
-                maxv = float(m.group(2))
-                maxval += maxv
-                logger.debug("{} time={} sum={}".format(heading, maxv, maxval))
+        for name, timer in self.timers["run"].get(instance, {}).items():
+            if _COMM_TIMER_RE.match(name):
+                maxval += timer["total_mean"]
+                logger.debug("{} time={} sum={}".format(name, timer["total_mean"], maxval))
         return maxval
 
+    def _get_index(self, finfilename):
+        """
+        Returns the index of timing file finfilename. The nuopc profile is
+        shared by all instances of a multi-driver case and is only parsed once.
+        """
+        if finfilename not in self._indexes:
+            try:
+                self._indexes[finfilename] = parse_timing_file(finfilename, self._driver)
+            except Exception as e:
+                logger.critical("Unable to open file {}".format(finfilename))
+                raise e
+        return self._indexes[finfilename]
 
     def getTiming(self):
         ninst = 1
@@ -324,13 +490,7 @@ class _TimingParser:
         safe_copy(binfilename, finfilename)
 
         os.chdir(self.caseroot)
-        try:
-            fin = open(finfilename, "r")
-            self.finlines = fin.readlines()
-            fin.close()
-        except Exception as e:
-            logger.critical("Unable to open file {}".format(finfilename))
-            raise e
+        self.timers = self._get_index(finfilename)
 
         tlen = 1.0
         if ncpl_base_period == "decade":
@@ -751,6 +911,39 @@ class _TimingParser:
 
         self.fout.close()
 
+        report = {"case" : caseid, "lid" : self.lid, "machine" : mach, "user" : user, "date" : now,
+                  "driver" : self._driver, "instance" : inst, "grid" : grid, "compset" : compset,
+                  "run_type" : run_type, "continue_run" : continue_run, "inittype" : inittype,
+                  "stop_option" : stop_option, "stop_n" : stop_n,
+                  "run_length_days" : adays, "ocn_run_length_days" : odays,
+                  "total_pes" : totalpes*maxthrds*smt_factor, "max_mpitasks_per_node" : max_mpitasks_per_node,
+                  "cost_pes" : pecost,
+                  "model_cost" : (tmax*365.0*pecost)/(3600.0*adays) if adays > 0 else None,
+                  "model_throughput" : (86400.0*adays)/(tmax*365.0) if tmax > 0 else None,
+                  "init_time" : nmax, "run_time" : tmax, "final_time" : fmax,
+                  "comm_time" : xmax, "comm_myears_per_wday" : xmaxr,
+                  "components" : {}, "timers" : self.timers}
+        if self._driver == 'mct':
+            report.update({"ocn_init_wait_time" : ocnwaittime, "ocn_init_run_time" : ocnrunitime,
+                           "run_time_correction" : correction})
+        for k in self.case.get_values("COMP_CLASSES"):
+            m = self.models[k]
+            report["components"][k] = {"comp" : m.comp, "pes" : m.ntasks*m.nthrds*smt_factor,
+                                       "rootpe" : m.rootpe, "ntasks" : m.ntasks, "nthrds" : m.nthrds,
+                                       "ninst" : m.ninst, "pstrid" : m.pstrid,
+                                       "tmin" : m.tmin, "tmax" : m.tmax, "myears_per_wday" : m.tmaxr}
+
+        self._write_json(foutfilename + ".json", report)
+
+    @staticmethod
+    def _write_json(filename, report):
+        try:
+            with open(filename, "w") as fd:
+                json.dump(report, fd, indent=1, sort_keys=True)
+        except Exception as e:
+            logger.critical("Could not open file for writing: {}".format(filename))
+            raise e
+
 def get_timing(case, lid):
     parser = _TimingParser(case, lid)
     parser.getTiming()
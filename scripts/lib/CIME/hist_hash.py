@@ -0,0 +1,318 @@
+"""
+Per-variable data hashes of netcdf history files.
+
+These hashes let the test system recognize bit-for-bit identical history
+files without running the full cprnc analysis. Only the classic, 64-bit
+offset and 64-bit data (CDF-1, CDF-2, CDF-5) formats are understood; for any
+other file (e.g. netcdf-4/HDF5) get_var_hashes returns None and callers are
+expected to fall back to cprnc.
+
+Baseline generation records the hashes of every history file in a manifest
+so comparisons against baselines rarely need to open the baseline files, and
+so that baselines can be kept as hashes alone ("hash-only" baselines) or as
+references to files in the object store of the baseline root (see
+baseline_store).
+"""
+from CIME.XML.standard_module_setup import *
+
+import hashlib, json, struct
+
+logger = logging.getLogger(__name__)
+
+# Name of the file, stored alongside baselines, that holds the checksums,
+# per-variable hashes and summary statistics of every baseline history file
+BASELINE_MANIFEST_NAME = "baseline_manifest.json"
+
+_READ_CHUNK = 4 * 1024 * 1024
+
+_NC_DIMENSION = 10
+_NC_VARIABLE  = 11
+_NC_ATTRIBUTE = 12
+
+_NC_CHAR = 2
+
+# nc_type -> size in bytes of one element
+_NC_TYPE_SIZES = {1 : 1, 2 : 1, 3 : 2, 4 : 4, 5 : 4, 6 : 8,
+                  7 : 1, 8 : 2, 9 : 4, 10 : 8, 11 : 8}
+
+_STREAMING = 0xFFFFFFFF
+
+class _NcClassicHeader(object):
+    """
+    Minimal reader for the header of a classic format netcdf file.
+
+    >>> import io
+    >>> _NcClassicHeader(io.BytesIO(b"\\x89HDF\\r\\n\\x1a\\n"))
+    Traceback (most recent call last):
+        ...
+    ValueError: Not a classic format netcdf file
+    """
+
+    def __init__(self, fd):
+        self._fd = fd
+        magic = fd.read(4)
+        if len(magic) != 4 or magic[:3] != b"CDF" or magic[3:] not in (b"\x01", b"\x02", b"\x05"):
+            raise ValueError("Not a classic format netcdf file")
+
+        version = ord(magic[3:])
+        self._size_fmt = ">Q" if version == 5 else ">I"
+        offset_fmt = ">I" if version == 1 else ">Q"
+
+        self.numrecs = self._read_size()
+        if self.numrecs == _STREAMING:
+            raise ValueError("Streaming netcdf files are not supported")
+
+        # list of (name, length); a length of 0 marks the record dimension
+        self.dims = []
+        for _ in range(self._read_list_count(_NC_DIMENSION)):
+            name = self._read_name()
+            self.dims.append((name, self._read_size()))
+
+        # Global attributes are skipped: they hold history, dates, hostnames
+        # and the like, none of which are compared by cprnc
+        self._read_attributes()
+
+        # list of dicts with keys name, dimids, attrs, nc_type, begin
+        self.vars = []
+        for _ in range(self._read_list_count(_NC_VARIABLE)):
+            name = self._read_name()
+            dimids = [self._read_size() for _ in range(self._read_size())]
+            attrs = self._read_attributes()
+            nc_type = self._read_int()
+            expect(nc_type in _NC_TYPE_SIZES, "Unknown netcdf type {} for variable {}".format(nc_type, name), exc_type=ValueError)
+            self._read_size() # vsize is not reliable for big variables, recomputed below
+            begin = struct.unpack(offset_fmt, fd.read(struct.calcsize(offset_fmt)))[0]
+            self.vars.append({"name" : name, "dimids" : dimids, "attrs" : attrs,
+                              "nc_type" : nc_type, "begin" : begin})
+
+        self.recsize = 0
+        record_vars = [var for var in self.vars if self.is_record_var(var)]
+        for var in record_vars:
+            vsize = self.slab_size(var)
+            self.recsize += vsize if len(record_vars) == 1 else _padded(vsize)
+
+    def _read_int(self):
+        return struct.unpack(">i", self._fd.read(4))[0]
+
+    def _read_size(self):
+        return struct.unpack(self._size_fmt, self._fd.read(struct.calcsize(self._size_fmt)))[0]
+
+    def _read_list_count(self, expected_tag):
+        tag = self._read_int()
+        count = self._read_size()
+        if tag == 0:
+            expect(count == 0, "Corrupt netcdf header", exc_type=ValueError)
+            return 0
+        expect(tag == expected_tag, "Corrupt netcdf header, expected tag {} got {}".format(expected_tag, tag), exc_type=ValueError)
+        return count
+
+    def _read_name(self):
+        nchars = self._read_size()
+        return self._fd.read(_padded(nchars))[:nchars].decode("utf-8")
+
+    def _read_attributes(self):
+        attrs = []
+        for _ in range(self._read_list_count(_NC_ATTRIBUTE)):
+            name = self._read_name()
+            nc_type = self._read_int()
+            expect(nc_type in _NC_TYPE_SIZES, "Unknown netcdf type {} for attribute {}".format(nc_type, name), exc_type=ValueError)
+            nbytes = self._read_size() * _NC_TYPE_SIZES[nc_type]
+            attrs.append((name, nc_type, self._fd.read(_padded(nbytes))[:nbytes]))
+        return attrs
+
+    def is_record_var(self, var):
+        return len(var["dimids"]) > 0 and self.dims[var["dimids"][0]][1] == 0
+
+    def shape(self, var):
+        return [self.dims[dimid][1] or self.numrecs for dimid in var["dimids"]]
+
+    def slab_size(self, var):
+        """
+        Size in bytes of the variable's data, or of one record of it for record variables
+        """
+        nelems = 1
+        for dimid in var["dimids"]:
+            dimlen = self.dims[dimid][1]
+            if dimlen != 0:
+                nelems *= dimlen
+        return nelems * _NC_TYPE_SIZES[var["nc_type"]]
+
+def _padded(nbytes):
+    return nbytes + (-nbytes % 4)
+
+def _hash_range(fd, offset, nbytes, hasher):
+    fd.seek(offset)
+    while nbytes > 0:
+        data = fd.read(min(nbytes, _READ_CHUNK))
+        expect(data, "Unexpected end of netcdf file", exc_type=ValueError)
+        hasher.update(data)
+        nbytes -= len(data)
+
+def _hash_vars(filepath):
+    """
+    Returns (header, hashes) for filepath, see get_var_hashes
+    """
+    with open(filepath, "rb") as fd:
+        header = _NcClassicHeader(fd)
+        hashes = {}
+        for var in header.vars:
+            if var["nc_type"] == _NC_CHAR:
+                continue
+
+            hasher = hashlib.md5()
+            hasher.update("{} {}\n".format(var["nc_type"], header.shape(var)).encode("utf-8"))
+            for attname, atttype, attvalue in var["attrs"]:
+                hasher.update("{} {}\n".format(attname, atttype).encode("utf-8"))
+                hasher.update(attvalue)
+
+            slab_size = header.slab_size(var)
+            if header.is_record_var(var):
+                for rec in range(header.numrecs):
+                    _hash_range(fd, var["begin"] + rec * header.recsize, slab_size, hasher)
+            else:
+                _hash_range(fd, var["begin"], slab_size, hasher)
+
+            hashes[var["name"]] = hasher.hexdigest()
+
+    return header, hashes
+
+def get_var_hashes(filepath):
+    """
+    Return a dict mapping variable name to a hex digest of that variable's
+    type, shape, attributes and data, for every non-character variable in
+    filepath. Character variables (e.g. date_written, time_written) are
+    skipped since cprnc does not compare them either.
+
+    Data is streamed one variable (or one record of a record variable) at a
+    time so memory use is bounded regardless of file size.
+
+    Returns None if the file is not in a format we can read.
+    """
+    try:
+        return _hash_vars(filepath)[1]
+    except (ValueError, struct.error, IOError, OSError) as e:
+        logger.debug("Could not hash variables of {}: {}".format(filepath, e))
+        return None
+
+def get_file_md5(filepath):
+    """
+    Returns the md5 checksum of the whole file filepath
+    """
+    hasher = hashlib.md5()
+    with open(filepath, "rb") as fd:
+        for data in iter(lambda: fd.read(_READ_CHUNK), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+def _stat_key(filepath):
+    st = os.stat(filepath)
+    return st.st_size, int(st.st_mtime)
+
+def get_manifest_entry(filepath, stored_path=None, hash_only=False):
+    """
+    Return the manifest entry for history file filepath:
+      md5   - checksum of the whole file
+      vars  - per-variable hashes, see get_var_hashes
+      stats - summary statistics: number of records and the type and shape
+              of every hashed variable
+      size, mtime - size and mtime of stored_path (the baseline copy of
+              filepath, defaults to filepath), used to tell whether the
+              entry is still valid for that copy
+    If hash_only is True, no copy of the file is kept: the entry is marked
+    hash_only and carries no mtime.
+
+    Returns None if filepath cannot be hashed.
+    """
+    try:
+        header, var_hashes = _hash_vars(filepath)
+        md5 = get_file_md5(filepath)
+    except (ValueError, struct.error, IOError, OSError) as e:
+        logger.debug("Could not hash variables of {}: {}".format(filepath, e))
+        return None
+
+    stats = {"numrecs" : header.numrecs,
+             "vars" : dict((var["name"], {"type" : var["nc_type"], "shape" : header.shape(var)})
+                           for var in header.vars if var["name"] in var_hashes)}
+    entry = {"md5" : md5, "vars" : var_hashes, "stats" : stats}
+    if hash_only:
+        entry["hash_only"] = True
+        entry["size"] = os.path.getsize(filepath)
+    else:
+        entry["size"], entry["mtime"] = _stat_key(filepath if stored_path is None else stored_path)
+
+    return entry
+
+def is_hash_only(manifest, filename):
+    """
+    True if filename is only recorded in manifest, with no copy of the file kept
+    """
+    entry = manifest.get(os.path.basename(filename))
+    return entry is not None and entry.get("hash_only", False)
+
+def get_object_path(filepath, manifest):
+    """
+    Return the path of the stored object holding baseline file filepath if
+    manifest records it in the object store rather than in the baseline
+    directory, otherwise None. Objects are referenced relative to the
+    baseline directory.
+
+    >>> get_object_path("/baselines/master/ERS.A/cpl.hi.nc", {"cpl.hi.nc" : {"object" : "../../.objects/ab/abcd"}})
+    '/baselines/.objects/ab/abcd'
+    >>> get_object_path("/baselines/master/ERS.A/cpl.hi.nc", {"cpl.hi.nc" : {"md5" : "abcd"}}) is None
+    True
+    """
+    entry = manifest.get(os.path.basename(filepath))
+    if entry is None or "object" not in entry:
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(filepath), entry["object"]))
+
+def is_stored_elsewhere(manifest, filename):
+    """
+    True if filename is recorded in manifest with no copy in the baseline
+    directory: it is hash-only or kept in the object store
+    """
+    entry = manifest.get(os.path.basename(filename))
+    return entry is not None and (entry.get("hash_only", False) or "object" in entry)
+
+def lookup_var_hashes(filepath, manifest):
+    """
+    Return the per-variable hashes of filepath, taken from manifest (as
+    returned by read_baseline_manifest) if they are still valid for the file
+    on disk or if the file is hash-only or a stored object (which never
+    change), otherwise computed from the file itself.
+    """
+    entry = manifest.get(os.path.basename(filepath))
+    if entry is not None:
+        if entry.get("hash_only", False):
+            return entry["vars"]
+        elif "object" in entry:
+            return entry["vars"] if "vars" in entry else get_var_hashes(get_object_path(filepath, manifest))
+        elif os.path.exists(filepath) and (entry.get("size"), entry.get("mtime")) == _stat_key(filepath):
+            return entry["vars"]
+
+    return get_var_hashes(filepath)
+
+def read_baseline_manifest(from_dir):
+    """
+    Read the manifest stored in from_dir, returns a dict mapping history
+    file basename to its manifest entry (empty if there is no manifest).
+    """
+    manifest_file = os.path.join(from_dir, BASELINE_MANIFEST_NAME)
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, "r") as fd:
+                return json.load(fd)
+        except ValueError:
+            logger.warning("Ignoring corrupt baseline manifest {}".format(manifest_file))
+
+    return {}
+
+def write_baseline_manifest(from_dir, manifest):
+    """
+    Store manifest, a dict mapping history file basename to its manifest entry, in from_dir.
+    """
+    manifest_file = os.path.join(from_dir, BASELINE_MANIFEST_NAME)
+    tmp_file = "{}.{:d}".format(manifest_file, os.getpid())
+    with open(tmp_file, "w") as fd:
+        json.dump(manifest, fd, indent=1, sort_keys=True)
+    os.rename(tmp_file, manifest_file)
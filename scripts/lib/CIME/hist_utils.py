@@ -4,12 +4,21 @@ Functions for actions pertaining to history files.
 from CIME.XML.standard_module_setup import *
 from CIME.test_status import TEST_NO_BASELINES_COMMENT, TEST_STATUS_FILENAME
 from CIME.utils import get_current_commit, get_timestamp, get_model, safe_copy, SharedArea, parse_test_name
+from CIME.hist_hash import get_var_hashes, get_manifest_entry, get_file_md5, get_object_path, lookup_var_hashes, \
+    is_hash_only, is_stored_elsewhere, read_baseline_manifest, write_baseline_manifest
+from CIME.baseline_store import add_object, clone_file, copy_baseline_dir, get_baseline_root, get_object_store
+from CIME.rundir_index import RundirIndex
 
-import logging, os, re, filecmp
+import logging, os, re, filecmp, glob, shutil, tempfile
 logger = logging.getLogger(__name__)
 
 BLESS_LOG_NAME = "bless_log"
 
+# Staged baseline generation builds the new baseline in <baseline dir>.bless-staging.<pid>,
+# and moves the old one to <baseline dir>.bless-old.<pid> while swapping them
+_STAGING_SUFFIX = ".bless-staging"
+_BACKUP_SUFFIX  = ".bless-old"
+
 # ------------------------------------------------------------------------
 # Strings used in the comments generated by cprnc
 # ------------------------------------------------------------------------
@@ -56,9 +65,10 @@ def copy_histfiles(case, suffix):
     archive = case.get_env("archive")
     comments = "Copying hist files to suffix '{}'\n".format(suffix)
     num_copied = 0
+    rundir_index = RundirIndex(rundir, casename=casename)
     for model in _iter_model_file_substrs(case):
         comments += "  Copying hist files for model '{}'\n".format(model)
-        test_hists = archive.get_latest_hist_files(casename, model, rundir, ref_case=ref_case)
+        test_hists = rundir_index.get_latest_hist_files(archive, casename, model, ref_case=ref_case)
         num_copied += len(test_hists)
         for test_hist in test_hists:
             test_hist = os.path.join(rundir,test_hist)
@@ -208,6 +218,32 @@ def _hists_match(model, hists1, hists2, suffix1="", suffix2=""):
 
     return one_not_two, two_not_one, match_ups
 
+def _compare_hashes(hashes1, hashes2, ignore_fieldlist_diffs=False):
+    """
+    Compare two sets of per-variable hashes the way cprnc would compare the files.
+
+    returns (True if the hashes matched, comment, differing variables) where
+    'comment' is either an empty string or CPRNC_FIELDLISTS_DIFFER
+
+    >>> _compare_hashes({'a': '1', 'b': '2'}, {'a': '1', 'b': '2'})
+    (True, '', [])
+    >>> _compare_hashes({'a': '1', 'b': '2'}, {'a': '1', 'b': '3'})
+    (False, '', ['b'])
+    >>> _compare_hashes({'a': '1', 'b': '2'}, {'a': '1'})
+    (False, 'files differ only in their field lists', ['b'])
+    >>> _compare_hashes({'a': '1', 'b': '2'}, {'a': '1'}, ignore_fieldlist_diffs=True)
+    (True, '', ['b'])
+    """
+    shared = set(hashes1) & set(hashes2)
+    differing = sorted(var for var in shared if hashes1[var] != hashes2[var])
+    fieldlist_diffs = sorted(set(hashes1) ^ set(hashes2))
+    if differing:
+        return False, '', differing + fieldlist_diffs
+    elif fieldlist_diffs and not ignore_fieldlist_diffs:
+        return False, CPRNC_FIELDLISTS_DIFFER, fieldlist_diffs
+    else:
+        return True, '', fieldlist_diffs
+
 def _compare_hists(case, from_dir1, from_dir2, suffix1="", suffix2="", outfile_suffix="",
                    ignore_fieldlist_diffs=False):
     if from_dir1 == from_dir2:
@@ -222,12 +258,17 @@ def _compare_hists(case, from_dir1, from_dir2, suffix1="", suffix2="", outfile_s
     multiinst_driver_compare = False
     archive = case.get_env('archive')
     ref_case = case.get_value("RUN_REFCASE")
+    index1 = RundirIndex(from_dir1, casename=casename)
+    # hash-only and object store baseline files exist only in the manifest
+    manifest2 = read_baseline_manifest(from_dir2)
+    stored_elsewhere2 = [item for item in manifest2 if is_stored_elsewhere(manifest2, item)]
+    index2 = RundirIndex(from_dir2, casename=casename, extra_filenames=stored_elsewhere2)
     for model in _iter_model_file_substrs(case):
         if model == 'cpl' and suffix2 == 'multiinst':
             multiinst_driver_compare = True
         comments += "  comparing model '{}'\n".format(model)
-        hists1 = archive.get_latest_hist_files(casename, model, from_dir1, suffix=suffix1, ref_case=ref_case)
-        hists2 = archive.get_latest_hist_files(casename, model, from_dir2, suffix=suffix2, ref_case=ref_case)
+        hists1 = index1.get_latest_hist_files(archive, casename, model, suffix=suffix1, ref_case=ref_case)
+        hists2 = index2.get_latest_hist_files(archive, casename, model, suffix=suffix2, ref_case=ref_case)
 
         if len(hists1) == 0 and len(hists2) == 0:
             comments += "    no hist files found for model {}\n".format(model)
@@ -252,11 +293,55 @@ def _compare_hists(case, from_dir1, from_dir2, suffix1="", suffix2="", outfile_s
             if not '.nc' in hist1:
                 logger.info("Ignoring non-netcdf file {}".format(hist1))
                 continue
-            success, cprnc_log_file, cprnc_comment = cprnc(model, os.path.join(from_dir1,hist1),
-                                                           os.path.join(from_dir2,hist2), case, from_dir1,
-                                                           multiinst_driver_compare=multiinst_driver_compare,
-                                                           outfile_suffix=outfile_suffix,
-                                                           ignore_fieldlist_diffs=ignore_fieldlist_diffs)
+            # Quick bit-for-bit check, the baseline hashes come from the
+            # manifest when possible so the baseline file need not be read
+            hashes1 = get_var_hashes(os.path.join(from_dir1, hist1))
+            hashes2 = None
+            if hashes1 or is_hash_only(manifest2, hist2):
+                hashes2 = lookup_var_hashes(os.path.join(from_dir2, hist2), manifest2)
+            if hashes1 and hashes1 == hashes2:
+                logger.debug("Variable hashes of {} and {} are identical, skipping cprnc".format(hist1, hist2))
+                comments += "    {} matched {}\n".format(hist1, hist2)
+                continue
+
+            if is_hash_only(manifest2, hist2):
+                # There is no baseline file to run cprnc on, the hashes are all we have
+                if hashes1 is None:
+                    success, hash_comment, differing = False, '', []
+                    comments += "    Could not hash {}, cannot compare it to a hash-only baseline\n".format(hist1)
+                else:
+                    success, hash_comment, differing = _compare_hashes(hashes1, hashes2,
+                                                                       ignore_fieldlist_diffs=ignore_fieldlist_diffs)
+                if success:
+                    comments += "    {} matched {}\n".format(hist1, hist2)
+                else:
+                    if hash_comment == CPRNC_FIELDLISTS_DIFFER:
+                        comments += "    {} {} {}\n".format(hist1, FIELDLISTS_DIFFER, hist2)
+                    else:
+                        comments += "    {} {} {}\n".format(hist1, DIFF_COMMENT, hist2)
+                    if differing:
+                        comments += "      differing variables: {}\n".format(" ".join(differing))
+                    all_success = False
+                continue
+
+            object_path = get_object_path(os.path.join(from_dir2, hist2), manifest2)
+            link_dir = None
+            if object_path is None:
+                file2 = os.path.join(from_dir2, hist2)
+            else:
+                # cprnc tells instances apart by file name, the object is named by its checksum
+                link_dir = tempfile.mkdtemp(prefix="baseline_object.")
+                file2 = os.path.join(link_dir, os.path.basename(hist2))
+                os.symlink(object_path, file2)
+            try:
+                success, cprnc_log_file, cprnc_comment = cprnc(model, os.path.join(from_dir1,hist1),
+                                                               file2, case, from_dir1,
+                                                               multiinst_driver_compare=multiinst_driver_compare,
+                                                               outfile_suffix=outfile_suffix,
+                                                               ignore_fieldlist_diffs=ignore_fieldlist_diffs)
+            finally:
+                if link_dir is not None:
+                    shutil.rmtree(link_dir, ignore_errors=True)
             if success:
                 comments += "    {} matched {}\n".format(hist1, hist2)
             else:
@@ -457,10 +542,16 @@ def _generate_baseline_impl(case, baseline_dir=None, allow_baseline_overwrite=Fa
 
     comments = "Generating baselines into '{}'\n".format(basegen_dir)
     num_gen = 0
+    manifest = read_baseline_manifest(basegen_dir)
+    hash_only = case.get_value("BASELINE_HASH_ONLY")
+    # The store is in the root of the baselines generated, which may not be the
+    # BASELINE_ROOT of the case (e.g. bless_test_results --baseline-root)
+    store_dir = get_object_store(get_baseline_root(basegen_dir)) if case.get_value("BASELINE_OBJECT_STORE") else None
+    rundir_index = RundirIndex(rundir, casename=testcase)
     for model in _iter_model_file_substrs(case):
         comments += "  generating for model '{}'\n".format(model)
 
-        hists =  archive.get_latest_hist_files(testcase, model, rundir, ref_case=ref_case)
+        hists = rundir_index.get_latest_hist_files(archive, testcase, model, ref_case=ref_case)
         logger.debug("latest_files: {}".format(hists))
         num_gen += len(hists)
         for hist in hists:
@@ -470,8 +561,33 @@ def _generate_baseline_impl(case, baseline_dir=None, allow_baseline_overwrite=Fa
             if os.path.exists(baseline):
                 os.remove(baseline)
 
-            safe_copy(os.path.join(rundir,hist), baseline, preserve_meta=False)
-            comments += "    generating baseline '{}' from file {}\n".format(baseline, hist)
+            # Record checksums and variable hashes in the manifest so that
+            # comparisons against this baseline can usually avoid reading it.
+            # Files that cannot be hashed are always copied.
+            hist_path = os.path.join(rundir, hist)
+            entry = get_manifest_entry(hist_path, hash_only=True) if hash_only else None
+            if entry is None and store_dir is not None:
+                # Identical files are stored once across all baselines
+                entry = get_manifest_entry(hist_path) or {"md5" : get_file_md5(hist_path),
+                                                          "size" : os.path.getsize(hist_path)}
+                entry.pop("mtime", None)
+                object_file = add_object(store_dir, hist_path, entry["md5"])
+                entry["object"] = os.path.relpath(object_file, basegen_dir)
+                comments += "    generating baseline '{}' from file {} as object {}\n".format(
+                    baseline, hist, os.path.basename(object_file))
+            elif entry is None:
+                clone_file(hist_path, baseline)
+                comments += "    generating baseline '{}' from file {}\n".format(baseline, hist)
+                entry = get_manifest_entry(hist_path, stored_path=baseline)
+            else:
+                comments += "    generating hash-only baseline '{}' from file {}\n".format(baseline, hist)
+
+            if entry is None:
+                manifest.pop(os.path.basename(baseline), None)
+            else:
+                manifest[os.path.basename(baseline)] = entry
+
+    write_baseline_manifest(basegen_dir, manifest)
 
     # copy latest cpl log to baseline
     # drop the date so that the name is generic
@@ -484,7 +600,10 @@ def _generate_baseline_impl(case, baseline_dir=None, allow_baseline_overwrite=Fa
     if newestcpllogfile is None:
         logger.warning("No {}.log file found in directory {}".format(cplname,case.get_value("RUNDIR")))
     else:
-        safe_copy(newestcpllogfile, os.path.join(basegen_dir, "{}.log.gz".format(cplname)), preserve_meta=False)
+        baselog = os.path.join(basegen_dir, "{}.log.gz".format(cplname))
+        if os.path.exists(baselog):
+            os.remove(baselog)
+        clone_file(newestcpllogfile, baselog)
 
     testname = case.get_value("TESTCASE")
     testopts = parse_test_name(case.get_value("CASEBASEID"))[1]
@@ -500,9 +619,95 @@ def _generate_baseline_impl(case, baseline_dir=None, allow_baseline_overwrite=Fa
 
     return True, comments
 
-def generate_baseline(case, baseline_dir=None, allow_baseline_overwrite=False):
+def _stage_baseline_dir(baseline_dir):
+    """
+    Returns a new staging directory next to baseline_dir holding the files
+    of baseline_dir. History files are hard links to the files of
+    baseline_dir: baseline generation replaces them rather than writing to
+    them. Everything else is copied, since it may be updated in place.
+    """
+    _restore_baseline_dir(baseline_dir)
+    staging_dir = "{}{}.{:d}".format(baseline_dir, _STAGING_SUFFIX, os.getpid())
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+
+    if os.path.isdir(baseline_dir):
+        copy_baseline_dir(baseline_dir, staging_dir)
+    else:
+        os.makedirs(staging_dir)
+
+    return staging_dir
+
+def _swap_baseline_dir(staging_dir, baseline_dir):
+    """
+    Replace baseline_dir by staging_dir. This takes two renames, if it is
+    interrupted in between _restore_baseline_dir puts the old baseline back.
+    Baselines that cannot be moved (e.g. in a directory we may only add
+    files to) are updated in place, one file at a time.
+    """
+    if not os.path.exists(baseline_dir):
+        os.rename(staging_dir, baseline_dir)
+        return
+
+    backup_dir = "{}{}.{:d}".format(baseline_dir, _BACKUP_SUFFIX, os.getpid())
+    try:
+        os.rename(baseline_dir, backup_dir)
+    except OSError as e:
+        logger.warning("Could not move baseline {} ({}), updating it in place".format(baseline_dir, e))
+        for dirpath, _, filenames in os.walk(staging_dir):
+            target_dirpath = os.path.normpath(os.path.join(baseline_dir, os.path.relpath(dirpath, staging_dir)))
+            if not os.path.isdir(target_dirpath):
+                os.makedirs(target_dirpath)
+            for name in filenames:
+                os.rename(os.path.join(dirpath, name), os.path.join(target_dirpath, name))
+        shutil.rmtree(staging_dir)
+        return
+
+    try:
+        os.rename(staging_dir, baseline_dir)
+    except BaseException:
+        os.rename(backup_dir, baseline_dir)
+        raise
+
+    shutil.rmtree(backup_dir, ignore_errors=True)
+
+def _restore_baseline_dir(baseline_dir):
+    """
+    Clean up after a staged generation of baseline_dir that was interrupted
+    """
+    backup_dirs = sorted(glob.glob("{}{}.*".format(baseline_dir, _BACKUP_SUFFIX)), key=os.path.getmtime)
+    if backup_dirs and not os.path.exists(baseline_dir):
+        logger.warning("Restoring baseline {} from interrupted update".format(baseline_dir))
+        os.rename(backup_dirs.pop(), baseline_dir)
+
+    for backup_dir in backup_dirs:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+def generate_baseline(case, baseline_dir=None, allow_baseline_overwrite=False, staged=False):
+    """
+    copy the current test output to baseline result, see _generate_baseline_impl
+
+    If staged is True, the baseline is generated in a staging directory
+    starting from the files of the current baseline, which then replaces the
+    current baseline: an interrupted generation never leaves a partially
+    updated baseline.
+    """
     with SharedArea():
-        return _generate_baseline_impl(case, baseline_dir=baseline_dir, allow_baseline_overwrite=allow_baseline_overwrite)
+        if not staged:
+            return _generate_baseline_impl(case, baseline_dir=baseline_dir, allow_baseline_overwrite=allow_baseline_overwrite)
+
+        if baseline_dir is None:
+            baseline_dir = os.path.join(case.get_value("BASELINE_ROOT"), case.get_value("BASEGEN_CASE"))
+        staging_dir = _stage_baseline_dir(baseline_dir)
+        try:
+            success, comments = _generate_baseline_impl(case, baseline_dir=staging_dir,
+                                                        allow_baseline_overwrite=allow_baseline_overwrite)
+            if success:
+                _swap_baseline_dir(staging_dir, baseline_dir)
+            return success, comments.replace(staging_dir, baseline_dir)
+        finally:
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir, ignore_errors=True)
 
 def get_ts_synopsis(comments):
     r"""
@@ -0,0 +1,190 @@
+"""
+Database of the files in an input data directory (DIN_LOC_ROOT), shared by
+all the cases on a machine.
+
+The database is a sqlite file stored in the input data directory itself.
+It records
+  - which input files exist, with their sizes, so that cases can check
+    for their input files with index lookups rather than a metadata
+    operation per file on the (often parallel) filesystem. A recorded
+    file is stat'ed again once its record is older than max_age.
+  - the checksum of every input file verified so far, keyed by the
+    file's size, mtime and inode, so that files that have not changed
+    since they were verified (by any case) are not read again.
+If the database cannot be opened or written, e.g. because the input data
+directory is read-only for this user, the index behaves as if it were
+empty and every lookup falls back to the filesystem.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.utils import SharedArea
+
+import sqlite3, stat as statmod, time
+
+logger = logging.getLogger(__name__)
+
+INPUTDATA_INDEX_NAME = ".cime_inputdata_index.db"
+
+# Seconds for which a recorded file is assumed to still exist without a stat
+EXISTS_MAX_AGE = 24 * 3600
+
+class InputdataIndex(object):
+    """
+    >>> index = InputdataIndex("/nonexistent/inputdata")
+    >>> index.get_chksum("/nonexistent/inputdata/atm/file.nc") is None
+    True
+    >>> index.exists("/nonexistent/inputdata/atm/file.nc")
+    False
+    """
+
+    def __init__(self, input_data_root, max_age=EXISTS_MAX_AGE):
+        self._root = os.path.abspath(input_data_root)
+        self._max_age = max_age
+        self._conn = None
+        self._files = None     # path -> (size, time of last stat), read on first use
+        self._updated = {}     # path -> (size, time of last stat) or None if removed, to be written
+        db_path = os.path.join(self._root, INPUTDATA_INDEX_NAME)
+        if not os.path.isdir(self._root):
+            return
+
+        try:
+            # Use umask to make sure the database is group read/writable
+            with SharedArea():
+                self._conn = sqlite3.connect(db_path, timeout=60)
+                self._conn.execute("CREATE TABLE IF NOT EXISTS chksums "
+                                   "(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, inode INTEGER, chksum TEXT)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS files "
+                                   "(path TEXT PRIMARY KEY, size INTEGER, checked REAL)")
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.debug("Not using inputdata index {}: {}".format(db_path, e))
+            self.close()
+
+    def close(self):
+        """
+        Write any pending updates and close the database
+        """
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def _key(self, path):
+        """
+        Paths under the input data root are stored relative to it so that
+        the index is valid whatever path the root is reached by
+        """
+        path = os.path.abspath(path)
+        if path.startswith(self._root + os.sep):
+            return os.path.relpath(path, self._root)
+        return path
+
+    def get_chksum(self, path, stat=None):
+        """
+        Return the recorded checksum of path if path has not changed since it
+        was recorded, otherwise None. stat is the result of os.stat(path) if
+        the caller has it.
+        """
+        if self._conn is None:
+            return None
+
+        try:
+            stat = os.stat(path) if stat is None else stat
+            row = self._conn.execute("SELECT size, mtime, inode, chksum FROM chksums WHERE path = ?",
+                                     (self._key(path),)).fetchone()
+        except (OSError, sqlite3.Error):
+            return None
+
+        if row is not None and tuple(row[:3]) == (stat.st_size, stat.st_mtime, stat.st_ino):
+            return row[3]
+        return None
+
+    def set_chksums(self, chksums):
+        """
+        Record chksums, a list of (path, stat, chksum) where stat is the
+        result of os.stat(path) when chksum was computed
+        """
+        if self._conn is None or not chksums:
+            return
+
+        try:
+            self._conn.executemany("INSERT OR REPLACE INTO chksums VALUES (?, ?, ?, ?, ?)",
+                                   [(self._key(path), stat.st_size, stat.st_mtime, stat.st_ino, chksum)
+                                    for path, stat, chksum in chksums])
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.debug("Could not update inputdata index: {}".format(e))
+
+    def _get_files(self):
+        if self._files is None:
+            self._files = {}
+            if self._conn is not None:
+                try:
+                    for path, size, checked in self._conn.execute("SELECT path, size, checked FROM files"):
+                        self._files[path] = (size, checked)
+                except sqlite3.Error as e:
+                    logger.debug("Could not read inputdata index: {}".format(e))
+        return self._files
+
+    def exists(self, path):
+        """
+        Return True if path exists. Files under the input data root that are
+        in the index and were seen less than max_age seconds ago are assumed
+        to exist, anything else is looked up on the filesystem and the index
+        updated accordingly.
+        """
+        key = self._key(path)
+        if self._conn is None or os.path.isabs(key):
+            return os.path.exists(path)
+
+        files = self._get_files()
+        now = time.time()
+        if key in files and now - files[key][1] < self._max_age:
+            return True
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if key in files:
+                del files[key]
+                self._updated[key] = None
+            return False
+
+        if statmod.S_ISREG(stat.st_mode):
+            files[key] = self._updated[key] = (stat.st_size, now)
+        return True
+
+    def add_files(self, paths):
+        """
+        Record that paths, e.g. just downloaded, exist
+        """
+        if self._conn is None:
+            return
+
+        files = self._get_files()
+        now = time.time()
+        for path in paths:
+            key = self._key(path)
+            if os.path.isabs(key):
+                continue
+            try:
+                files[key] = self._updated[key] = (os.path.getsize(path), now)
+            except OSError:
+                pass
+
+    def flush(self):
+        """
+        Write the changes recorded by exists and add_files to the database
+        """
+        if self._conn is None or not self._updated:
+            return
+
+        try:
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                   [(key, value[0], value[1])
+                                    for key, value in self._updated.items() if value is not None])
+            self._conn.executemany("DELETE FROM files WHERE path = ?",
+                                   [(key,) for key, value in self._updated.items() if value is None])
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.debug("Could not update inputdata index: {}".format(e))
+        self._updated = {}
@@ -150,6 +150,15 @@ FORTRAN_LITERAL_REGEXES['logical'] = re.compile(r"^\.?[tf][^=/ \n]*$",
 # Repeated value prefix.
 FORTRAN_REPEAT_PREFIX_REGEX = re.compile(r"^[0-9]*[1-9]+[0-9]*\*")
 
+# Regexes used by _NamelistParser, these are matched at a position in the
+# text rather than against a slice of it.
+_PARSER_REPEAT_PREFIX_REGEX = re.compile(r"[0-9]*[1-9]+[0-9]*\*")
+_PARSER_WHITESPACE_REGEX = re.compile(r"[ \n]*")
+_PARSER_NAME_END_REGEX = re.compile(r"[ \n=+]")
+_PARSER_GROUP_NAME_END_REGEX = re.compile(r"[ \n]")
+_PARSER_LITERAL_REGEX = re.compile(r"[^ \n,/()]*")
+_PARSER_LITERAL_OR_NAME_REGEX = re.compile(r"[^ \n,/()=+]*")
+
 
 def is_valid_fortran_name(string):
     """Check that a variable name is allowed in Fortran.
@@ -573,8 +582,9 @@ def is_valid_fortran_namelist_literal(type_, string):
     >>> is_valid_fortran_namelist_literal("logical", ".t2 ")
     True
     """
-    expect(type_ in FORTRAN_LITERAL_REGEXES,
-           "Invalid Fortran type for a namelist: {!r}".format(str(type_)))
+    # This is called for every value parsed, so only build the message on error.
+    if type_ not in FORTRAN_LITERAL_REGEXES:
+        expect(False, "Invalid Fortran type for a namelist: {!r}".format(str(type_)))
     # Strip off whitespace and repetition.
     string = fortran_namelist_base_value(string)
     # Null values are always allowed.
@@ -895,7 +905,8 @@ class Namelist(object):
         self._groups = {}
         if groups is not None:
             for group_name in groups:
-                expect(group_name is not None, " Got None in groups {}".format(groups))
+                if group_name is None:
+                    expect(False, " Got None in groups {}".format(groups))
                 self._groups[group_name] = collections.OrderedDict()
                 for variable_name in groups[group_name]:
                     self._groups[group_name][variable_name] = groups[group_name][variable_name]
@@ -1335,8 +1346,6 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         """Create a `_NamelistParser` given text to parse in a string."""
         # Current location within the file.
         self._pos = 0
-        self._line = 1
-        self._col = 0
         # Text and its size.
         self._text = str(text)
         self._len = len(self._text)
@@ -1359,6 +1368,16 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         """
         return "line {}, column {}".format(self._line, self._col)
 
+    @property
+    def _line(self):
+        """The line number of the current position, counting from 1."""
+        return self._text.count('\n', 0, self._pos) + 1
+
+    @property
+    def _col(self):
+        """The column number of the current position, counting from 0."""
+        return self._pos - (self._text.rfind('\n', 0, self._pos) + 1)
+
     def _curr(self):
         """Return the character at the current position."""
         return self._text[self._pos]
@@ -1420,17 +1439,10 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         """
         assert nchars >= 0, \
             "_NamelistParser attempted to 'advance' backwards"
-        new_pos = min(self._pos + nchars, self._len)
-        consumed_text = self._text[self._pos:new_pos]
-        self._pos = new_pos
-        lines = consumed_text.count('\n')
-        self._line += lines
-        # If we started a new line, set self._col to be relative to the start of
-        # the current line.
-        if lines > 0:
-            self._col = -(consumed_text.rfind('\n') + 1)
-        self._col += len(consumed_text)
-        end_of_file = new_pos == self._len
+        # The line and column are only computed when needed (for error
+        # messages), so advancing is just moving the position.
+        self._pos = min(self._pos + nchars, self._len)
+        end_of_file = self._pos == self._len
         if check_eof:
             return end_of_file
         elif end_of_file:
@@ -1478,10 +1490,13 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         eaten = False
         comment_allowed = allow_initial_comment
         while True:
-            while self._curr() in (' ', '\n'):
-                comment_allowed |= self._curr() == '\n'
+            # Raises _NamelistEOF if we are already at the end of the file.
+            self._curr()
+            end = _PARSER_WHITESPACE_REGEX.match(self._text, self._pos).end()
+            if end > self._pos:
+                comment_allowed |= '\n' in self._text[self._pos:end]
                 eaten = True
-                self._advance()
+                self._advance(end - self._pos)
             # Note the reliance on short-circuit `and` here.
             if not (comment_allowed and self._eat_comment()):
                 break
@@ -1515,15 +1530,13 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         """
         if self._curr() != '!':
             return False
-        newline_pos = self._text[self._pos:].find('\n')
+        newline_pos = self._text.find('\n', self._pos)
         if newline_pos == -1:
             # This is the last line.
             self._advance(self._len - self._pos)
         else:
-            # Advance to the next line.
-            self._advance(newline_pos)
             # Advance to the first character of the next line.
-            self._advance()
+            self._advance(newline_pos + 1 - self._pos)
         return True
 
     def _expect_char(self, chars):
@@ -1612,9 +1625,11 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         'foo'
         """
         old_pos = self._pos
-        separators = (' ', '\n', '=', '+') if allow_equals else (' ', '\n')
-        while self._curr() not in separators:
-            self._advance()
+        name_end_regex = _PARSER_NAME_END_REGEX if allow_equals else _PARSER_GROUP_NAME_END_REGEX
+        self._curr()
+        match = name_end_regex.search(self._text, self._pos)
+        # With no separator left, advance to the end to raise _NamelistEOF.
+        self._advance((match.start() if match else self._len) - self._pos)
         text = self._text[old_pos:self._pos]
         if '(' in text:
             expect(')' in text,"Parsing error ")
@@ -1664,8 +1679,8 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         old_pos = self._pos
         self._advance()
         while True:
-            while self._curr() != delimiter:
-                self._advance()
+            delimiter_pos = self._text.find(delimiter, self._pos)
+            self._advance((self._len if delimiter_pos == -1 else delimiter_pos) - self._pos)
             # Avoid end-of-file condition.
             if self._pos == self._len - 1:
                 break
@@ -1693,8 +1708,9 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
 
         """
         old_pos = self._pos
-        while self._curr() != ')':
-            self._advance()
+        self._curr()
+        paren_pos = self._text.find(')', self._pos)
+        self._advance((self._len if paren_pos == -1 else paren_pos) - self._pos)
         text = self._text[old_pos:self._pos+1]
         if not is_valid_fortran_namelist_literal("complex", text):
             raise _NamelistParseError("{!r} is not a valid complex literal".format(str(text)))
@@ -1715,13 +1731,8 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         >>> _NamelistParser('a=')._look_ahead_for_equals(0)
         False
         """
-        for test_pos in range(pos, self._len):
-            if self._text[test_pos] not in (' ', '\n'):
-                if self._text[test_pos] == '=':
-                    return True
-                else:
-                    break
-        return False
+        test_pos = _PARSER_WHITESPACE_REGEX.match(self._text, pos).end()
+        return self._text.startswith('=', test_pos)
 
     def _look_ahead_for_plusequals(self, pos):
         r"""Look ahead to see if the next two non-whitespace character are '+='.
@@ -1738,12 +1749,9 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
         >>> _NamelistParser('a+=')._look_ahead_for_plusequals(0)
         False
         """
-        for test_pos in range(pos, self._len):
-            if self._text[test_pos] not in (' ', '\n'):
-                if self._text[test_pos] == '+':
-                    return self._look_ahead_for_equals(test_pos + 1)
-                else:
-                    break
+        test_pos = _PARSER_WHITESPACE_REGEX.match(self._text, pos).end()
+        if self._text.startswith('+', test_pos):
+            return self._look_ahead_for_equals(test_pos + 1)
         return False
 
     def _parse_literal(self, allow_name=False, allow_eof_end=False):
@@ -1843,10 +1851,11 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
             return ''
         # Deal with a repeated value prefix.
         old_pos = self._pos
-        if FORTRAN_REPEAT_PREFIX_REGEX.search(self._text[self._pos:]):
+        match = _PARSER_REPEAT_PREFIX_REGEX.match(self._text, self._pos)
+        if match:
             allow_name = False
-            while self._curr() != '*':
-                self._advance()
+            # Advance past the '*'.
+            self._advance(match.end() - 1 - self._pos)
             if self._advance(check_eof=allow_eof_end):
                 # In case the file ends with the 'r*' form of null value.
                 return self._text[old_pos:]
@@ -1860,8 +1869,11 @@ class _NamelistParser(object): # pylint:disable=too-few-public-methods
             literal = self._parse_complex_literal()
             self._advance(check_eof=allow_eof_end)
             return prefix + literal
-        # Deal with non-delimited literals.
-        new_pos = self._pos
+        # Deal with non-delimited literals. Most contain no parentheses, so
+        # skip to the first separator or parenthesis and only step through the rest
+        # character by character.
+        literal_regex = _PARSER_LITERAL_OR_NAME_REGEX if allow_name else _PARSER_LITERAL_REGEX
+        new_pos = literal_regex.match(self._text, self._pos).end()
         separators = [' ', '\n', ',', '/']
         if allow_name:
             separators.append('=')
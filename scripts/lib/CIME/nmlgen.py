@@ -7,8 +7,9 @@
 # pylint: disable=wildcard-import,unused-wildcard-import
 
 import datetime
+import functools
+import itertools
 import re
-import hashlib
 
 from CIME.XML.standard_module_setup import *
 from CIME.namelist import Namelist, parse, \
@@ -24,6 +25,16 @@ _var_ref_re = re.compile(r"\$(\{)?(?P<name>\w+)(?(1)\})")
 
 _ymd_re = re.compile(r"%(?P<digits>[1-9][0-9]*)?y(?P<month>m(?P<day>d)?)?")
 
+# The "-mm" and "-mm-dd" suffixes of every month and day of a no-leap year
+_month_strings = ["-{:02d}".format(month) for month in range(1, 13)]
+_month_day_strings = ["-{:02d}-{:02d}".format(month, day) for month in range(1, 13)
+                      for day in range(1, (datetime.date(1 + month // 12, month % 12 + 1, 1) -
+                                           datetime.date(1, month, 1)).days + 1)]
+
+# Stands in for the file names in a stream file template, they are written
+# to the file one at a time rather than formatted into the template
+_streamed_filenames = "\0"
+
 _stream_mct_file_template = """<?xml version="1.0"?>
 <file id="stream" version="1.0">
 <dataSource>
@@ -86,6 +97,13 @@ class NamelistGenerator(object):
 
     _streams_variables = []
 
+    # The lines of every input data list written in this process, shared by
+    # all generators (e.g. one per instance) so that the file is not read
+    # again to find out whether a line is already in it. Maps the path of the
+    # list to [set of lines, (inode, size, mtime) of the file after the last
+    # write], the lines are read from the file again if it has changed since.
+    _input_data_lists = {}
+
     #pylint:disable=too-many-arguments
     def __init__(self, case, definition_files, files=None):
         """Construct a namelist generator.
@@ -126,8 +144,6 @@ class NamelistGenerator(object):
         # first clean out any settings left over from previous calls
         self.new_instance()
 
-        self._definition.set_nodes(skip_groups=skip_groups)
-
         # Determine the array of entry nodes that will be acted upon
         entry_nodes = self._definition.set_nodes(skip_groups=skip_groups)
 
@@ -410,35 +426,55 @@ class NamelistGenerator(object):
 
         Returns a string (filenames separated by newlines).
         """
-        lines = [line for line in filenames.split("\n") if line]
-        new_lines = []
-        for line in lines:
-            match = _ymd_re.search(filenames)
+        return "\n".join(self._iter_sub_paths(filenames, year_start, year_end))
+
+    @staticmethod
+    def _iter_sub_paths(filenames, year_start, year_end):
+        r"""Generate the filenames returned by `_sub_paths` one at a time.
+
+        Long date ranges expand to hundreds of thousands of filenames, so
+        stream files are written from this rather than from a list of them.
+
+        >>> list(NamelistGenerator._iter_sub_paths("a_%ym.nc\nb.nc\n", 1, 1))[-3:]
+        ['a_0001-11.nc', 'a_0001-12.nc', 'b.nc']
+        >>> len(list(NamelistGenerator._iter_sub_paths("a_%2ymd.nc", 1999, 2000)))
+        730
+        """
+        for line in filenames.split("\n"):
+            if not line:
+                continue
+            match = _ymd_re.search(line)
             if match is None:
-                new_lines.append(line)
+                yield line
                 continue
             if match.group('digits'):
                 year_format = "{:0"+match.group('digits')+"d}"
             else:
                 year_format = "{:04d}"
+            if match.group('day'):
+                date_suffixes = _month_day_strings
+            elif match.group('month'):
+                date_suffixes = _month_strings
+            else:
+                date_suffixes = [""]
+            line_parts = line.split(match.group(0))
             for year in range(year_start, year_end+1):
-                if match.group('day'):
-                    for month in range(1, 13):
-                        days = self._days_in_month(month)
-                        for day in range(1, days+1):
-                            date_string = (year_format + "-{:02d}-{:02d}").format(year, month, day)
-                            new_line = line.replace(match.group(0), date_string)
-                            new_lines.append(new_line)
-                elif match.group('month'):
-                    for month in range(1, 13):
-                        date_string = (year_format + "-{:02d}").format(year, month)
-                        new_line = line.replace(match.group(0), date_string)
-                        new_lines.append(new_line)
-                else:
-                    date_string = year_format.format(year)
-                    new_line = line.replace(match.group(0), date_string)
-                    new_lines.append(new_line)
-        return "\n".join(new_lines)
+                year_string = year_format.format(year)
+                for date_suffix in date_suffixes:
+                    yield (year_string + date_suffix).join(line_parts)
+
+    @staticmethod
+    def _write_streamed_filenames(stream_file, stream_file_text, filenames, separator):
+        """Write a formatted stream file template to `stream_file`, with the
+        `filenames` iterated over written separated by `separator` in place of
+        `_streamed_filenames`."""
+        head, tail = stream_file_text.split(_streamed_filenames)
+        stream_file.write(head)
+        for i, filename in enumerate(filenames):
+            if i > 0:
+                stream_file.write(separator)
+            stream_file.write(filename)
+        stream_file.write(tail)
 
     @staticmethod
     def _add_xml_delimiter(list_to_deliminate, delimiter):
@@ -481,6 +517,7 @@ class NamelistGenerator(object):
             data_filepath = strmobj.get_value("fieldInfo/filePath")
             domain_filenames = strmobj.get_value("domainInfo/fileNames")
             data_filenames = strmobj.get_value("fieldInfo/fileNames")
+            iter_data_filenames = functools.partial(iter, data_filenames.split("\n"))
         else:
             # Figure out the details of this stream.
             if stream in ("prescribed", "copyall"):
@@ -500,13 +537,13 @@ class NamelistGenerator(object):
             offset = self.get_default("strm_offset", config)
             year_start = int(self.get_default("strm_year_start", config))
             year_end = int(self.get_default("strm_year_end", config))
-            data_filenames = self._sub_paths(data_filenames, year_start, year_end)
             domain_filenames = self._sub_paths(domain_filenames, year_start, year_end)
+            iter_data_filenames = functools.partial(self._iter_sub_paths, data_filenames, year_start, year_end)
 
             # Overwrite domain_file if should be set from stream data
             if domain_filenames == 'null':
                 domain_filepath = data_filepath
-                domain_filenames = data_filenames.splitlines()[0]
+                domain_filenames = next(iter_data_filenames(), "")
 
             stream_file_text = _stream_mct_file_template.format(
                 domain_varnames=domain_varnames,
@@ -514,35 +551,30 @@ class NamelistGenerator(object):
                 domain_filenames=domain_filenames,
                 data_varnames=data_varnames,
                 data_filepath=data_filepath,
-                data_filenames=data_filenames,
+                data_filenames=_streamed_filenames,
                 offset=offset,
             )
 
             with open(stream_path, 'w') as stream_file:
-                stream_file.write(stream_file_text)
+                self._write_streamed_filenames(stream_file, stream_file_text, iter_data_filenames(), "\n")
 
-        lines_hash = self._get_input_file_hash(data_list_path)
-        with open(data_list_path, 'a') as input_data_list:
-            for i, filename in enumerate(domain_filenames.split("\n")):
-                if filename.strip() == '':
-                    continue
-                filepath, filename = os.path.split(filename)
-                if not filepath:
-                    filepath = os.path.join(domain_filepath, filename.strip())
-                string = "domain{:d} = {}\n".format(i+1, filepath)
-                hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                if hashValue not in lines_hash:
-                    input_data_list.write(string)
-            for i, filename in enumerate(data_filenames.split("\n")):
-                if filename.strip() == '':
-                    continue
-                filepath = os.path.join(data_filepath, filename.strip())
-                string = "file{:d} = {}\n".format(i+1, filepath)
-                hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                if hashValue not in lines_hash:
-                    input_data_list.write(string)
+        self._add_input_data_lines(data_list_path, itertools.chain(
+            self._iter_domain_lines(domain_filepath, domain_filenames),
+            ("file{:d} = {}".format(i+1, os.path.join(data_filepath, filename.strip()))
+             for i, filename in enumerate(iter_data_filenames()) if filename.strip() != '')))
         self.update_shr_strdata_nml(config, stream, stream_path)
 
+    @staticmethod
+    def _iter_domain_lines(domain_filepath, domain_filenames):
+        """Generate the input data list lines of stream domain files."""
+        for i, filename in enumerate(domain_filenames.split("\n")):
+            if filename.strip() == '':
+                continue
+            filepath, filename = os.path.split(filename)
+            if not filepath:
+                filepath = os.path.join(domain_filepath, filename.strip())
+            yield "domain{:d} = {}".format(i+1, filepath)
+
     def create_nuopc_stream_files(self, config, caseroot, #pylint:disable=too-many-locals
                                   streams, stream_path, data_list_path):
         """Write the XML files for all component streams.
@@ -589,7 +621,7 @@ class NamelistGenerator(object):
                 year_end = int(self.get_default("strm_year_end", config))
 
                 # needed for input data list
-                stream_datafiles = self._sub_paths(stream_datafiles, year_start, year_end)
+                iter_stream_datafiles = functools.partial(self._iter_sub_paths, stream_datafiles, year_start, year_end)
 
                 # determine stream time offset
                 taxmode = self.get_default("taxmode", config)[0]
@@ -602,14 +634,13 @@ class NamelistGenerator(object):
                 yearLast =  self.get_default("strm_year_end", config)
                 yearAlign = self.get_default("strm_year_align", config)
                 stream_offset = self.get_default("strm_offset", config)
-                stream_datafiles_delimited = self._add_xml_delimiter(stream_datafiles.split("\n"), "file")
                 stream_variables = self._add_xml_delimiter(stream_variables.split("\n"), "var")
 
                 # create stream txt file
                 stream_file_text = _stream_nuopc_file_template.format(
                     streamname=stream,
                     data_meshfile=stream_meshfile,
-                    data_filenames=stream_datafiles_delimited,
+                    data_filenames=_streamed_filenames,
                     data_varnames=stream_variables,
                     offset=stream_offset,
                     vectors=vectors,
@@ -622,22 +653,16 @@ class NamelistGenerator(object):
                     mapalgo=mapalgo,
                     tintalgo=tintalgo)
                 with open(stream_path, 'a') as stream_file:
-                    stream_file.write(stream_file_text)
+                    self._write_streamed_filenames(stream_file, stream_file_text,
+                                                   ("<file>{}</file>".format(filename.strip())
+                                                    for filename in iter_stream_datafiles()),
+                                                   "\n      ")
 
             # add entries to input data list
-            lines_hash = self._get_input_file_hash(data_list_path)
-            with open(data_list_path, 'a') as input_data_list:
-                string = "mesh = {}\n".format(stream_meshfile)
-                hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                if hashValue not in lines_hash:
-                    input_data_list.write(string)
-                for i, filename in enumerate(stream_datafiles.split("\n")):
-                    if filename.strip() == '':
-                        continue
-                    string = "file{:d} = {}\n".format(i+1, filename)
-                    hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                    if hashValue not in lines_hash:
-                        input_data_list.write(string)
+            self._add_input_data_lines(data_list_path, itertools.chain(
+                ["mesh = {}".format(stream_meshfile)],
+                ("file{:d} = {}".format(i+1, filename)
+                 for i, filename in enumerate(iter_stream_datafiles()) if filename.strip() != '')))
         with open(stream_path, 'a') as stream_file:
             stream_file.write("</file>\n")
 
@@ -750,57 +775,83 @@ class NamelistGenerator(object):
     def get_group_variables(self, group_name):
         return self._namelist.get_group_variables(group_name)
 
-    def _get_input_file_hash(self, data_list_path):
-        lines_hash = set()
-        if os.path.isfile(data_list_path):
-            with open(data_list_path, "r") as input_data_list:
-                for line in input_data_list:
-                    hashValue = hashlib.md5(line.rstrip().encode('utf-8')).hexdigest()
-                    logger.debug( "Found line {} with hash {}".format(line,hashValue))
-                    lines_hash.add(hashValue)
-        return lines_hash
+    @staticmethod
+    def _get_file_stamp(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+    @classmethod
+    def _get_input_data_lines(cls, data_list_path):
+        """Return the set of lines in the input data list `data_list_path`."""
+        stamp = cls._get_file_stamp(data_list_path)
+        registry = cls._input_data_lists.get(data_list_path)
+        if registry is None or registry[1] != stamp:
+            # First use of the list, or it was removed or changed by another
+            # writer (e.g. a buildnml starting over)
+            lines = set()
+            if stamp is not None:
+                with open(data_list_path, "r") as input_data_list:
+                    for line in input_data_list:
+                        lines.add(line.rstrip())
+            registry = [lines, stamp]
+            cls._input_data_lists[data_list_path] = registry
+        return registry[0]
+
+    @classmethod
+    def _add_input_data_lines(cls, data_list_path, lines):
+        """Append the lines (an iterable of strings without newlines) that are
+        not already in it to the input data list `data_list_path`."""
+        existing_lines = cls._get_input_data_lines(data_list_path)
+        nadded = 0
+        with open(data_list_path, "a") as input_data_list:
+            for line in lines:
+                if line.rstrip() not in existing_lines:
+                    input_data_list.write(line + "\n")
+                    existing_lines.add(line.rstrip())
+                    nadded += 1
+        cls._input_data_lists[data_list_path][1] = cls._get_file_stamp(data_list_path)
+        logger.debug("Added {:d} lines to {}".format(nadded, data_list_path))
+
+    def _iter_input_files(self):
+        """Generate the input data list lines of the namelist variables that
+        are input data files."""
+        for group_name in self._namelist.get_group_names():
+            for variable_name in self._namelist.get_variable_names(group_name):
+                input_pathname = self._definition.get_node_element_info(variable_name, "input_pathname")
+                if input_pathname is not None:
+                    # This is where we end up for all variables that are paths
+                    # to input data files.
+                    literals = self._namelist.get_variable_value(group_name, variable_name)
+                    for literal in literals:
+                        file_path = character_literal_to_string(literal)
+                        # NOTE - these are hard-coded here and a better way is to make these extensible
+                        if file_path == 'UNSET' or file_path == 'idmap' or file_path == 'idmap_ignore':
+                            continue
+                        if input_pathname == 'abs':
+                            # No further mangling needed for absolute paths.
+                            # At this point, there are overwrites that should be ignored
+                            if not os.path.isabs(file_path):
+                                continue
+                            else:
+                                pass
+                        elif input_pathname.startswith('rel:'):
+                            # The part past "rel" is the name of a variable that
+                            # this variable specifies its path relative to.
+                            root_var = input_pathname[4:]
+                            root_dir = self.get_value(root_var)
+                            file_path = os.path.join(root_dir, file_path)
+                        else:
+                            expect(False,
+                                   "Bad input_pathname value: {}.".format(input_pathname))
+                        yield "{} = {}".format(variable_name, file_path)
 
     def _write_input_files(self, data_list_path):
         """Write input data files to list."""
         # append to input_data_list file
-        lines_hash = self._get_input_file_hash(data_list_path)
-        with open(data_list_path, "a") as input_data_list:
-            for group_name in self._namelist.get_group_names():
-                for variable_name in self._namelist.get_variable_names(group_name):
-                    input_pathname = self._definition.get_node_element_info(variable_name, "input_pathname")
-                    if input_pathname is not None:
-                        # This is where we end up for all variables that are paths
-                        # to input data files.
-                        literals = self._namelist.get_variable_value(group_name, variable_name)
-                        for literal in literals:
-                            file_path = character_literal_to_string(literal)
-                            # NOTE - these are hard-coded here and a better way is to make these extensible
-                            if file_path == 'UNSET' or file_path == 'idmap' or file_path == 'idmap_ignore':
-                                continue
-                            if input_pathname == 'abs':
-                                # No further mangling needed for absolute paths.
-                                # At this point, there are overwrites that should be ignored
-                                if not os.path.isabs(file_path):
-                                    continue
-                                else:
-                                    pass
-                            elif input_pathname.startswith('rel:'):
-                                # The part past "rel" is the name of a variable that
-                                # this variable specifies its path relative to.
-                                root_var = input_pathname[4:]
-                                root_dir = self.get_value(root_var)
-                                file_path = os.path.join(root_dir, file_path)
-                            else:
-                                expect(False,
-                                       "Bad input_pathname value: {}.".format(input_pathname))
-                            # Write to the input data list.
-                            string = "{} = {}".format(variable_name, file_path)
-                            hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                            if hashValue not in lines_hash:
-                                logger.debug("Adding line {} with hash {}".format(string,hashValue))
-                                input_data_list.write(string+"\n")
-                            else:
-                                logger.debug("Line already in file {}".format(string))
+        self._add_input_data_lines(data_list_path, self._iter_input_files())
 
     def write_output_file(self, namelist_file, data_list_path=None, groups=None, sorted_groups=True):
         """Write out the namelists and input data files.
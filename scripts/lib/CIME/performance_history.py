@@ -0,0 +1,283 @@
+"""
+History of the performance of the runs archived in SAVE_TIMING_DIR.
+
+The performance archive (SAVE_TIMING_DIR/performance_archive) keeps the
+timing data of every run as tarballs, which is fine for provenance but
+useless for finding trends. At the end of each run the json timing reports
+written by get_timing are also saved as a performance record of the run, with
+the machine, compiler and commit of the run, in the performance archive.
+Each run writes its own record file once, so runs never contend for a shared
+file on the parallel file systems SAVE_TIMING_DIR usually lives on.
+
+The records are indexed offline, in a sqlite database on a local file system
+(see the performance_history tool), with per-component and per-timer times
+and the pe layout, compset, grid, machine and commit of the runs, so that the
+history of a configuration can be queried and regressions found without
+unpacking any tarball.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.get_timing import get_report_timers
+from CIME.utils import SharedArea, get_current_commit, get_median
+
+import getpass, glob, json, sqlite3, time
+
+logger = logging.getLogger(__name__)
+
+PERFORMANCE_RECORDS_DIR = "performance_records"
+
+# Columns of runs that history queries can be filtered on
+RUN_FILTERS = ("case_name", "machine", "compiler", "mpilib", "compset", "grid", "pe_layout", "commit_hash")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs
+ (id INTEGER PRIMARY KEY, case_name TEXT, lid TEXT, instance INTEGER, user TEXT, recorded REAL,
+  machine TEXT, compiler TEXT, mpilib TEXT, compset TEXT, grid TEXT, commit_hash TEXT, driver TEXT,
+  pe_layout TEXT, total_pes INTEGER, run_length_days REAL, throughput REAL, cost REAL,
+  init_time REAL, run_time REAL, final_time REAL,
+  UNIQUE (case_name, lid, instance, user));
+CREATE INDEX IF NOT EXISTS runs_config ON runs (machine, compset, grid);
+CREATE TABLE IF NOT EXISTS components
+ (run_id INTEGER, component TEXT, comp TEXT, ntasks INTEGER, nthrds INTEGER, rootpe INTEGER,
+  pstrid INTEGER, ninst INTEGER, tmin REAL, tmax REAL, PRIMARY KEY (run_id, component));
+CREATE TABLE IF NOT EXISTS timers
+ (run_id INTEGER, name TEXT, nprocs INTEGER, count INTEGER, tmin REAL, tmax REAL,
+  PRIMARY KEY (run_id, name));
+CREATE INDEX IF NOT EXISTS timers_name ON timers (name);
+CREATE TABLE IF NOT EXISTS records (path TEXT PRIMARY KEY, mtime REAL);
+"""
+
+def get_performance_records_dir(timing_dir):
+    """
+    >>> get_performance_records_dir("/timings")
+    '/timings/performance_archive/performance_records'
+    """
+    return os.path.join(timing_dir, "performance_archive", PERFORMANCE_RECORDS_DIR)
+
+def get_pe_layout(components):
+    """
+    Returns a string describing the pe layout of components, the components
+    dict of a get_timing json report, used to only compare runs with the
+    same layout
+
+    >>> get_pe_layout({"OCN" : {"ntasks" : 32, "nthrds" : 1, "rootpe" : 64},
+    ...                "ATM" : {"ntasks" : 64, "nthrds" : 2, "rootpe" : 0}})
+    'ATM:64x2@0,OCN:32x1@64'
+    """
+    return ",".join("{}:{}x{}@{}".format(name, components[name]["ntasks"], components[name]["nthrds"],
+                                         components[name]["rootpe"])
+                    for name in sorted(components))
+
+class PerformanceHistory(object):
+    """
+    Index of performance records, db_path should be on a local file system
+    since sqlite locking is unreliable on parallel and network file systems.
+
+    >>> history = PerformanceHistory(":memory:")
+    >>> history.add_run({"case" : "c", "lid" : "1", "instance" : 0, "driver" : "mct", "compset" : "A",
+    ...                  "grid" : "g", "total_pes" : 4, "run_length_days" : 5, "model_throughput" : 2.5,
+    ...                  "model_cost" : 1.0, "init_time" : 1.0, "run_time" : 10.0, "final_time" : 0.1,
+    ...                  "components" : {"ATM" : {"comp" : "datm", "ntasks" : 4, "nthrds" : 1, "rootpe" : 0,
+    ...                                           "pstrid" : 1, "ninst" : 1, "tmin" : 1.0, "tmax" : 2.0}},
+    ...                  "timers" : {"CPL:RUN" : {"nprocs" : 4, "ncount" : 10, "tmin" : 3.0, "tmax" : 4.0}}},
+    ...                 machine="mach", commit_hash="abc")
+    >>> [sample["value"] for sample in history.get_history(machine="mach")]
+    [2.5]
+    >>> [sample["value"] for sample in history.get_history(component="ATM")]
+    [2.0]
+    >>> [(sample["pe_layout"], sample["value"]) for sample in history.get_history(timer="CPL:RUN")]
+    [('ATM:4x1@0', 4.0)]
+    >>> history.get_history(machine="other")
+    []
+    """
+
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add_run(self, report, machine=None, compiler=None, mpilib=None, commit_hash=None, user=None,
+                recorded=None, commit=True):
+        """
+        Record report, the contents of a json report written by get_timing.
+        A run already recorded for the same case, lid, instance and user is
+        replaced.
+        """
+        user = getpass.getuser() if user is None else user
+        recorded = time.time() if recorded is None else recorded
+        cursor = self._conn.cursor()
+        for row in cursor.execute("SELECT id FROM runs WHERE case_name = ? AND lid = ? AND instance = ? AND user = ?",
+                                  (report["case"], report["lid"], report["instance"], user)).fetchall():
+            cursor.execute("DELETE FROM components WHERE run_id = ?", row)
+            cursor.execute("DELETE FROM timers WHERE run_id = ?", row)
+            cursor.execute("DELETE FROM runs WHERE id = ?", row)
+
+        cursor.execute("INSERT INTO runs (case_name, lid, instance, user, recorded, machine, compiler, mpilib, "
+                       "compset, grid, commit_hash, driver, pe_layout, total_pes, run_length_days, throughput, "
+                       "cost, init_time, run_time, final_time) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (report["case"], report["lid"], report["instance"], user, recorded, machine, compiler,
+                        mpilib, report["compset"], report["grid"], commit_hash, report["driver"],
+                        get_pe_layout(report["components"]), report["total_pes"], report["run_length_days"],
+                        report["model_throughput"], report["model_cost"], report["init_time"],
+                        report["run_time"], report["final_time"]))
+        run_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO components VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(run_id, name, comp["comp"], comp["ntasks"], comp["nthrds"], comp["rootpe"],
+                             comp["pstrid"], comp["ninst"], comp["tmin"], comp["tmax"])
+                            for name, comp in report["components"].items()])
+        # nuopc timers are run on pets rather than processes
+        nprocs, count = ("pets", "count") if report["driver"] == "nuopc" else ("nprocs", "ncount")
+        cursor.executemany("INSERT INTO timers VALUES (?, ?, ?, ?, ?, ?)",
+                           [(run_id, name, timer[nprocs], timer[count], timer["tmin"], timer["tmax"])
+                            for name, timer in get_report_timers(report).items()])
+        if commit:
+            self._conn.commit()
+
+    def add_records(self, records_dir):
+        """
+        Index the performance records in records_dir (see
+        get_performance_records_dir) written or rewritten since they were
+        last indexed. Returns the number of record files read.
+        """
+        indexed = dict(self._conn.execute("SELECT path, mtime FROM records").fetchall())
+        num_read = 0
+        for record_path in sorted(glob.glob(os.path.join(records_dir, "*", "*.jsonl"))):
+            mtime = os.path.getmtime(record_path)
+            if indexed.get(record_path) == mtime:
+                continue
+
+            try:
+                with open(record_path, "r") as fd:
+                    records = [json.loads(line) for line in fd if line.strip()]
+            except (IOError, OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable performance record {}: {}".format(record_path, e))
+                continue
+
+            for record in records:
+                self.add_run(record["report"], machine=record["machine"], compiler=record["compiler"],
+                             mpilib=record["mpilib"], commit_hash=record["commit_hash"], user=record["user"],
+                             recorded=record["recorded"], commit=False)
+            self._conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?)", (record_path, mtime))
+            self._conn.commit()
+            num_read += 1
+
+        return num_read
+
+    def get_history(self, component=None, timer=None, since=None, **filters):
+        """
+        Returns the recorded samples of a metric as a list of dicts, oldest
+        first. The metric is the throughput (simulated years per day) of
+        the runs, or the maximum run time of component, or the maximum time
+        of timer. filters restrict the runs to those whose RUN_FILTERS
+        columns have the given values, since to those recorded after that
+        time (seconds since the epoch).
+        """
+        expect(component is None or timer is None, "Cannot query a component and a timer at the same time")
+        columns = ["id", "recorded", "case_name", "lid", "instance", "user"] + list(RUN_FILTERS)
+        select = ", ".join("runs.{}".format(column) for column in columns)
+        args = []
+        if component is not None:
+            query = "SELECT {}, components.tmax FROM runs JOIN components " \
+                    "ON components.run_id = runs.id AND components.component = ?".format(select)
+            args.append(component)
+        elif timer is not None:
+            query = "SELECT {}, timers.tmax FROM runs JOIN timers " \
+                    "ON timers.run_id = runs.id AND timers.name = ?".format(select)
+            args.append(timer)
+        else:
+            query = "SELECT {}, runs.throughput FROM runs".format(select)
+
+        conditions = []
+        for column, value in sorted(filters.items()):
+            expect(column in RUN_FILTERS, "Unknown filter {}".format(column))
+            if value is not None:
+                conditions.append("runs.{} = ?".format(column))
+                args.append(value)
+        if since is not None:
+            conditions.append("runs.recorded >= ?")
+            args.append(since)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY runs.recorded, runs.id"
+
+        return [dict(zip(columns + ["value"], row)) for row in self._conn.execute(query, args)
+                if row[-1] is not None]
+
+def find_regressions(samples, window=5, threshold=0.1, higher_is_better=True, min_samples=3):
+    """
+    Returns the samples, as returned by PerformanceHistory.get_history,
+    that are worse by more than threshold (a fraction) than the median of
+    the window samples before them with the same machine, compiler, mpilib,
+    compset, grid and pe layout. Samples with fewer than min_samples earlier
+    samples to compare with are not checked. Each regression is returned as
+    (sample, median, relative change).
+
+    >>> samples = [{"value" : v, "machine" : "m", "compiler" : "c", "mpilib" : "mpi", "compset" : "A",
+    ...             "grid" : "g", "pe_layout" : "ATM:4x1@0"} for v in [10, 11, 10, 7, 10.5]]
+    >>> [(sample["value"], median, round(change, 2)) for sample, median, change in find_regressions(samples)]
+    [(7, 10, -0.3)]
+    >>> find_regressions(samples, higher_is_better=False)
+    []
+    """
+    history = {}
+    regressions = []
+    for sample in samples:
+        key = tuple(sample[column] for column in ("machine", "compiler", "mpilib", "compset", "grid", "pe_layout"))
+        previous = history.setdefault(key, [])
+        if len(previous) >= min_samples:
+            median = get_median(previous[-window:])
+            if median > 0:
+                change = (sample["value"] - median) / float(median)
+                if (change < -threshold) if higher_is_better else (change > threshold):
+                    regressions.append((sample, median, change))
+        previous.append(sample["value"])
+
+    return regressions
+
+def save_performance_record(case, lid, timing_dir):
+    """
+    Save the json timing reports of run lid of case as the performance
+    record of the run in the performance archive of timing_dir, one json
+    line per report. The commit is the one the model was built from.
+    Returns the path of the record, None if the run has no timing report.
+    """
+    reports = glob.glob(os.path.join(case.get_value("CASEROOT"), "timing", "{}_timing*.{}.{}.json".
+                                     format(case.get_value("MODEL"), case.get_value("CASE"), lid)))
+    if not reports:
+        logger.debug("No timing report for {}, no performance record saved".format(lid))
+        return None
+
+    describe_path = os.path.join(case.get_value("EXEROOT"), "GIT_DESCRIBE")
+    if os.path.isfile(describe_path):
+        with open(describe_path, "r") as fd:
+            commit_hash = fd.read().strip()
+    else:
+        commit_hash = get_current_commit(tag=True, repo=case.get_value("CIMEROOT"))
+
+    user = getpass.getuser()
+    record = {"user" : user, "recorded" : time.time(), "machine" : case.get_value("MACH"),
+              "compiler" : case.get_value("COMPILER"), "mpilib" : case.get_value("MPILIB"),
+              "commit_hash" : commit_hash}
+    lines = []
+    for report_path in sorted(reports):
+        with open(report_path, "r") as fd:
+            record["report"] = json.load(fd)
+        lines.append(json.dumps(record, sort_keys=True))
+
+    user_dir = os.path.join(get_performance_records_dir(timing_dir), user)
+    record_path = os.path.join(user_dir, "{}.{}.jsonl".format(case.get_value("CASE"), lid))
+    tmp_path = "{}.{:d}".format(record_path, os.getpid())
+    # Use umask to make sure the records are group readable like the rest of the archive
+    with SharedArea():
+        if not os.path.isdir(user_dir):
+            os.makedirs(user_dir)
+        with open(tmp_path, "w") as fd:
+            fd.write("\n".join(lines) + "\n")
+        os.rename(tmp_path, record_path)
+
+    return record_path
@@ -6,6 +6,7 @@ Library for saving build/run provenance.
 
 from CIME.XML.standard_module_setup import *
 from CIME.utils import touch, gzip_existing_file, SharedArea, convert_to_babylonian_time, get_current_commit, indent_string, run_cmd, run_cmd_no_fail, safe_copy
+from CIME.performance_history import save_performance_record
 
 import tarfile, getpass, signal, glob, shutil, sys
 
@@ -327,6 +328,12 @@ def _save_postrun_timing_e3sm(case, lid):
     if timing_dir is None or not os.path.isdir(timing_dir):
         return
 
+    try:
+        save_performance_record(case, lid, timing_dir)
+    except Exception:
+        # We NEVER want a failure here to kill the run
+        logger.warning("Failed to save performance record: {}".format(sys.exc_info()[1]))
+
     mach = case.get_value("MACH")
     base_case = case.get_value("CASE")
     full_timing_dir = os.path.join(timing_dir, "performance_archive", getpass.getuser(), base_case, lid)
@@ -0,0 +1,194 @@
+"""
+Index of the files in a run directory (or any directory of model output).
+
+The directory is scanned once and every file is classified by component,
+instance, file type and date so that archiving and history comparisons can
+query the index instead of listing and regex-matching the directory for
+every component.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.date import get_file_date
+
+import fnmatch
+
+logger = logging.getLogger(__name__)
+
+# File types of RundirIndex entries
+HIST_FILE     = "hist"
+REST_FILE     = "rest"
+RPOINTER_FILE = "rpointer"
+LOG_FILE      = "log"
+OTHER_FILE    = "other"
+
+_UNSET = object()
+
+class RundirIndex(object):
+    """
+    One-pass index of the regular files in a directory.
+
+    Files named casename.comp[_NNNN].ext... are classified by component,
+    instance and (from ext) history or restart file type; rpointer and log
+    files are recognized by name for any casename. Dates are parsed from the
+    file names on first use and cached. Queries that need the exact history
+    file regexes of a component go through the archive spec (see
+    get_all_hist_files), but only look at the files that contain the
+    component name.
+
+    >>> index = RundirIndex(None, casename="c", filenames=["c.cam.h0.0001-01-01-00000.nc",
+    ...     "c.cam_0002.r.0001-01-02-00000.nc", "rpointer.drv", "cpl.log.1234.gz", "README"])
+    >>> index.get_files(filetype=HIST_FILE)
+    ['c.cam.h0.0001-01-01-00000.nc']
+    >>> index.get_files(component="cam", instance="0002")
+    ['c.cam_0002.r.0001-01-02-00000.nc']
+    >>> index.get_files(filetype=REST_FILE, date=get_file_date("0001-01-02-00000"))
+    ['c.cam_0002.r.0001-01-02-00000.nc']
+    >>> index.get_files(filetype=RPOINTER_FILE), index.get_files(filetype=LOG_FILE)
+    (['rpointer.drv'], ['cpl.log.1234.gz'])
+    >>> index.glob("c.*.nc")
+    ['c.cam.h0.0001-01-01-00000.nc', 'c.cam_0002.r.0001-01-02-00000.nc']
+    >>> "README" in index, "c.cam.h1.nc" in index
+    (True, False)
+    >>> index.discard("c.cam.h0.0001-01-01-00000.nc")
+    >>> index.glob("c.*.nc"), index.get_component_files("cam")
+    (['c.cam_0002.r.0001-01-02-00000.nc'], ['c.cam_0002.r.0001-01-02-00000.nc'])
+    """
+
+    def __init__(self, from_dir, casename=None, filenames=None, extra_filenames=None):
+        """
+        Scan from_dir, unless filenames is provided in which case those
+        names are indexed instead (from_dir need not exist). Any
+        extra_filenames are indexed as well.
+        """
+        self.from_dir = from_dir
+        self._casename = casename
+        if filenames is None:
+            filenames = _scan_files(from_dir)
+        if extra_filenames:
+            filenames = list(filenames) + list(extra_filenames)
+
+        self._entries = {}
+        for filename in filenames:
+            self._entries[filename] = self._classify(filename)
+        self._filenames = sorted(self._entries)
+        self._component_files = {}
+        self._dates = {}
+
+    def _classify(self, filename):
+        """
+        Returns (filetype, component, instance) for filename
+        """
+        if filename.startswith("rpointer."):
+            return RPOINTER_FILE, None, None
+        if ".log." in filename:
+            return LOG_FILE, None, None
+
+        if self._casename is not None and filename.startswith(self._casename + "."):
+            fields = filename[len(self._casename) + 1:].split(".")
+            if len(fields) > 1:
+                component, _, instance = fields[0].partition("_")
+                if not (len(instance) == 4 and instance.isdigit()):
+                    component, instance = fields[0], None
+                ext = fields[1]
+                if ext.startswith("h"):
+                    return HIST_FILE, component, instance
+                elif ext.startswith("r"):
+                    return REST_FILE, component, instance
+                return OTHER_FILE, component, instance
+
+        return OTHER_FILE, None, None
+
+    def __contains__(self, filename):
+        return filename in self._entries
+
+    def __len__(self):
+        return len(self._filenames)
+
+    @property
+    def filenames(self):
+        """
+        Sorted list of all indexed file names
+        """
+        return self._filenames
+
+    def discard(self, filename):
+        """
+        Remove filename from the index, if it is indexed. Files moved or
+        removed from the directory must be discarded for later queries not
+        to return them.
+        """
+        if filename in self._entries:
+            del self._entries[filename]
+            self._filenames.remove(filename)
+            for files in self._component_files.values():
+                if filename in files:
+                    files.remove(filename)
+            self._dates.pop(filename, None)
+
+    def get_date(self, filename):
+        """
+        Date of filename, as returned by get_file_date, cached
+        """
+        if filename not in self._dates:
+            self._dates[filename] = get_file_date(filename)
+        return self._dates[filename]
+
+    def get_files(self, filetype=None, component=None, instance=_UNSET, date=_UNSET):
+        """
+        Sorted file names matching all of the given classifications. Pass
+        instance=None to select files without an instance number.
+        """
+        result = []
+        for filename in self._filenames:
+            ftype, fcomp, finst = self._entries[filename]
+            if (filetype is None or ftype == filetype) and \
+               (component is None or fcomp == component) and \
+               (instance is _UNSET or finst == instance) and \
+               (date is _UNSET or _same_date(self.get_date(filename), date)):
+                result.append(filename)
+        return result
+
+    def glob(self, pattern):
+        """
+        Sorted file names matching the shell pattern
+        """
+        return fnmatch.filter(self._filenames, pattern)
+
+    def get_component_files(self, model):
+        """
+        Sorted file names containing the file name of component model, a
+        superset of the model's history and restart files
+        """
+        # the compname is drv but the files are named cpl, remove fv3gfs when component name is changed
+        substr = {"drv" : "cpl", "fv3gfs" : "fv3"}.get(model, model)
+        if substr not in self._component_files:
+            self._component_files[substr] = [f for f in self._filenames if substr in f]
+        return self._component_files[substr]
+
+    def get_all_hist_files(self, archive, casename, model, suffix="", ref_case=None):
+        """
+        Same as archive.get_all_hist_files for this directory
+        """
+        return archive.get_all_hist_files(casename, model, self.from_dir, suffix=suffix, ref_case=ref_case,
+                                          filenames=self.get_component_files(model))
+
+    def get_latest_hist_files(self, archive, casename, model, suffix="", ref_case=None):
+        """
+        Same as archive.get_latest_hist_files for this directory
+        """
+        return archive.get_latest_hist_files(casename, model, self.from_dir, suffix=suffix, ref_case=ref_case,
+                                             filenames=self.get_component_files(model))
+
+def _same_date(date1, date2):
+    if date1 is None or date2 is None:
+        return date1 is date2
+    return date1 == date2
+
+def _scan_files(from_dir):
+    """
+    Names of the regular files (or links to them) in from_dir
+    """
+    expect(os.path.isdir(from_dir), "Cannot open directory {}".format(from_dir))
+    if hasattr(os, "scandir"):
+        return [entry.name for entry in os.scandir(from_dir) if entry.is_file()]
+    else:
+        return [f for f in os.listdir(from_dir) if os.path.isfile(os.path.join(from_dir, f))]
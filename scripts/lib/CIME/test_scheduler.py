@@ -123,7 +123,7 @@ class TestScheduler(object):
                  allow_baseline_overwrite=False, output_root=None,
                  force_procs=None, force_threads=None, mpilib=None,
                  input_dir=None, pesfile=None, mail_user=None, mail_type=None, allow_pnl=False,
-                 non_local=False, single_exe=False, workflow=None):
+                 non_local=False, single_exe=False, workflow=None, prefetch_inputdata=False):
     ###########################################################################
         self._cime_root       = get_cime_root()
         self._cime_model      = get_model()
@@ -159,6 +159,7 @@ class TestScheduler(object):
         self._no_setup = no_setup
         self._no_build = no_build or no_setup or namelists_only
         self._no_run   = no_run or self._no_build
+        self._prefetch_inputdata = prefetch_inputdata and not self._no_run
         self._output_root = output_root
         # Figure out what project to use
         if project is None:
@@ -751,7 +752,11 @@ class TestScheduler(object):
             else:
                 return False, "Cannot use build for test {} because it failed".format(first_test)
 
-        return self._shell_cmd_for_phase(test, "./case.build --model-only", MODEL_BUILD_PHASE, from_dir=test_dir)
+        cmd = "./case.build --model-only"
+        if self._prefetch_inputdata:
+            # Tests that will run need their input data, fetch it while the model builds
+            cmd += " --prefetch-inputdata"
+        return self._shell_cmd_for_phase(test, cmd, MODEL_BUILD_PHASE, from_dir=test_dir)
 
     ###########################################################################
     def _run_phase(self, test):
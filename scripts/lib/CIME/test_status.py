@@ -26,12 +26,22 @@ Additional important design decisions:
 from CIME.XML.standard_module_setup import *
 
 from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
 
-import os, itertools
+import os, itertools, json
 from CIME import expected_fails
+from CIME.utils import flock_exclusive
 
 TEST_STATUS_FILENAME = "TestStatus"
 
+# Every flush of a TestStatus file also appends a record of its phases to
+# the status store of its test suite, a JSON lines file per test id in the
+# test root.
+# The reporting tools read the store instead of parsing every TestStatus file,
+# the files remain the source of truth: a record is only used if the file
+# still has the mtime, size and inode that were recorded.
+TEST_STATUS_STORE_FILENAME = ".TestStatus.{}.jsonl"
+
 # The statuses that a phase can be in
 TEST_PEND_STATUS = "PEND"
 TEST_PASS_STATUS = "PASS"
@@ -60,6 +70,7 @@ MODEL_BUILD_PHASE     = "MODEL_BUILD"
 SUBMIT_PHASE          = "SUBMIT"
 RUN_PHASE             = "RUN"
 THROUGHPUT_PHASE      = "TPUTCOMP"
+TIMECOMP_PHASE        = "TIMECOMP"
 MEMCOMP_PHASE         = "MEMCOMP"
 MEMLEAK_PHASE         = "MEMLEAK"
 STARCHIVE_PHASE       = "SHORT_TERM_ARCHIVER"
@@ -78,6 +89,7 @@ ALL_PHASES = [CREATE_NEWCASE_PHASE,
               COMPARE_PHASE,
               BASELINE_PHASE,
               THROUGHPUT_PHASE,
+              TIMECOMP_PHASE,
               MEMCOMP_PHASE,
               MEMLEAK_PHASE,
               STARCHIVE_PHASE,
@@ -118,7 +130,7 @@ def _test_helper2(file_contents, wait_for_run=False, check_throughput=False, che
 
 class TestStatus(object):
 
-    def __init__(self, test_dir=None, test_name=None, no_io=False):
+    def __init__(self, test_dir=None, test_name=None, no_io=False, phase_statuses=None):
         """
         Create a TestStatus object
 
@@ -126,6 +138,9 @@ class TestStatus(object):
 
         no_io is intended only for testing, and should be kept False in
         production code
+
+        phase_statuses, a list of (phase, status, comments), is used instead
+        of reading the TestStatus file (see get_test_statuses)
         """
         test_dir = os.getcwd() if test_dir is None else test_dir
         self._filename = os.path.join(test_dir, TEST_STATUS_FILENAME)
@@ -134,7 +149,12 @@ class TestStatus(object):
         self._ok_to_modify = False
         self._no_io = no_io
 
-        if os.path.exists(self._filename):
+        if phase_statuses is not None:
+            for phase, status, comments in phase_statuses:
+                self._phase_statuses[phase] = (status, comments)
+            if not os.access(self._filename, os.W_OK):
+                self._no_io = True
+        elif os.path.exists(self._filename):
             self._parse_test_status_file()
             if not os.access(self._filename, os.W_OK):
                 self._no_io = True
@@ -287,6 +307,33 @@ class TestStatus(object):
         if self._phase_statuses and not self._no_io:
             with open(self._filename, "w") as fd:
                 fd.write(self.phase_statuses_dump())
+                fd.flush()
+                # The stamp of what was written here, even if the file is
+                # replaced before the record is appended
+                st = os.fstat(fd.fileno())
+            self._append_to_store(st)
+
+    def _append_to_store(self, st):
+        """
+        Append the current phases to the status store of this test's suite,
+        stamped with st, the stat of the TestStatus file written. The store
+        is only a cache of the TestStatus files, so failures are ignored.
+        """
+        test_dir = os.path.dirname(self._filename)
+        store_path = get_test_status_store_path(test_dir, self._test_name)
+        if store_path is None:
+            return
+
+        try:
+            record = {"dir"    : os.path.basename(test_dir),
+                      "name"   : self._test_name,
+                      "stamp"  : [st.st_mtime, st.st_size, st.st_ino],
+                      "phases" : [[phase, status, comments] for phase, (status, comments) in self._phase_statuses.items()]}
+            with open(store_path, "a") as fd:
+                flock_exclusive(fd)
+                fd.write(json.dumps(record) + "\n")
+        except (IOError, OSError, ValueError) as e:
+            logging.debug("Could not update test status store {}: {}".format(store_path, e))
 
     def _parse_test_status(self, file_contents):
         """
@@ -351,7 +398,7 @@ class TestStatus(object):
                     break
 
             elif (status == TEST_FAIL_STATUS):
-                if ( (not check_throughput and phase == THROUGHPUT_PHASE) or
+                if ( (not check_throughput and phase in [THROUGHPUT_PHASE, TIMECOMP_PHASE]) or
                      (not check_memory and phase == MEMCOMP_PHASE) or
                      (ignore_namelists and phase == NAMELIST_PHASE) or
                      (ignore_memleak and phase == MEMLEAK_PHASE) ):
@@ -395,6 +442,10 @@ class TestStatus(object):
         'PASS'
         >>> _test_helper2('PASS ERS.foo.A RUN\nFAIL ERS.foo.A TPUTCOMP', check_throughput=True)
         'FAIL'
+        >>> _test_helper2('PASS ERS.foo.A RUN\nFAIL ERS.foo.A TIMECOMP')
+        'PASS'
+        >>> _test_helper2('PASS ERS.foo.A RUN\nFAIL ERS.foo.A TIMECOMP', check_throughput=True)
+        'FAIL'
         >>> _test_helper2('PASS ERS.foo.A MODEL_BUILD\nPASS ERS.foo.A RUN\nFAIL ERS.foo.A NLCOMP')
         'NLFAIL'
         >>> _test_helper2('PASS ERS.foo.A MODEL_BUILD\nPEND ERS.foo.A RUN\nFAIL ERS.foo.A NLCOMP')
@@ -468,3 +519,105 @@ class TestStatus(object):
                                                             ignore_memleak=ignore_memleak,
                                                             no_run=no_run)
 
+
+def get_test_status_store_path(test_dir, test_name):
+    """
+    Returns the path of the status store of the suite test_dir belongs to, or
+    None if test_dir is not named <test_name>.<test_id>. Like cs.status, the
+    last dot-separated part of the directory name is used as the test id.
+
+    >>> get_test_status_store_path("/scratch/ERS.f19_g16.A.mach_gnu.G.20200101", "ERS.f19_g16.A.mach_gnu")
+    '/scratch/.TestStatus.20200101.jsonl'
+    >>> get_test_status_store_path("/scratch/mycase", "ERS.f19_g16.A.mach_gnu") is None
+    True
+    """
+    dirname = os.path.basename(test_dir)
+    if test_name is None or not dirname.startswith(test_name + ".") or len(dirname) == len(test_name) + 1:
+        return None
+    return os.path.join(os.path.dirname(test_dir), TEST_STATUS_STORE_FILENAME.format(dirname.split(".")[-1]))
+
+def _read_test_status_store(store_path):
+    """
+    Returns {test directory name -> latest record} from store_path. Stores
+    holding many superseded records are compacted in place.
+    """
+    records = {}
+    try:
+        with open(store_path, "r") as fd:
+            lines = fd.readlines()
+    except (IOError, OSError):
+        return records
+
+    for line in lines:
+        try:
+            record = json.loads(line)
+            records[record["dir"]] = record
+        except (ValueError, KeyError, TypeError):
+            # Partially written line
+            pass
+
+    if len(lines) > 4 * len(records) + 100:
+        try:
+            with open(store_path, "r+") as fd:
+                flock_exclusive(fd)
+                # Records appended since we read the store are kept
+                new_lines = fd.readlines()[len(lines):]
+                fd.seek(0)
+                fd.truncate()
+                fd.writelines([json.dumps(record) + "\n" for record in records.values()] + new_lines)
+        except (IOError, OSError) as e:
+            logging.debug("Could not compact test status store {}: {}".format(store_path, e))
+
+    return records
+
+def get_test_statuses(test_status_files, nthreads=8):
+    """
+    Returns TestStatus objects for the TestStatus files in test_status_files,
+    in the same order. Tests are read from the status store of their suite
+    when the store has a record of the current file, so only files changed
+    outside of TestStatus.flush (or written before the store existed) are
+    parsed, up to nthreads at a time since this is dominated by file system
+    latency.
+    """
+    stores = {}
+    test_statuses = []
+    to_parse = []
+    for test_status_file in test_status_files:
+        test_dir = os.path.dirname(test_status_file)
+        dirname = os.path.basename(test_dir)
+        store_path = os.path.join(os.path.dirname(test_dir), TEST_STATUS_STORE_FILENAME.format(dirname.split(".")[-1]))
+        if store_path not in stores:
+            stores[store_path] = _read_test_status_store(store_path) if os.path.isfile(store_path) else {}
+
+        record = stores[store_path].get(dirname)
+        ts = None
+        if record is not None:
+            try:
+                st = os.stat(test_status_file)
+                if [st.st_mtime, st.st_size, st.st_ino] == record["stamp"] and \
+                   get_test_status_store_path(test_dir, record["name"]) == store_path:
+                    ts = TestStatus(test_dir=test_dir, test_name=record["name"], phase_statuses=record["phases"])
+            except (OSError, KeyError, TypeError, ValueError):
+                pass
+
+        if ts is None:
+            to_parse.append((len(test_statuses), test_dir))
+        test_statuses.append(ts)
+
+    if len(to_parse) > 1 and nthreads > 1:
+        pool = ThreadPool(min(nthreads, len(to_parse)))
+        try:
+            parsed = pool.map(_parse_test_status, [test_dir for _, test_dir in to_parse])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parsed = [_parse_test_status(test_dir) for _, test_dir in to_parse]
+
+    for (idx, _), ts in zip(to_parse, parsed):
+        test_statuses[idx] = ts
+
+    return test_statuses
+
+def _parse_test_status(test_dir):
+    return TestStatus(test_dir=test_dir)
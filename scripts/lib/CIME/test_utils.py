@@ -7,10 +7,17 @@ from CIME.XML.standard_module_setup import *
 from CIME.XML.testlist import Testlist
 from CIME.XML.files import Files
 from CIME.test_status import TEST_STATUS_FILENAME
+from multiprocessing.dummy import Pool as ThreadPool
 import CIME.utils
+import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
 
+# Test directories are scanned this many at a time
+SCAN_THREADS = 8
+
+_VAR_REF_RE = re.compile(r"\$\{?(\w+)\}?")
+
 def get_tests_from_xml(xml_machine=None,xml_category=None,xml_compiler=None, xml_testlist=None,
                        machine=None, compiler=None, driver=None):
     """
@@ -112,3 +119,47 @@ def get_test_status_files(test_root, compiler, test_id=None):
 
     expect(test_status_files, "No matching test cases found in for {}/{}/{}".format(test_root, test_id_glob, TEST_STATUS_FILENAME))
     return test_status_files
+
+def scan_test_dirs(func, items, nthreads=SCAN_THREADS):
+    """
+    Returns [func(item) for item in items], calling func from up to nthreads
+    threads. Scanning test directories is dominated by file system latency,
+    which threads overlap. The results are in the order of items whatever
+    the order the calls finish in.
+
+    >>> scan_test_dirs(len, ["a", "bcd", "", "ef"])
+    [1, 3, 0, 2]
+    """
+    items = list(items)
+    if len(items) < 2 or nthreads < 2:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(nthreads, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+def get_case_values(case_dir, names):
+    """
+    Returns a dict name -> value of the variables names of the case in
+    case_dir, read directly from the entries of its env_*.xml files. This
+    is much cheaper than opening a Case when only a few values are needed.
+    References to other variables of the case (e.g. $CASEROOT) are resolved,
+    references to anything else (e.g. $ENV{SCRATCH}) are left as they are.
+    Variables that are not found are None.
+    """
+    entries = {}
+    for env_file in sorted(glob.glob(os.path.join(case_dir, "env_*.xml"))):
+        for entry in ET.parse(env_file).getroot().iter("entry"):
+            if entry.get("id") is not None and entry.get("value") is not None:
+                entries.setdefault(entry.get("id"), entry.get("value"))
+
+    def resolve(value, depth=0):
+        if depth > 10 or "$" not in value:
+            return value
+        return _VAR_REF_RE.sub(lambda m: resolve(entries[m.group(1)], depth + 1) if m.group(1) in entries
+                               else m.group(0), value)
+
+    return dict((name, resolve(entries[name]) if name in entries else None) for name in names)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from CIME.utils import get_cime_root
+from CIME.XML.generic_xml import GenericXML
+from CIME.XML.namelist_definition import NamelistDefinition
+
+DRV_DEFINITION = os.path.join(get_cime_root(), "src", "drivers", "mct", "cime_config",
+                              "namelist_definition_drv.xml")
+
+class TestNamelistDefinitionCache(unittest.TestCase):
+
+    def test_set_nodes_shared(self):
+        """A second definition of the same file reuses the entry data of the first"""
+        first = NamelistDefinition(DRV_DEFINITION)
+        default_nodes = first.set_nodes()
+        second = NamelistDefinition(DRV_DEFINITION)
+        self.assertEqual(second.set_nodes(), default_nodes)
+        for name in first._entry_ids:
+            self.assertIs(second._nodes[name], first._nodes[name])
+            self.assertEqual(second.get_group(name), first.get_group(name))
+            self.assertEqual(second.split_type_string(name), first.split_type_string(name))
+
+    def test_set_nodes_repeated(self):
+        """Calling set_nodes for every instance does not accumulate entries"""
+        definition = NamelistDefinition(DRV_DEFINITION)
+        definition.set_nodes()
+        nentries = len(definition._entry_ids)
+        for _ in range(3):
+            definition.set_nodes()
+        self.assertEqual(len(definition._entry_ids), nentries)
+        self.assertEqual(len(definition.get_entry_nodes()), nentries)
+
+    def test_set_nodes_skip_groups(self):
+        """Entries of skipped groups are left out"""
+        definition = NamelistDefinition(DRV_DEFINITION)
+        definition.set_nodes()
+        groups = set(definition.get_group(name) for name in definition._entry_ids)
+        skip_group = sorted(groups)[0]
+
+        skipping = NamelistDefinition(DRV_DEFINITION)
+        skipping.set_nodes(skip_groups=[skip_group])
+        self.assertTrue(skipping._entry_ids)
+        for name in skipping._entry_ids:
+            self.assertNotEqual(skipping.get_group(name), skip_group)
+
+class TestValidationCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._log = os.path.join(self._tempdir, "xmllint.log")
+        # An xmllint that accepts everything and records that it was run
+        xmllint = os.path.join(self._tempdir, "xmllint")
+        with open(xmllint, "w") as fd:
+            fd.write("#!/bin/sh\necho \"$@\" >> {}\n".format(self._log))
+        os.chmod(xmllint, stat.S_IRWXU)
+        self._path = os.environ["PATH"]
+        os.environ["PATH"] = self._tempdir + os.pathsep + self._path
+        self._cache = GenericXML.VALIDATION_CACHE
+        GenericXML.VALIDATION_CACHE = os.path.join(self._tempdir, "cache", "validated.json")
+
+        self._xml = os.path.join(self._tempdir, "file.xml")
+        self._schema = os.path.join(self._tempdir, "file.xsd")
+        for path in (self._xml, self._schema):
+            with open(path, "w") as fd:
+                fd.write("<file/>\n")
+
+    def tearDown(self):
+        os.environ["PATH"] = self._path
+        GenericXML.VALIDATION_CACHE = self._cache
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _nvalidations(self):
+        if not os.path.isfile(self._log):
+            return 0
+        with open(self._log) as fd:
+            return len(fd.readlines())
+
+    def test_validated_once(self):
+        """Unchanged files are validated once, changed files again"""
+        GenericXML().validate_xml_file(self._xml, self._schema)
+        GenericXML().validate_xml_file(self._xml, self._schema)
+        self.assertEqual(self._nvalidations(), 1)
+        # Remembered by later runs
+        self.assertTrue(os.path.isfile(GenericXML.VALIDATION_CACHE))
+        self.assertEqual(os.listdir(os.path.dirname(GenericXML.VALIDATION_CACHE)), ["validated.json"])
+
+        with open(self._xml, "w") as fd:
+            fd.write("<file version=\"2.0\"/>\n")
+        mtime = time.time() + 10
+        os.utime(self._xml, (mtime, mtime))
+        GenericXML().validate_xml_file(self._xml, self._schema)
+        self.assertEqual(self._nvalidations(), 2)
+
+    def test_includes_not_cached(self):
+        """Files including other files are always validated"""
+        with open(self._xml, "w") as fd:
+            fd.write("<file><xi:include href=\"other.xml\"/></file>\n")
+        GenericXML().validate_xml_file(self._xml, self._schema)
+        GenericXML().validate_xml_file(self._xml, self._schema)
+        self.assertEqual(self._nvalidations(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of CIME.namelist.parse.
+
+Usage: bench_namelist.py [namelist files...]
+
+Parses each namelist file given, e.g. the drv_in and atm_in files in the
+CaseDocs directory of a B compset case, and reports the parse time. With no
+arguments, namelists resembling a B compset drv_in (many small groups) and
+atm_in (large groups, long history field lists) are generated and parsed.
+"""
+
+import os, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from CIME.namelist import parse # pylint: disable=wrong-import-position
+
+def _make_drv_in():
+    lines = []
+    for group in range(40):
+        lines.append("&group{:d}_inparm".format(group))
+        for var in range(12):
+            lines.append("  int_var{:d} = {:d}".format(var, var * 17))
+            lines.append("  real_var{:d} = {:.8e}".format(var, var / 3.))
+            lines.append("  logical_var{:d} = .{}.".format(var, "true" if var % 2 else "false"))
+            lines.append("  file_var{:d} = '/glade/p/cesmdata/inputdata/share/domains/domain.lnd.fv0.9x1.25_gx1v7.{:d}.nc'".format(var, var))
+        lines.append("/")
+    return "\n".join(lines) + "\n"
+
+def _make_atm_in():
+    lines = []
+    for group in range(30):
+        lines.append("&atm_group{:d}_nl".format(group))
+        lines.append("! Generated settings for group {:d}".format(group))
+        for var in range(25):
+            lines.append(" real_var{:d}\t\t= {:.6f}, {:.6f}, 3*{:.1f}".format(var, var * 1.5, var * 2.5, var * 0.5))
+            lines.append(" str_var{:d}\t\t= 'value_{:d}'".format(var, var))
+        fields = ", ".join("'FIELD{:03d}:A'".format(i) for i in range(150))
+        lines.append(" fincl{:d} = {}".format(group, fields))
+        lines.append(" ncdata = '/glade/p/cesmdata/inputdata/atm/cam/inic/fv/cami-mam3_0000-01-01_0.9x1.25_L32_c141031.nc'")
+        lines.append("/")
+    return "\n".join(lines) + "\n"
+
+def _benchmark(name, text, repeat=5):
+    times = timeit.repeat(lambda: parse(text=text), number=1, repeat=repeat)
+    print("{:<40s} {:>9d} bytes  best {:8.4f} s  mean {:8.4f} s".format(name, len(text), min(times), sum(times) / len(times)))
+
+def _main():
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            with open(filename) as fd:
+                _benchmark(os.path.basename(filename), fd.read())
+    else:
+        _benchmark("generated drv_in", _make_drv_in())
+        _benchmark("generated atm_in", _make_atm_in())
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of CIME.wait_for_tests.wait_for_tests_impl.
+
+Usage: bench_wait_for_tests.py [number of tests] [seconds]
+
+Creates synthetic TestStatus files for the given number of tests (default
+2000) with the RUN phase pending, then finishes them at an even rate over
+the given number of seconds (default 10) from another thread while
+wait_for_tests_impl waits for them, once with inotify and once with stat
+polling. Reports the wall time, the CPU time of the process and how long
+after the last test finished the wait returned.
+"""
+
+import os, sys, shutil, tempfile, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+# pylint: disable=wrong-import-position
+from CIME import wait_for_tests
+from CIME.test_status import TestStatus, CORE_PHASES, RUN_PHASE, TEST_PASS_STATUS, TEST_PEND_STATUS
+
+def _make_tests(test_root, ntests):
+    test_dirs = []
+    for i in range(ntests):
+        test_name = "ERS.f19_g16.A{:d}.machine_compiler".format(i)
+        test_dir = os.path.join(test_root, test_name)
+        os.makedirs(test_dir)
+        with TestStatus(test_dir=test_dir, test_name=test_name) as ts:
+            for phase in CORE_PHASES[:-1]:
+                ts.set_status(phase, TEST_PASS_STATUS)
+            ts.set_status(RUN_PHASE, TEST_PEND_STATUS)
+        test_dirs.append(test_dir)
+    return test_dirs
+
+def _finish_tests(test_dirs, seconds, finished):
+    start = time.time()
+    for i, test_dir in enumerate(test_dirs):
+        delay = start + seconds * (i + 1) / len(test_dirs) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        with TestStatus(test_dir=test_dir) as ts:
+            ts.set_status(RUN_PHASE, TEST_PASS_STATUS)
+    finished.append(time.time())
+
+def _benchmark(name, ntests, seconds):
+    test_root = tempfile.mkdtemp()
+    try:
+        test_dirs = _make_tests(test_root, ntests)
+        finished = []
+        finisher = threading.Thread(target=_finish_tests, args=(test_dirs, seconds, finished))
+        start, cpu_start = time.time(), sum(os.times()[:2])
+        finisher.start()
+        results = wait_for_tests.wait_for_tests_impl(test_dirs)
+        end, cpu_end = time.time(), sum(os.times()[:2])
+        finisher.join()
+        assert len(results) == ntests
+        print("{:<10s} {:6d} tests  wall {:7.2f} s  cpu {:7.2f} s  lag after last test {:6.3f} s".
+              format(name, ntests, end - start, cpu_end - cpu_start, end - finished[0]))
+    finally:
+        shutil.rmtree(test_root, ignore_errors=True)
+
+def _main():
+    ntests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.
+    _benchmark("inotify", ntests, seconds)
+    wait_for_tests.USE_INOTIFY = False
+    _benchmark("polling", ntests, seconds)
+
+if __name__ == "__main__":
+    _main()
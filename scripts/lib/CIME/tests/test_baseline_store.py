@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from CIME.baseline_store import add_object, collect_garbage, get_object_store, store_baseline_dir, tag_baselines
+from CIME.hist_hash import get_manifest_entry, get_object_path, lookup_var_hashes, get_var_hashes, \
+    read_baseline_manifest, write_baseline_manifest
+from CIME.hist_utils import generate_baseline
+from CIME.tests.case_fake import CaseFake
+from CIME.utils import get_cime_root
+
+class _Archive(object):
+    def get_latest_hist_files(self, casename, model, from_dir, suffix="", ref_case=None, filenames=None):
+        # pylint: disable=unused-argument
+        return sorted(name for name in filenames if ".{}.".format(model) in name and name.endswith(".nc"))
+
+class _HistCaseFake(CaseFake):
+    """A case with coupler history files in its run directory"""
+
+    def get_env(self, name):
+        # pylint: disable=unused-argument
+        return _Archive()
+
+    def get_compset_components(self):
+        return []
+
+    def get_latest_cpl_log(self, coupler_log_path=None, cplname="cpl"):
+        # pylint: disable=unused-argument
+        return None
+
+class TestBaselineStore(unittest.TestCase):
+    """Tests of the baseline object store, using the cprnc test inputs as history files"""
+
+    def setUp(self):
+        self._inputs = os.path.join(get_cime_root(), "tools", "cprnc", "test_inputs")
+        self._root = tempfile.mkdtemp()
+        self._store = get_object_store(self._root)
+
+    def tearDown(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def _make_baseline(self, name, inputs):
+        """Make a baseline of copied history files with a manifest, as generated without the object store"""
+        baseline_dir = os.path.join(self._root, name, "ERS.f19_g16.A.mach_gnu")
+        os.makedirs(baseline_dir)
+        manifest = {}
+        for hist, filename in inputs:
+            shutil.copy(os.path.join(self._inputs, filename), os.path.join(baseline_dir, hist))
+            manifest[hist] = get_manifest_entry(os.path.join(baseline_dir, hist))
+        write_baseline_manifest(baseline_dir, manifest)
+        return baseline_dir
+
+    def _objects(self):
+        return sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(self._store) for name in names)
+
+    def test_dedup(self):
+        """Identical files of different baselines are stored once and resolved through the manifests"""
+        master = self._make_baseline("master", [("cpl.hi.nc", "control.nc"), ("atm.h0.nc", "diffs_in_vals.nc")])
+        branch = self._make_baseline("branch", [("cpl.hi.nc", "copy.nc"), ("atm.h0.nc", "control.nc")])
+        self.assertEqual(store_baseline_dir(master, self._store), 2)
+        self.assertEqual(store_baseline_dir(branch, self._store), 2)
+        self.assertEqual(store_baseline_dir(branch, self._store), 0)
+        self.assertEqual(len(self._objects()), 2)
+        self.assertEqual(os.listdir(branch), ["baseline_manifest.json"])
+
+        manifest = read_baseline_manifest(branch)
+        for hist, filename in [("cpl.hi.nc", "control.nc"), ("atm.h0.nc", "control.nc")]:
+            object_path = get_object_path(os.path.join(branch, hist), manifest)
+            self.assertTrue(object_path.startswith(self._store))
+            with open(object_path, "rb") as fd1, open(os.path.join(self._inputs, filename), "rb") as fd2:
+                self.assertEqual(fd1.read(), fd2.read())
+            self.assertFalse(os.stat(object_path).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+            self.assertEqual(lookup_var_hashes(os.path.join(branch, hist), manifest),
+                             get_var_hashes(os.path.join(self._inputs, filename)))
+
+    def test_tag(self):
+        """Tagging copies the manifests only, the tag references the same objects"""
+        master = self._make_baseline("master", [("cpl.hi.nc", "control.nc")])
+        store_baseline_dir(master, self._store)
+        objects = self._objects()
+
+        tag_baselines(self._root, "master", "v1.0")
+        tag_dir = os.path.join(self._root, "v1.0", os.path.basename(master))
+        self.assertEqual(self._objects(), objects)
+        self.assertEqual(get_object_path(os.path.join(tag_dir, "cpl.hi.nc"), read_baseline_manifest(tag_dir)),
+                         objects[0])
+        self.assertRaises(SystemExit, tag_baselines, self._root, "master", "v1.0")
+
+    def test_collect_garbage(self):
+        """Only old objects that no manifest references are removed"""
+        master = self._make_baseline("master", [("cpl.hi.nc", "control.nc")])
+        store_baseline_dir(master, self._store)
+        referenced = self._objects()
+        unused = add_object(self._store, os.path.join(self._inputs, "diffs_in_vals.nc"), "0123abcd")
+        recent = add_object(self._store, os.path.join(self._inputs, "diffs_in_vals.nc"), "4567abcd")
+        old = time.time() - 7 * 24 * 3600
+        for path in referenced + [unused]:
+            os.utime(path, (old, old))
+
+        self.assertEqual(collect_garbage(self._root, dry_run=True), [unused])
+        self.assertEqual(collect_garbage(self._root), [unused])
+        self.assertEqual(self._objects(), sorted(referenced + [recent]))
+
+    def test_object_of_other_user(self):
+        """Using an object that cannot be touched, e.g. of another user, keeps it from being collected"""
+        hist = os.path.join(self._inputs, "control.nc")
+        object_file = add_object(self._store, hist, "0123abcd")
+        old = time.time() - 7 * 24 * 3600
+        os.utime(object_file, (old, old))
+
+        utime = os.utime
+        def utime_not_owner(path, times):
+            if path == object_file:
+                raise OSError(errno.EACCES, "Permission denied", path)
+            utime(path, times)
+
+        os.utime = utime_not_owner
+        try:
+            self.assertEqual(add_object(self._store, hist, "0123abcd"), object_file)
+        finally:
+            os.utime = utime
+        self.assertEqual(collect_garbage(self._root), [])
+
+        stamps = [path for path in self._objects() if path != object_file]
+        self.assertEqual(len(stamps), 1)
+        os.utime(stamps[0], (old, old))
+        self.assertEqual(collect_garbage(self._root), [object_file])
+        self.assertEqual(self._objects(), [])
+
+    def test_other_baseline_root(self):
+        """Objects of baselines generated outside the BASELINE_ROOT of the case are stored in their own root"""
+        case = _HistCaseFake(os.path.join(self._root, "case"))
+        for item, value in [("BASELINE_ROOT", os.path.join(self._root, "default_root")), ("BASELINE_OBJECT_STORE", True),
+                            ("BASELINE_HASH_ONLY", False), ("TESTCASE", "ERS"), ("CIMEROOT", get_cime_root()),
+                            ("COMP_INTERFACE", "mct")]:
+            case.set_value(item, value)
+        os.makedirs(case.get_value("RUNDIR"))
+        shutil.copy(os.path.join(self._inputs, "control.nc"),
+                    os.path.join(case.get_value("RUNDIR"), "case.cpl.hi.0001-01-01-00000.nc"))
+
+        other_root = os.path.join(self._root, "other_root")
+        baseline_dir = os.path.join(other_root, "master", "ERS.f19_g16.A.mach_gnu")
+        self.assertTrue(generate_baseline(case, baseline_dir=baseline_dir, staged=True)[0])
+        self.assertFalse(os.path.exists(get_object_store(case.get_value("BASELINE_ROOT"))))
+
+        object_path = get_object_path(os.path.join(baseline_dir, "cpl.hi.0001-01-01-00000.nc"),
+                                      read_baseline_manifest(baseline_dir))
+        self.assertTrue(object_path.startswith(get_object_store(other_root) + os.sep))
+        self.assertEqual(collect_garbage(other_root, min_age=0), [])
+        self.assertTrue(os.path.isfile(object_path))
+
+if __name__ == '__main__':
+    unittest.main()
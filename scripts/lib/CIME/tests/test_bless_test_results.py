@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME import test_status
+from CIME.bless_test_results import _scan_test
+
+class TestScanTest(unittest.TestCase):
+
+    _TESTNAME = "ERS.f19_g16.A.mach_gnu"
+
+    def setUp(self):
+        self._test_dir = os.path.join(tempfile.mkdtemp(), self._TESTNAME + ".G.20200101")
+        os.makedirs(self._test_dir)
+        self._ts = test_status.TestStatus(test_dir=self._test_dir, test_name=self._TESTNAME, no_io=True)
+        with self._ts:
+            for phase in test_status.CORE_PHASES:
+                self._ts.set_status(phase, test_status.TEST_PASS_STATUS)
+            self._ts.set_status(test_status.BASELINE_PHASE, test_status.TEST_FAIL_STATUS)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self._test_dir), ignore_errors=True)
+
+    def _write_env_test(self, baseline_root):
+        with open(os.path.join(self._test_dir, "env_test.xml"), "w") as fd:
+            fd.write('<?xml version="1.0"?>\n<file id="env_test.xml" version="2.0">\n  <group id="test">\n')
+            for name, value in [("BASELINE_NAME_CMP", "master"), ("BASELINE_ROOT", baseline_root)]:
+                fd.write('    <entry id="{}" value="{}">\n      <type>char</type>\n    </entry>\n'.format(name, value))
+            fd.write('  </group>\n</file>\n')
+
+    def _scan(self):
+        return _scan_test(os.path.join(self._test_dir, test_status.TEST_STATUS_FILENAME), self._ts,
+                          None, None, False, True, None, False)
+
+    def test_resolved(self):
+        """Baselines are found from the env files alone"""
+        self._write_env_test("/baselines")
+        scan = self._scan()
+        self.assertTrue(scan["hist_bless"])
+        self.assertFalse(scan["unresolved"])
+        self.assertEqual((scan["baseline_name"], scan["baseline_root"]), ("master", "/baselines"))
+
+    def test_unresolved(self):
+        """The case is left for the caller to open when the env files are not enough"""
+        self._write_env_test("$ENV{SCRATCH}/baselines")
+        scan = self._scan()
+        self.assertTrue(scan["unresolved"])
+        self.assertEqual(scan["baseline_name"], "master")
+
+if __name__ == '__main__':
+    unittest.main()
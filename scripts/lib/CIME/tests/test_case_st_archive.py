@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from CIME.case import case_st_archive
+from CIME.case.case_st_archive import _ArchiveFileMover, _archive_restarts_date_comp
+from CIME.date import date
+from CIME.rundir_index import RundirIndex
+from CIME.tests.case_fake import CaseFake
+
+class _CrossDeviceMover(_ArchiveFileMover):
+    """
+    Mover for which the destination directory is on another filesystem
+    """
+
+    def __init__(self, copy_only, destdir, nthreads=1):
+        _ArchiveFileMover.__init__(self, copy_only, nthreads=nthreads)
+        self._destdir = destdir
+
+    def _device(self, dirname):
+        device = _ArchiveFileMover._device(self, dirname)
+        return ~device if dirname == self._destdir else device
+
+class TestArchiveFileMover(unittest.TestCase):
+
+    def setUp(self):
+        self._srcdir = tempfile.mkdtemp()
+        self._destdir = tempfile.mkdtemp()
+        self._transfer_file = case_st_archive._transfer_file
+
+    def tearDown(self):
+        case_st_archive._transfer_file = self._transfer_file
+        shutil.rmtree(self._srcdir, ignore_errors=True)
+        shutil.rmtree(self._destdir, ignore_errors=True)
+
+    def _make_files(self, count):
+        files = []
+        for i in range(count):
+            filepath = os.path.join(self._srcdir, "case.cam.h0.{:04d}.nc".format(i))
+            with open(filepath, "w") as fd:
+                fd.write("data {:d}".format(i))
+            files.append(os.path.basename(filepath))
+        return files
+
+    def _src(self, name):
+        return os.path.join(self._srcdir, name)
+
+    def _dest(self, name):
+        return os.path.join(self._destdir, name)
+
+    def test_same_device_rename(self):
+        """A move within a filesystem is a rename done right away"""
+        name = self._make_files(1)[0]
+        mover = _ArchiveFileMover(copy_only=False, nthreads=4)
+        mover(self._src(name), self._dest(name))
+
+        self.assertFalse(os.path.exists(self._src(name)))
+        with open(self._dest(name)) as fd:
+            self.assertEqual(fd.read(), "data 0")
+        self.assertEqual(mover._pending, {})
+
+    def test_cross_device_queued(self):
+        """Moves across filesystems and copies wait for flush"""
+        moved, copied = self._make_files(2)
+        mover = _CrossDeviceMover(False, self._destdir, nthreads=2)
+        mover(self._src(moved), self._dest(moved))
+        mover.copy(self._src(copied), self._dest(copied))
+
+        self.assertEqual(os.listdir(self._destdir), [])
+        self.assertEqual(sum(len(transfers) for transfers in mover._pending.values()), 2)
+
+        mover.flush()
+        self.assertFalse(os.path.exists(self._src(moved)))
+        self.assertTrue(os.path.exists(self._src(copied)))
+        self.assertEqual(sorted(os.listdir(self._destdir)), sorted([moved, copied]))
+        with open(self._dest(copied)) as fd:
+            self.assertEqual(fd.read(), "data 1")
+        self.assertEqual(mover._pending, {})
+
+    def test_copy_only(self):
+        """With copy_only, even a move within a filesystem is a queued copy"""
+        name = self._make_files(1)[0]
+        mover = _ArchiveFileMover(copy_only=True)
+        mover(self._src(name), self._dest(name))
+        self.assertFalse(os.path.exists(self._dest(name)))
+
+        mover.flush()
+        self.assertTrue(os.path.exists(self._src(name)))
+        self.assertTrue(os.path.exists(self._dest(name)))
+
+    def test_flush_thread_limit(self):
+        """flush never runs more than DOUT_S_THREADS transfers at a time"""
+        nthreads = 3
+        lock = threading.Lock()
+        state = {"active" : 0, "max_active" : 0}
+        def transfer_file(transfer):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return self._transfer_file(transfer)
+
+        case_st_archive._transfer_file = transfer_file
+        names = self._make_files(4 * nthreads)
+        mover = case_st_archive._get_archive_file_fn(True, nthreads=nthreads)
+        for name in names:
+            mover(self._src(name), self._dest(name))
+        mover.flush()
+
+        self.assertEqual(state["max_active"], nthreads)
+        self.assertEqual(sorted(os.listdir(self._destdir)), sorted(names))
+
+    def test_worker_error(self):
+        """An error of a transfer is raised by flush, which drops the queue"""
+        names = self._make_files(3)
+        mover = _CrossDeviceMover(False, self._destdir, nthreads=2)
+        for name in names:
+            mover(self._src(name), self._dest(name))
+        os.remove(self._src(names[1]))
+
+        with self.assertRaises(OSError):
+            mover.flush()
+        self.assertEqual(mover._pending, {})
+
+        # nothing left to do
+        mover.flush()
+
+class _RestartArchive(object):
+    """
+    The parts of the archive spec used to archive restart files
+    """
+
+    def get_rest_file_extensions(self, _):
+        return ["restart"]
+
+    def get_rpointer_contents(self, _):
+        return []
+
+    def get_entry_value(self, _, __):
+        return "unset"
+
+class TestArchiveRestarts(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._case = CaseFake(os.path.join(self._tempdir, "case"))
+        self._case.set_value("DOUT_S_SAVE_INTERIM_RESTART_FILES", True)
+        self._rundir = self._case.get_value("RUNDIR")
+        os.makedirs(self._rundir)
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def test_nemo_interim_restarts(self):
+        """Restart files archived for a date are not archived again for the next one"""
+        names = ["case_00000480_restart_0000.nc", "case_00000480_restart_0001.nc"]
+        for name in names:
+            with open(os.path.join(self._rundir, name), "w") as fd:
+                fd.write(name)
+
+        rundir_index = RundirIndex(self._rundir, casename="case")
+        mover = _ArchiveFileMover(copy_only=False)
+        restdirs = []
+        for datename in (date(1, 1, 2), date(1, 1, 3)):
+            restdirs.append(os.path.join(self._tempdir, "rest", case_st_archive._datetime_str(datename)))
+            _archive_restarts_date_comp(self._case, "case", self._rundir, _RestartArchive(), None,
+                                        "ocn", "nemo", datename, False, None, restdirs[-1], mover,
+                                        testonly=True, rundir_index=rundir_index)
+        mover.flush()
+
+        self.assertEqual(sorted(os.listdir(restdirs[0])), names)
+        self.assertEqual(os.listdir(restdirs[1]), [])
+        self.assertEqual(os.listdir(self._rundir), [])
+        self.assertEqual(rundir_index.filenames, [])
+
+if __name__ == '__main__':
+    unittest.main()
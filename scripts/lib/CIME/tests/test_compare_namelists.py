@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import six
+
+from CIME import compare_namelists
+from CIME.compare_namelists import compare_namelist_file_pairs, is_namelist_file
+from CIME.utils import CIMEError
+
+_NAMELIST = """&nml1
+  val1 = 'foo'
+  case_name = 'ERS.f19_g16.A.C.{testid}'
+/
+&nml2
+  val2 = 1, 2, 3
+/
+"""
+
+class TestCompareNamelists(unittest.TestCase):
+
+    def setUp(self):
+        self._testdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._testdir, ignore_errors=True)
+
+    def _write(self, name, text):
+        path = os.path.join(self._testdir, name)
+        with open(path, "w") as fd:
+            fd.write(text)
+        return path
+
+    def test_file_pairs(self):
+        """Results match per-file comparison, with testids normalized and diffs reported"""
+        gold = self._write("gold", _NAMELIST.format(testid="0101"))
+        same = self._write("same", _NAMELIST.format(testid="0202"))
+        diff = self._write("diff", _NAMELIST.format(testid="0303").replace("1, 2, 3", "1, 2"))
+
+        results = compare_namelist_file_pairs([(gold, same), (gold, diff), (gold, gold, None)],
+                                              case="ERS.f19_g16.A")
+        self.assertEqual(results[0], (True, ""))
+        self.assertEqual(results[1], (False, "  list variable 'val2' missing value 3\n"))
+        self.assertEqual(results[2], (True, ""))
+
+    def test_content_parsed_once(self):
+        """Files with the same content share one parse, errors name the right file"""
+        first = self._write("first", _NAMELIST.format(testid="0101"))
+        second = self._write("second", _NAMELIST.format(testid="0101"))
+        compare_namelist_file_pairs([(first, second)])
+        self.assertIs(compare_namelists._read_namelist_file(first),
+                      compare_namelists._read_namelist_file(second))
+
+        bad1 = self._write("bad1", "&nml\n  val = 'one',\n/\n")
+        bad2 = self._write("bad2", "&nml\n  val = 'one',\n/\n")
+        six.assertRaisesRegex(self, CIMEError, "bad1", compare_namelists._read_namelist_file, bad1)
+        six.assertRaisesRegex(self, CIMEError, "bad2", compare_namelists._read_namelist_file, bad2)
+        self.assertFalse(is_namelist_file(self._write("notnml", "hello\n")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME import cpl_log
+
+_LOG = """(seq_mct_drv): model initialization complete
+memory_write: model date =   00010102       0 memory =    1000.00 MB (highwater)      900.00 MB (usage)  (pe=    0 comps= cpl)
+memory_write: model date =   00010103       0 memory =    1100.00 MB (highwater)      950.00 MB (usage)  (pe=    0 comps= cpl)
+(seq_mct_drv): ===============      SUCCESSFUL TERMINATION OF CPL7-e3sm ===============
+(cime_final) # simulated years / cmp-day =      {sypd}
+"""
+
+class TestCplLog(unittest.TestCase):
+
+    def setUp(self):
+        self._rundir = tempfile.mkdtemp()
+        self._cpllog = os.path.join(self._rundir, "cpl.log.1234.gz")
+        self._write_log("12.345")
+
+    def tearDown(self):
+        cpl_log._SUMMARIES.clear()
+        shutil.rmtree(self._rundir, ignore_errors=True)
+
+    def _write_log(self, sypd):
+        with gzip.open(self._cpllog, "wb") as fd:
+            fd.write(_LOG.format(sypd=sypd).encode("utf-8"))
+
+    def test_summary(self):
+        """Memory series, throughput and termination are read from a gzipped log"""
+        summary = cpl_log.get_cpl_log_summary(self._cpllog)
+        self.assertEqual(summary["memory"], [[10102.0, 1000.0], [10103.0, 1100.0]])
+        self.assertEqual(summary["throughput"], 12.345)
+        self.assertTrue(summary["successful"])
+        self.assertTrue(os.path.isfile(cpl_log.get_cpl_log_summary_path(self._cpllog)))
+
+    def test_sidecar(self):
+        """The sidecar is used while the log is unchanged and ignored once it changes"""
+        cpl_log.get_cpl_log_summary(self._cpllog)
+        cpl_log._SUMMARIES.clear()
+
+        # Same size and mtime, but not a gzip file: only the sidecar can be read
+        st = os.stat(self._cpllog)
+        with open(self._cpllog, "r+b") as fd:
+            fd.write(b"x" * st.st_size)
+        os.utime(self._cpllog, (st.st_atime, st.st_mtime))
+        self.assertEqual(cpl_log.get_cpl_log_summary(self._cpllog)["throughput"], 12.345)
+
+        self._write_log("1.5")
+        os.utime(self._cpllog, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(cpl_log.get_cpl_log_summary(self._cpllog)["throughput"], 1.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from six.moves import BaseHTTPServer, SimpleHTTPServer, socketserver
+
+from CIME.Servers.download_manager import DownloadManager, PARTIAL_SUFFIX
+from CIME.Servers.http_session import HTTPSession
+
+class RangeRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """Serves files with keep-alive and single byte-range requests, counting connections"""
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    ranges = []
+    root = None
+
+    def translate_path(self, path):
+        return os.path.join(self.root, path.split("?")[0].lstrip("/"))
+
+    def setup(self):
+        SimpleHTTPServer.SimpleHTTPRequestHandler.setup(self)
+        RangeRequestHandler.connections.add(self.client_address)
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        byte_range = self.headers.get("Range")
+        if not byte_range or not os.path.isfile(path):
+            SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+            return
+
+        RangeRequestHandler.ranges.append(byte_range)
+
+        with open(path, "rb") as fd:
+            data = fd.read()
+        start = int(byte_range.split("=")[1].rstrip("-"))
+        if start >= len(data):
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class TestDownloadManager(unittest.TestCase):
+
+    def setUp(self):
+        self._serverdir = tempfile.mkdtemp()
+        self._destdir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self._serverdir, "inputdata", "atm"))
+        self._files = {}
+        for i in range(8):
+            rel_path = "atm/file{:d}.nc".format(i)
+            self._files[rel_path] = os.urandom(1000 + i)
+            with open(os.path.join(self._serverdir, "inputdata", rel_path), "wb") as fd:
+                fd.write(self._files[rel_path])
+
+        RangeRequestHandler.root = self._serverdir
+        RangeRequestHandler.connections = set()
+        RangeRequestHandler.ranges = []
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._address = "http://127.0.0.1:{:d}/inputdata".format(self._httpd.server_address[1])
+
+    def tearDown(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        shutil.rmtree(self._serverdir, ignore_errors=True)
+        shutil.rmtree(self._destdir, ignore_errors=True)
+
+    def _dest(self, rel_path):
+        return os.path.join(self._destdir, rel_path)
+
+    def _check_file(self, rel_path):
+        with open(self._dest(rel_path), "rb") as fd:
+            self.assertEqual(fd.read(), self._files[rel_path])
+
+    def test_download(self):
+        """All files are downloaded, duplicates once, over a bounded number of connections"""
+        downloads = DownloadManager(HTTPSession(self._address), nthreads=2)
+        for rel_path in sorted(self._files):
+            self.assertTrue(downloads.add(rel_path, self._dest(rel_path)))
+        self.assertFalse(downloads.add("atm/file0.nc", self._dest("atm/file0.nc")))
+        self.assertEqual(len(downloads), len(self._files))
+
+        results = downloads.download()
+        self.assertEqual(results, dict((self._dest(rel_path), True) for rel_path in self._files))
+        for rel_path in self._files:
+            self._check_file(rel_path)
+            self.assertFalse(os.path.exists(self._dest(rel_path) + PARTIAL_SUFFIX))
+        self.assertLessEqual(len(RangeRequestHandler.connections), 2)
+
+    def test_missing_file(self):
+        """Files the server does not have fail without leaving anything behind"""
+        downloads = DownloadManager(HTTPSession(self._address))
+        downloads.add("atm/missing.nc", self._dest("atm/missing.nc"))
+        downloads.add("atm/file1.nc", self._dest("atm/file1.nc"))
+        results = downloads.download()
+        self.assertFalse(results[self._dest("atm/missing.nc")])
+        self.assertTrue(results[self._dest("atm/file1.nc")])
+        self.assertFalse(os.path.exists(self._dest("atm/missing.nc")))
+        self.assertFalse(os.path.exists(self._dest("atm/missing.nc") + PARTIAL_SUFFIX))
+
+    def test_resume(self):
+        """A partial download is continued rather than started over"""
+        rel_path = "atm/file3.nc"
+        os.makedirs(os.path.dirname(self._dest(rel_path)))
+        with open(self._dest(rel_path) + PARTIAL_SUFFIX, "wb") as fd:
+            fd.write(self._files[rel_path][:500])
+
+        downloads = DownloadManager(HTTPSession(self._address))
+        downloads.add(rel_path, self._dest(rel_path))
+        self.assertEqual(downloads.download(), {self._dest(rel_path) : True})
+        self.assertEqual(RangeRequestHandler.ranges, ["bytes=500-"])
+        self._check_file(rel_path)
+
+    def test_downloaded_elsewhere(self):
+        """Files another process downloaded in the meantime are not fetched again"""
+        rel_path = "atm/file4.nc"
+        os.makedirs(os.path.dirname(self._dest(rel_path)))
+        with open(self._dest(rel_path), "wb") as fd:
+            fd.write(self._files[rel_path])
+
+        downloads = DownloadManager(HTTPSession(self._address))
+        downloads.add(rel_path, self._dest(rel_path))
+        self.assertEqual(downloads.download(), {self._dest(rel_path) : True})
+        self.assertEqual(RangeRequestHandler.connections, set())
+        self.assertFalse(os.path.exists(self._dest(rel_path) + PARTIAL_SUFFIX))
+
+if __name__ == '__main__':
+    unittest.main()
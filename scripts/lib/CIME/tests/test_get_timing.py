@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME import get_timing
+from CIME.tests.case_fake import CaseFake
+
+_COMPS = ["CPL", "ATM", "LND", "ICE", "OCN", "ROF", "GLC"]
+
+_TIMERS = {"CPL:CLOCK_ADVANCE" : 48, "CPL:INIT" : 1, "CPL:RUN_LOOP" : 48, "CPL:RUN" : 48,
+           "CPL:ATM_RUN" : 48, "CPL:OCN_RUN" : 24, "CPL:COMM" : 48, "CPL:TPROF_WRITE" : 1,
+           "CPL:FINAL" : 1}
+
+class _TimingCaseFake(CaseFake):
+
+    num_nodes = 1
+
+    def get_values(self, item):
+        assert item == "COMP_CLASSES"
+        return _COMPS
+
+class TestGetTiming(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp()
+        self._case = _TimingCaseFake(os.path.join(self._root, "case"))
+        for item, value in [("COMP_INTERFACE", "mct"), ("MODEL", "e3sm"), ("NCPL_BASE_PERIOD", "day"),
+                            ("STOP_OPTION", "ndays"), ("STOP_N", 1), ("COST_PES", 0),
+                            ("TOTALPES", 4), ("MAX_MPITASKS_PER_NODE", 4), ("MAX_TASKS_PER_NODE", 4)]:
+            self._case.set_value(item, value)
+        for comp in _COMPS:
+            self._case.set_value("{}_NCPL".format(comp), 24 if comp == "OCN" else 48)
+            for key, value in [("NTASKS", 4), ("ROOTPE", 0), ("PSTRID", 1), ("NTHRDS", 1),
+                               ("NINST", 1), ("COMP", comp.lower())]:
+                self._case.set_value("{}_{}".format(key, comp), value)
+
+        os.makedirs(os.path.join(self._case.get_value("RUNDIR"), "timing"))
+        self._write_timing_stats()
+
+    def _write_timing_stats(self, slowdowns=None):
+        slowdowns = {} if slowdowns is None else slowdowns
+        with open(os.path.join(self._case.get_value("RUNDIR"), "timing", "model_timing_stats"), "w") as fd:
+            fd.write("name   on  processes  threads   count   walltotal   wallmax (proc thrd)   wallmin (proc thrd)\n")
+            for i, (name, count) in enumerate(sorted(_TIMERS.items())):
+                slowdown = slowdowns.get(name, 1.0)
+                fd.write('"{}"   -   4   4 {:e} {:e} {:9.3f} (  1  0) {:9.3f} (  0  0)\n'.
+                         format(name, count * 4, 40.0 + i, (10.0 + i) * slowdown, (9.0 + i) * slowdown))
+
+    def _get_report(self, lid):
+        cwd = os.getcwd()
+        try:
+            get_timing.get_timing(self._case, lid)
+        finally:
+            os.chdir(cwd)
+
+        with open(os.path.join(self._case.get_value("CASEROOT"), "timing",
+                               "e3sm_timing.case.{}.json".format(lid))) as fd:
+            return json.load(fd)
+
+    def tearDown(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def test_parse_timing_file(self):
+        """Every timer of the file is indexed by name"""
+        timers = get_timing.parse_timing_file(os.path.join(self._case.get_value("RUNDIR"), "timing",
+                                                           "model_timing_stats"), "mct")
+        self.assertEqual(sorted(timers), sorted(_TIMERS))
+        self.assertEqual(timers["CPL:CLOCK_ADVANCE"], {"nprocs" : 4, "ncount" : 192, "tmin" : 10.0, "tmax" : 11.0})
+
+    def test_json_report(self):
+        """The json report matches the text report"""
+        cwd = os.getcwd()
+        try:
+            get_timing.get_timing(self._case, "1-1")
+        finally:
+            os.chdir(cwd)
+
+        report_path = os.path.join(self._case.get_value("CASEROOT"), "timing", "e3sm_timing.case.1-1")
+        with open(report_path) as fd:
+            text = fd.read()
+        with open(report_path + ".json") as fd:
+            report = json.load(fd)
+
+        self.assertEqual(report["run_length_days"], 1)
+        self.assertEqual(report["components"]["ATM"]["tmax"], 10.0)
+        self.assertEqual(report["timers"]["CPL:RUN_LOOP"]["tmax"], 17.0)
+        self.assertIn("Model Throughput:   {:10.2f}".format(report["model_throughput"]), text)
+        self.assertIn("Run Time    :  {:10.3f}".format(report["run_time"]), text)
+
+    def test_compare_timing_reports(self):
+        """The slower component and its timers are reported, largest increase first"""
+        baseline = self._get_report("1-1")
+        self._write_timing_stats({"CPL:OCN_RUN" : 1.5, "CPL:INIT" : 2.0})
+        current = self._get_report("2-2")
+
+        self.assertEqual(get_timing.compare_timing_reports(baseline, baseline, 0.1), (True, []))
+        success, regressions = get_timing.compare_timing_reports(current, baseline, 0.1)
+        self.assertFalse(success)
+        self.assertEqual(regressions, ["CPL:INIT 14.000 -> 28.000 s/day (+100.0%)",
+                                       "OCN 15.652 -> 23.478 s/day (+50.0%)",
+                                       "CPL:OCN_RUN 15.000 -> 22.500 s/day (+50.0%)"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.hist_hash import get_var_hashes, get_manifest_entry, lookup_var_hashes, is_hash_only, \
+    read_baseline_manifest, write_baseline_manifest, BASELINE_MANIFEST_NAME
+from CIME.utils import get_cime_root
+
+class TestHistHash(unittest.TestCase):
+    """Tests of the per-variable history file hashes, using the cprnc test inputs"""
+
+    def setUp(self):
+        self._inputs = os.path.join(get_cime_root(), "tools", "cprnc", "test_inputs")
+        self._tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _input(self, filename):
+        return os.path.join(self._inputs, filename)
+
+    def test_identical_files(self):
+        """Copies of a file have identical, non-empty hashes"""
+        control = get_var_hashes(self._input("control.nc"))
+        self.assertTrue(control)
+        self.assertEqual(control, get_var_hashes(self._input("copy.nc")))
+
+    def test_global_attributes_ignored(self):
+        """Differences in global attributes alone do not change the hashes"""
+        self.assertEqual(get_var_hashes(self._input("control_attributes.nc")),
+                         get_var_hashes(self._input("diffs_in_attribute.nc")))
+
+    def test_value_differences(self):
+        """Differences in values change the hash of the affected variable only"""
+        control = get_var_hashes(self._input("control.nc"))
+        diffs = get_var_hashes(self._input("diffs_in_vals.nc"))
+        self.assertEqual(set(control), set(diffs))
+        self.assertEqual(len([var for var in control if control[var] != diffs[var]]), 1)
+
+    def test_record_variables(self):
+        """Files with several record variables are hashed per record"""
+        control = get_var_hashes(self._input("control_multipleTimes_someTimeless.nc"))
+        diffs = get_var_hashes(self._input("multipleTimes_someTimeless_diffs_in_vals_and_fill.nc"))
+        self.assertEqual(set(control), set(diffs))
+        self.assertNotEqual(control, diffs)
+
+    def test_field_list_differences(self):
+        """Extra variables show up as extra hash entries"""
+        control = get_var_hashes(self._input("control.nc"))
+        extra = get_var_hashes(self._input("extra_variables.nc"))
+        self.assertTrue(set(control) < set(extra))
+
+    def test_unreadable_file(self):
+        """Files that are not classic netcdf give None"""
+        self.assertIsNone(get_var_hashes(self._input("README")))
+        self.assertIsNone(get_var_hashes(os.path.join(self._tempdir, "does_not_exist.nc")))
+
+    def test_manifest_entry(self):
+        """Manifest entries hold the file checksum, variable hashes and summary statistics"""
+        entry = get_manifest_entry(self._input("control.nc"))
+        self.assertEqual(entry["vars"], get_var_hashes(self._input("control.nc")))
+        self.assertEqual(entry["size"], os.path.getsize(self._input("control.nc")))
+        self.assertEqual(set(entry["stats"]["vars"]), set(entry["vars"]))
+        self.assertEqual(len(entry["md5"]), 32)
+        self.assertNotEqual(entry["md5"], get_manifest_entry(self._input("diffs_in_vals.nc"))["md5"])
+        self.assertIsNone(get_manifest_entry(self._input("README")))
+
+    def test_stored_hashes(self):
+        """Stored hashes are used while valid and ignored once the file changes"""
+        baseline = os.path.join(self._tempdir, "control.nc")
+        shutil.copy(self._input("control.nc"), baseline)
+        write_baseline_manifest(self._tempdir, {"control.nc" : get_manifest_entry(baseline)})
+        self.assertTrue(os.path.exists(os.path.join(self._tempdir, BASELINE_MANIFEST_NAME)))
+
+        manifest = read_baseline_manifest(self._tempdir)
+        self.assertFalse(is_hash_only(manifest, "control.nc"))
+        manifest["control.nc"]["vars"] = {"fake" : "hash"}
+        self.assertEqual(lookup_var_hashes(baseline, manifest), {"fake" : "hash"})
+
+        shutil.copy(self._input("diffs_in_vals.nc"), baseline)
+        os.utime(baseline, (0, 0))
+        self.assertEqual(lookup_var_hashes(baseline, manifest),
+                         get_var_hashes(self._input("diffs_in_vals.nc")))
+
+    def test_hash_only(self):
+        """Hash-only entries are used without the file being present"""
+        manifest = {"control.nc" : get_manifest_entry(self._input("control.nc"), hash_only=True)}
+        self.assertTrue(is_hash_only(manifest, "control.nc"))
+        self.assertNotIn("mtime", manifest["control.nc"])
+        self.assertEqual(lookup_var_hashes(os.path.join(self._tempdir, "control.nc"), manifest),
+                         get_var_hashes(self._input("control.nc")))
+
+if __name__ == '__main__':
+    unittest.main()
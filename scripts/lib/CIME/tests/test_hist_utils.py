@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME import hist_utils
+from CIME.baseline_store import clone_file
+
+class TestStagedBaseline(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp()
+        self._baseline_dir = os.path.join(self._root, "master", "ERS.f19_g16.A.mach_gnu")
+        os.makedirs(os.path.join(self._baseline_dir, "sub"))
+        for name, text in [("cpl.hi.nc", "hist"), ("cpl.log.gz", "log"), (hist_utils.BLESS_LOG_NAME, "sha:1\n"),
+                           (os.path.join("sub", "atm.h0.nc"), "atm")]:
+            with open(os.path.join(self._baseline_dir, name), "w") as fd:
+                fd.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def _read(self, name, baseline_dir=None):
+        with open(os.path.join(self._baseline_dir if baseline_dir is None else baseline_dir, name)) as fd:
+            return fd.read()
+
+    def test_stage_and_swap(self):
+        """History files are staged as hard links, other files as copies, the swap leaves nothing behind"""
+        staging_dir = hist_utils._stage_baseline_dir(self._baseline_dir)
+        for name in ["cpl.hi.nc", os.path.join("sub", "atm.h0.nc")]:
+            self.assertTrue(os.path.samefile(os.path.join(staging_dir, name), os.path.join(self._baseline_dir, name)))
+        self.assertFalse(os.path.samefile(os.path.join(staging_dir, "cpl.log.gz"),
+                                          os.path.join(self._baseline_dir, "cpl.log.gz")))
+
+        with open(os.path.join(staging_dir, hist_utils.BLESS_LOG_NAME), "a") as fd:
+            fd.write("sha:2\n")
+        os.remove(os.path.join(staging_dir, "cpl.hi.nc"))
+        clone_file(os.path.join(self._baseline_dir, "cpl.log.gz"), os.path.join(staging_dir, "cpl.hi.nc"))
+        self.assertEqual(self._read(hist_utils.BLESS_LOG_NAME), "sha:1\n")
+
+        hist_utils._swap_baseline_dir(staging_dir, self._baseline_dir)
+        self.assertEqual(self._read(hist_utils.BLESS_LOG_NAME), "sha:1\nsha:2\n")
+        self.assertEqual(self._read("cpl.hi.nc"), "log")
+        self.assertEqual(self._read(os.path.join("sub", "atm.h0.nc")), "atm")
+        self.assertEqual(os.listdir(os.path.dirname(self._baseline_dir)), [os.path.basename(self._baseline_dir)])
+
+    def test_new_baseline(self):
+        """A baseline that does not exist yet is staged empty"""
+        baseline_dir = os.path.join(self._root, "next", "SMS.f19_g16.A.mach_gnu")
+        staging_dir = hist_utils._stage_baseline_dir(baseline_dir)
+        self.assertEqual(os.listdir(staging_dir), [])
+        hist_utils._swap_baseline_dir(staging_dir, baseline_dir)
+        self.assertTrue(os.path.isdir(baseline_dir))
+
+    def test_interrupted_swap(self):
+        """A baseline moved away by an interrupted swap is restored before the next update"""
+        backup_dir = self._baseline_dir + ".bless-old.1234"
+        os.rename(self._baseline_dir, backup_dir)
+        staging_dir = hist_utils._stage_baseline_dir(self._baseline_dir)
+        self.assertFalse(os.path.exists(backup_dir))
+        self.assertEqual(self._read("cpl.hi.nc", staging_dir), "hist")
+        self.assertEqual(self._read("cpl.hi.nc"), "hist")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.inputdata_index import InputdataIndex, INPUTDATA_INDEX_NAME
+
+class TestInputdataIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self._root, "atm"))
+        self._file = os.path.join(self._root, "atm", "file.nc")
+        with open(self._file, "w") as fd:
+            fd.write("data")
+
+    def tearDown(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def test_chksums(self):
+        """Recorded checksums are shared through the database in the inputdata root"""
+        index = InputdataIndex(self._root)
+        self.assertIsNone(index.get_chksum(self._file))
+        index.set_chksums([(self._file, os.stat(self._file), "abc")])
+        index.close()
+        self.assertTrue(os.path.isfile(os.path.join(self._root, INPUTDATA_INDEX_NAME)))
+
+        index = InputdataIndex(self._root)
+        self.assertEqual(index.get_chksum(self._file), "abc")
+        # the same file reached through another path
+        self.assertEqual(index.get_chksum(os.path.join(self._root, "atm", "..", "atm", "file.nc")), "abc")
+        index.close()
+
+    def test_changed_file(self):
+        """Checksums of files that changed since they were recorded are not returned"""
+        index = InputdataIndex(self._root)
+        index.set_chksums([(self._file, os.stat(self._file), "abc")])
+        with open(self._file, "a") as fd:
+            fd.write("more data")
+        self.assertIsNone(index.get_chksum(self._file))
+        self.assertIsNone(index.get_chksum(os.path.join(self._root, "missing.nc")))
+        index.close()
+
+    def test_exists(self):
+        """Recorded files are trusted until their record is older than max_age"""
+        index = InputdataIndex(self._root)
+        self.assertTrue(index.exists(self._file))
+        self.assertTrue(index.exists(os.path.join(self._root, "atm") + os.sep))
+        self.assertFalse(index.exists(os.path.join(self._root, "atm", "missing.nc")))
+        index.close()
+
+        os.remove(self._file)
+        index = InputdataIndex(self._root)
+        self.assertTrue(index.exists(self._file))
+        index.close()
+
+        index = InputdataIndex(self._root, max_age=0)
+        self.assertFalse(index.exists(self._file))
+        index.close()
+        index = InputdataIndex(self._root)
+        self.assertFalse(index.exists(self._file))
+        index.close()
+
+    def test_add_files(self):
+        """Added files are recorded without being looked up again"""
+        other = os.path.join(self._root, "atm", "other.nc")
+        with open(other, "w") as fd:
+            fd.write("data")
+        index = InputdataIndex(self._root)
+        index.add_files([other, "/outside/root.nc"])
+        index.close()
+        os.remove(other)
+        self.assertTrue(InputdataIndex(self._root).exists(other))
+
+    def test_unwritable_root(self):
+        """An inputdata root without a usable database behaves as an empty index"""
+        index = InputdataIndex(os.path.join(self._root, "does_not_exist"))
+        index.set_chksums([(self._file, os.stat(self._file), "abc")])
+        self.assertIsNone(index.get_chksum(self._file))
+        self.assertTrue(index.exists(self._file))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.nmlgen import NamelistGenerator
+
+class TestInputDataList(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._data_list = os.path.join(self._tempdir, "datm.input_data_list")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _lines(self):
+        with open(self._data_list) as fd:
+            return fd.read().splitlines()
+
+    def test_duplicates(self):
+        """Lines already in the list, from any call, are not added again"""
+        NamelistGenerator._add_input_data_lines(self._data_list, ["file1 = /a.nc", "file2 = /b.nc", "file1 = /a.nc"])
+        NamelistGenerator._add_input_data_lines(self._data_list, ["file2 = /b.nc", "file3 = /c.nc"])
+        self.assertEqual(self._lines(), ["file1 = /a.nc", "file2 = /b.nc", "file3 = /c.nc"])
+
+    def test_removed(self):
+        """A list removed between calls is started over"""
+        NamelistGenerator._add_input_data_lines(self._data_list, ["file1 = /a.nc"])
+        os.remove(self._data_list)
+        NamelistGenerator._add_input_data_lines(self._data_list, ["file1 = /a.nc"])
+        self.assertEqual(self._lines(), ["file1 = /a.nc"])
+
+    def test_other_writer(self):
+        """Lines added to the list by something else are not added again"""
+        NamelistGenerator._add_input_data_lines(self._data_list, ["file1 = /a.nc"])
+        with open(self._data_list, "a") as fd:
+            fd.write("ncdata = /init.nc\n")
+        NamelistGenerator._add_input_data_lines(self._data_list, ["ncdata = /init.nc", "file2 = /b.nc"])
+        self.assertEqual(self._lines(), ["file1 = /a.nc", "ncdata = /init.nc", "file2 = /b.nc"])
+
+if __name__ == '__main__':
+    unittest.main()
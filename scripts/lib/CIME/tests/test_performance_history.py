@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.performance_history import PerformanceHistory, find_regressions, get_performance_records_dir, \
+    save_performance_record
+from CIME.tests.case_fake import CaseFake
+
+def _make_report(lid, throughput, ocn_time, instance=0):
+    components = {}
+    for name, rootpe in [("CPL", 0), ("ATM", 0), ("OCN", 64)]:
+        components[name] = {"comp" : name.lower(), "ntasks" : 64, "nthrds" : 1, "rootpe" : rootpe,
+                            "pstrid" : 1, "ninst" : 1, "tmin" : 1.0,
+                            "tmax" : ocn_time if name == "OCN" else 10.0}
+    return {"case" : "mycase", "lid" : lid, "instance" : instance, "driver" : "mct",
+            "compset" : "A", "grid" : "f19_g16", "total_pes" : 128, "run_length_days" : 5,
+            "model_throughput" : throughput, "model_cost" : 100.0 / throughput,
+            "init_time" : 30.0, "run_time" : 60.0, "final_time" : 0.5, "components" : components,
+            "timers" : {"CPL:RUN_LOOP" : {"nprocs" : 128, "ncount" : 240, "tmin" : 59.0, "tmax" : 60.0},
+                        "CPL:UNUSED" : {"nprocs" : 128, "ncount" : 1, "tmin" : None, "tmax" : None}}}
+
+class TestPerformanceHistory(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp()
+        self._db = os.path.join(self._root, "performance_history.db")
+
+    def tearDown(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def test_history(self):
+        """Samples of the throughput, of a component and of a timer are returned oldest first"""
+        history = PerformanceHistory(self._db)
+        for i, (throughput, ocn_time) in enumerate([(10.0, 20.0), (10.5, 21.0), (9.8, 20.0), (10.1, 30.0), (7.0, 20.0)]):
+            history.add_run(_make_report("lid{:d}".format(i), throughput, ocn_time), machine="mach",
+                            compiler="gnu", mpilib="mpich", commit_hash="v{:d}".format(i), recorded=1000 + i)
+        history.close()
+
+        history = PerformanceHistory(self._db)
+        samples = history.get_history(machine="mach", compset="A")
+        self.assertEqual([sample["value"] for sample in samples], [10.0, 10.5, 9.8, 10.1, 7.0])
+        self.assertEqual(samples[0]["pe_layout"], "ATM:64x1@0,CPL:64x1@0,OCN:64x1@64")
+        self.assertEqual([sample["lid"] for sample in history.get_history(since=1003)], ["lid3", "lid4"])
+        self.assertEqual(history.get_history(grid="other"), [])
+
+        ocn = history.get_history(component="OCN")
+        self.assertEqual([sample["value"] for sample in ocn], [20.0, 21.0, 20.0, 30.0, 20.0])
+        self.assertEqual(len(history.get_history(timer="CPL:RUN_LOOP")), 5)
+        self.assertEqual(history.get_history(timer="CPL:UNUSED"), [])
+
+        regressions = find_regressions(samples)
+        self.assertEqual([(sample["commit_hash"], median) for sample, median, _ in regressions], [("v4", 10.05)])
+        regressions = find_regressions(ocn, higher_is_better=False)
+        self.assertEqual([sample["commit_hash"] for sample, _, _ in regressions], ["v3"])
+
+        # Recording a run again replaces it
+        history.add_run(_make_report("lid4", 10.2, 20.0), machine="mach", compiler="gnu", mpilib="mpich",
+                        commit_hash="v4", recorded=1004)
+        self.assertEqual([sample["value"] for sample in history.get_history()], [10.0, 10.5, 9.8, 10.1, 10.2])
+        self.assertEqual(len(history.get_history(component="OCN")), 5)
+        history.close()
+
+    def test_performance_records(self):
+        """Each run saves its own record of all its instances, indexed offline once"""
+        case = CaseFake(os.path.join(self._root, "case"))
+        for item, value in [("MODEL", "e3sm"), ("MACH", "mach"), ("COMPILER", "gnu"), ("MPILIB", "mpich"),
+                            ("CIMEROOT", self._root)]:
+            case.set_value(item, value)
+        os.makedirs(case.get_value("EXEROOT"))
+        with open(os.path.join(case.get_value("EXEROOT"), "GIT_DESCRIBE"), "w") as fd:
+            fd.write("v1.0-10-gabcdef\n")
+
+        timing_dir = os.path.join(case.get_value("CASEROOT"), "timing")
+        os.makedirs(timing_dir)
+        for instance in [1, 2]:
+            with open(os.path.join(timing_dir, "e3sm_timing_{:04d}.case.1-1.json".format(instance)), "w") as fd:
+                json.dump(_make_report("1-1", 10.0 + instance, 20.0, instance=instance), fd)
+
+        save_timing_dir = os.path.join(self._root, "timings")
+        record_path = save_performance_record(case, "1-1", save_timing_dir)
+        self.assertIsNone(save_performance_record(case, "2-2", save_timing_dir))
+        self.assertEqual(os.path.basename(record_path), "case.1-1.jsonl")
+
+        records_dir = get_performance_records_dir(save_timing_dir)
+        history = PerformanceHistory(self._db)
+        self.assertEqual(history.add_records(records_dir), 1)
+        self.assertEqual(history.add_records(records_dir), 0)
+        samples = history.get_history(commit_hash="v1.0-10-gabcdef")
+        self.assertEqual([(sample["instance"], sample["value"]) for sample in samples], [(1, 11.0), (2, 12.0)])
+        history.close()
+
+        # A saved again run replaces its record in the index
+        save_performance_record(case, "1-1", save_timing_dir)
+        os.utime(record_path, (0, 0))
+        history = PerformanceHistory(self._db)
+        self.assertEqual(history.add_records(records_dir), 1)
+        self.assertEqual(len(history.get_history()), 2)
+        history.close()
+
+if __name__ == '__main__':
+    unittest.main()
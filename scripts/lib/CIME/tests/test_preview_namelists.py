@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.dummy import Pool as ThreadPool
+
+from CIME.case.preview_namelists import _run_buildnmls_concurrently
+from CIME.tests.case_fake import CaseFake
+
+class EnvFileFake(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.needsrewrite = False
+
+class BuildnmlCaseFake(CaseFake):
+    """A CaseFake with the env file handling create_namelists uses"""
+    def __init__(self, case_root):
+        super(BuildnmlCaseFake, self).__init__(case_root)
+        env_file = os.path.join(case_root, "env_run.xml")
+        with open(env_file, "w") as fd:
+            fd.write("<file/>\n")
+        self._files = [EnvFileFake(env_file)]
+        self.nreads = 0
+
+    def flush(self):
+        pass
+
+    def read_xml(self):
+        self.nreads += 1
+
+BUILDNML = """
+import os
+def buildnml(case, caseroot, compname):
+    print("generating {{}} namelist".format(compname))
+    {body}
+    with open(os.path.join(caseroot, compname + "_in"), "w") as fd:
+        fd.write(str(os.getpid()))
+"""
+
+class TestConcurrentBuildnml(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._caseroot = os.path.join(self._tempdir, "case")
+        self._case = BuildnmlCaseFake(self._caseroot)
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def _buildnml(self, compname, body="pass"):
+        path = os.path.join(self._tempdir, "buildnml.{}".format(compname))
+        with open(path, "w") as fd:
+            fd.write(BUILDNML.format(body=body))
+        return (compname[:3], compname, path)
+
+    def _pids(self, compnames):
+        pids = []
+        for compname in compnames:
+            with open(os.path.join(self._caseroot, compname + "_in")) as fd:
+                pids.append(int(fd.read()))
+        return pids
+
+    def test_concurrent(self):
+        """Every buildnml runs in a process of its own"""
+        buildnmls = [self._buildnml(compname) for compname in ("datm", "dlnd", "docn")]
+        self.assertEqual(_run_buildnmls_concurrently(self._case, self._caseroot, buildnmls, nprocs=2), [])
+        pids = self._pids(("datm", "dlnd", "docn"))
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual(self._case.nreads, 0)
+
+    def test_concurrent_cases(self):
+        """Buildnmls of cases run at the same time each get their own case"""
+        other_caseroot = os.path.join(self._tempdir, "other")
+        other_case = BuildnmlCaseFake(other_caseroot)
+        body = "assert case.get_value('CASEROOT') == caseroot"
+        buildnmls = [self._buildnml(compname, body) for compname in ("datm", "dlnd", "docn", "dice")]
+
+        pool = ThreadPool(2)
+        try:
+            results = pool.map(lambda case: _run_buildnmls_concurrently(case, case.get_value("CASEROOT"),
+                                                                       buildnmls, nprocs=2),
+                               [self._case, other_case])
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual(results, [[], []])
+        self.assertEqual(len(self._pids(("datm", "dlnd", "docn", "dice"))), 4)
+
+    def test_serial(self):
+        """A single buildnml is not worth a process"""
+        buildnmls = [self._buildnml("datm")]
+        self.assertEqual(_run_buildnmls_concurrently(self._case, self._caseroot, buildnmls), buildnmls)
+        self.assertFalse(os.path.exists(os.path.join(self._caseroot, "datm_in")))
+
+    def test_failure(self):
+        """Only a failing buildnml is run again serially"""
+        buildnmls = [self._buildnml("datm"), self._buildnml("dlnd", "raise ValueError('bad')"),
+                     self._buildnml("docn")]
+        self.assertEqual(_run_buildnmls_concurrently(self._case, self._caseroot, buildnmls, nprocs=2),
+                         [buildnmls[1]])
+        self.assertEqual(self._case.nreads, 1)
+
+    def test_case_changed(self):
+        """Only a buildnml changing the case is run again serially"""
+        buildnmls = [self._buildnml("datm"),
+                     self._buildnml("dlnd", "case._files[0].needsrewrite = True"),
+                     self._buildnml("docn")]
+        self.assertEqual(_run_buildnmls_concurrently(self._case, self._caseroot, buildnmls, nprocs=2),
+                         [buildnmls[1]])
+        self.assertFalse(self._case._files[0].needsrewrite)
+        self.assertEqual(self._case.nreads, 1)
+
+    def test_env_file_written(self):
+        """A buildnml writing an env file is run again serially"""
+        body = "os.utime(case._files[0].filename, (0, 0))"
+        buildnmls = [self._buildnml("datm"), self._buildnml("dlnd", body)]
+        self.assertIn(buildnmls[1], _run_buildnmls_concurrently(self._case, self._caseroot, buildnmls, nprocs=2))
+        self.assertEqual(self._case.nreads, 1)
+
+if __name__ == '__main__':
+    unittest.main()
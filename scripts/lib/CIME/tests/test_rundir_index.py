@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.rundir_index import RundirIndex, HIST_FILE, REST_FILE, RPOINTER_FILE, LOG_FILE
+
+class FakeArchive(object):
+    """Records the file names the index passes to the archive hist queries"""
+
+    def __init__(self):
+        self.filenames = None
+
+    def get_all_hist_files(self, casename, model, from_dir, suffix="", ref_case=None, filenames=None):
+        self.filenames = filenames
+        return [f for f in filenames if ".h" in f]
+
+    def get_latest_hist_files(self, casename, model, from_dir, suffix="", ref_case=None, filenames=None):
+        return self.get_all_hist_files(casename, model, from_dir, suffix=suffix, ref_case=ref_case,
+                                       filenames=filenames)
+
+class TestRundirIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._rundir = tempfile.mkdtemp()
+        for filename in ["case.cam.h0.0001-01-01-00000.nc",
+                         "case.cam.r.0001-01-02-00000.nc",
+                         "case.cpl_0001.hi.0001-01-02-00000.nc",
+                         "case.cpl.r.0001-01-02-00000.nc",
+                         "rpointer.drv",
+                         "cesm.log.1234.gz",
+                         "atm_in"]:
+            with open(os.path.join(self._rundir, filename), "w") as fd:
+                fd.write("x")
+        os.makedirs(os.path.join(self._rundir, "case.cam.h1.dir"))
+
+    def tearDown(self):
+        shutil.rmtree(self._rundir, ignore_errors=True)
+
+    def test_scan(self):
+        """Only regular files are indexed"""
+        index = RundirIndex(self._rundir, casename="case")
+        self.assertEqual(len(index), 7)
+        self.assertNotIn("case.cam.h1.dir", index)
+        self.assertIn("atm_in", index)
+
+    def test_classification(self):
+        """Files are classified by type, component and instance"""
+        index = RundirIndex(self._rundir, casename="case")
+        self.assertEqual(index.get_files(filetype=HIST_FILE),
+                         ["case.cam.h0.0001-01-01-00000.nc", "case.cpl_0001.hi.0001-01-02-00000.nc"])
+        self.assertEqual(index.get_files(filetype=REST_FILE, component="cpl"),
+                         ["case.cpl.r.0001-01-02-00000.nc"])
+        self.assertEqual(index.get_files(component="cpl", instance="0001"),
+                         ["case.cpl_0001.hi.0001-01-02-00000.nc"])
+        self.assertEqual(index.get_files(component="cpl", instance=None),
+                         ["case.cpl.r.0001-01-02-00000.nc"])
+        self.assertEqual(index.get_files(filetype=RPOINTER_FILE), ["rpointer.drv"])
+        self.assertEqual(index.get_files(filetype=LOG_FILE), ["cesm.log.1234.gz"])
+
+    def test_dates(self):
+        """Dates come from the file names"""
+        index = RundirIndex(self._rundir, casename="case")
+        date = index.get_date("case.cpl.r.0001-01-02-00000.nc")
+        self.assertEqual(index.get_files(date=date),
+                         ["case.cam.r.0001-01-02-00000.nc",
+                          "case.cpl.r.0001-01-02-00000.nc",
+                          "case.cpl_0001.hi.0001-01-02-00000.nc"])
+        self.assertIsNone(index.get_date("atm_in"))
+
+    def test_hist_queries(self):
+        """Archive hist queries only see the files of the component"""
+        index = RundirIndex(self._rundir, casename="case")
+        archive = FakeArchive()
+        self.assertEqual(index.get_all_hist_files(archive, "case", "drv"),
+                         ["case.cpl_0001.hi.0001-01-02-00000.nc"])
+        self.assertEqual(archive.filenames,
+                         ["case.cpl.r.0001-01-02-00000.nc", "case.cpl_0001.hi.0001-01-02-00000.nc"])
+
+    def test_extra_filenames(self):
+        """Extra names are indexed along with the directory contents"""
+        index = RundirIndex(self._rundir, casename="case", extra_filenames=["cam.h0.0001-01-01-00000.nc"])
+        self.assertIn("cam.h0.0001-01-01-00000.nc", index)
+        self.assertEqual(len(index), 8)
+
+if __name__ == '__main__':
+    unittest.main()
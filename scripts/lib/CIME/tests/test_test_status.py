@@ -2,6 +2,8 @@
 
 import unittest
 import os
+import shutil
+import tempfile
 from CIME import test_status
 from CIME import expected_fails
 from CIME.tests.custom_assertions_test_status import CustomAssertionsTestStatus
@@ -134,5 +136,73 @@ class TestTestStatus(CustomAssertionsTestStatus):
             if phase != xfail_phase:
                 self.assert_phase_absent(output, phase, self._TESTNAME)
 
+class TestTestStatusStore(unittest.TestCase):
+
+    _TESTNAME = 'ERS.f19_g16.A.mach_gnu'
+
+    def setUp(self):
+        self._testroot = tempfile.mkdtemp()
+        self._test_dir = os.path.join(self._testroot, self._TESTNAME + '.testid')
+        os.makedirs(self._test_dir)
+        with test_status.TestStatus(test_dir=self._test_dir, test_name=self._TESTNAME) as ts:
+            ts.set_status(test_status.CREATE_NEWCASE_PHASE, test_status.TEST_PASS_STATUS)
+        with test_status.TestStatus(test_dir=self._test_dir) as ts:
+            ts.set_status(test_status.XML_PHASE, test_status.TEST_FAIL_STATUS, comments='bad xml')
+        self._files = [os.path.join(self._test_dir, test_status.TEST_STATUS_FILENAME)]
+
+    def tearDown(self):
+        shutil.rmtree(self._testroot, ignore_errors=True)
+
+    def _store_path(self):
+        return test_status.get_test_status_store_path(self._test_dir, self._TESTNAME)
+
+    def test_store_record_used(self):
+        """The latest store record is used while the file is unchanged"""
+        self.assertTrue(os.path.isfile(self._store_path()))
+        ts = test_status.get_test_statuses(self._files)[0]
+        self.assertEqual(ts.get_name(), self._TESTNAME)
+        self.assertEqual(ts.get_status(test_status.XML_PHASE), test_status.TEST_FAIL_STATUS)
+        self.assertEqual(ts.get_comment(test_status.XML_PHASE), 'bad xml')
+        self.assertEqual(ts, test_status.TestStatus(test_dir=self._test_dir))
+
+    def test_file_is_source_of_truth(self):
+        """Files changed without updating the store are reparsed"""
+        with open(self._files[0], 'a') as fd:
+            fd.write('PASS {} SETUP\n'.format(self._TESTNAME))
+        ts = test_status.get_test_statuses(self._files)[0]
+        self.assertEqual(ts.get_status(test_status.SETUP_PHASE), test_status.TEST_PASS_STATUS)
+
+        os.remove(self._store_path())
+        ts = test_status.get_test_statuses(self._files)[0]
+        self.assertEqual(ts.get_status(test_status.SETUP_PHASE), test_status.TEST_PASS_STATUS)
+
+    def test_store_compacted(self):
+        """Superseded records are dropped from the store"""
+        for i in range(200):
+            with test_status.TestStatus(test_dir=self._test_dir) as ts:
+                ts.set_status(test_status.MEMLEAK_PHASE, test_status.TEST_PASS_STATUS if i % 2 else test_status.TEST_FAIL_STATUS)
+        test_status.get_test_statuses(self._files)
+        with open(self._store_path()) as fd:
+            self.assertEqual(len(fd.readlines()), 1)
+        ts = test_status.get_test_statuses(self._files)[0]
+        self.assertEqual(ts.get_status(test_status.MEMLEAK_PHASE), test_status.TEST_PASS_STATUS)
+
+    def test_files_parsed_concurrently(self):
+        """Files without a store record are parsed concurrently, results keep the order of the files"""
+        os.remove(self._store_path())
+        files = []
+        for i in range(20):
+            test_dir = os.path.join(self._testroot, 'SMS.f{:d}.A.mach_gnu.other'.format(i))
+            os.makedirs(test_dir)
+            with open(os.path.join(test_dir, test_status.TEST_STATUS_FILENAME), 'w') as fd:
+                fd.write('PASS SMS.f{:d}.A.mach_gnu CREATE_NEWCASE\n'.format(i))
+            files.append(os.path.join(test_dir, test_status.TEST_STATUS_FILENAME))
+        files.insert(5, self._files[0])
+
+        names = [ts.get_name() for ts in test_status.get_test_statuses(files, nthreads=4)]
+        self.assertEqual(names, [ts.get_name() for ts in test_status.get_test_statuses(files, nthreads=1)])
+        self.assertEqual(names[5], self._TESTNAME)
+        self.assertEqual(names[:2], ['SMS.f0.A.mach_gnu', 'SMS.f1.A.mach_gnu'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CIME.test_utils import get_case_values
+
+class TestGetCaseValues(unittest.TestCase):
+
+    def setUp(self):
+        self._case_dir = tempfile.mkdtemp()
+        for env_file, entries in [("env_case.xml", [("CASE", "mycase"), ("CASEROOT", "/cases/$CASE")]),
+                                  ("env_test.xml", [("BASELINE_NAME_CMP", "master"),
+                                                    ("BASELINE_ROOT", "${CASEROOT}/baselines"),
+                                                    ("TEST_ROOT", "$ENV{SCRATCH}/tests")])]:
+            with open(os.path.join(self._case_dir, env_file), "w") as fd:
+                fd.write('<?xml version="1.0"?>\n<file id="{}" version="2.0">\n  <group id="test">\n'.format(env_file))
+                for name, value in entries:
+                    fd.write('    <entry id="{}" value="{}">\n      <type>char</type>\n    </entry>\n'.format(name, value))
+                fd.write('  </group>\n</file>\n')
+
+    def tearDown(self):
+        shutil.rmtree(self._case_dir, ignore_errors=True)
+
+    def test_get_case_values(self):
+        """Values are read from the env files with references to case variables resolved"""
+        self.assertEqual(get_case_values(self._case_dir, ["BASELINE_NAME_CMP", "BASELINE_ROOT", "TEST_ROOT", "MACH"]),
+                         {"BASELINE_NAME_CMP" : "master", "BASELINE_ROOT" : "/cases/mycase/baselines",
+                          "TEST_ROOT" : "$ENV{SCRATCH}/tests", "MACH" : None})
+
+if __name__ == '__main__':
+    unittest.main()
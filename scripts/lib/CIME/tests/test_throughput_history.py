@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.dummy import Pool as ThreadPool
+
+from CIME import throughput_history
+from CIME.throughput_history import add_throughput_sample, get_throughput_history, compare_throughput
+
+class TestThroughputHistory(unittest.TestCase):
+
+    def setUp(self):
+        self._baseline_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._baseline_dir, ignore_errors=True)
+
+    def test_rolling_history(self):
+        """Only the last MAX_SAMPLES samples of each coupler log are kept"""
+        self.assertEqual(get_throughput_history(self._baseline_dir, "cpl.log"), [])
+        for i in range(throughput_history.MAX_SAMPLES + 5):
+            add_throughput_sample(self._baseline_dir, "cpl.log", float(i), "compare")
+        add_throughput_sample(self._baseline_dir, "cpl_0002.log", 1.5, "generate")
+
+        self.assertEqual(get_throughput_history(self._baseline_dir, "cpl.log"),
+                         [float(i) for i in range(5, throughput_history.MAX_SAMPLES + 5)])
+        self.assertEqual(get_throughput_history(self._baseline_dir, "cpl_0002.log"), [1.5])
+        history_name = throughput_history.THROUGHPUT_HISTORY_NAME
+        self.assertEqual(sorted(os.listdir(self._baseline_dir)), [history_name, history_name + ".lock"])
+
+    def test_concurrent_samples(self):
+        """Samples added concurrently are all kept"""
+        lognames = ["cpl_{:04d}.log".format(i) for i in range(8)]
+        def add_samples(logname):
+            for i in range(5):
+                add_throughput_sample(self._baseline_dir, logname, float(i), "compare")
+
+        pool = ThreadPool(len(lognames))
+        try:
+            pool.map(add_samples, lognames)
+        finally:
+            pool.close()
+            pool.join()
+
+        for logname in lognames:
+            self.assertEqual(get_throughput_history(self._baseline_dir, logname), [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_unreadable_history(self):
+        """A corrupted history is ignored and replaced"""
+        with open(throughput_history.get_throughput_history_path(self._baseline_dir), "w") as fd:
+            fd.write("{not json")
+        self.assertEqual(get_throughput_history(self._baseline_dir, "cpl.log"), [])
+        add_throughput_sample(self._baseline_dir, "cpl.log", 2.0, "generate")
+        with open(throughput_history.get_throughput_history_path(self._baseline_dir)) as fd:
+            self.assertEqual(json.load(fd)["cpl.log"][0]["source"], "generate")
+
+    def test_compare_throughput(self):
+        """Drops beyond the tolerance only fail when they are significant given the noise"""
+        quiet = [10.0, 10.1, 9.9, 10.0, 10.05, 9.95]
+        noisy = [10.0, 6.0, 13.0, 8.0, 12.0, 9.0]
+        self.assertTrue(compare_throughput(9.0, quiet, 0.25)[0])
+        self.assertFalse(compare_throughput(7.0, quiet, 0.25)[0])
+        self.assertTrue(compare_throughput(7.0, noisy, 0.25)[0])
+        self.assertFalse(compare_throughput(2.0, noisy, 0.25)[0])
+        # Lower confidence catches smaller drops in the same noise
+        self.assertFalse(compare_throughput(7.0, noisy, 0.25, confidence=0.6)[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from CIME import wait_for_tests
+from CIME.test_status import *
+
+def _make_test(test_root, test_name, last_core_status):
+    test_dir = os.path.join(test_root, test_name)
+    os.makedirs(test_dir)
+    with TestStatus(test_dir=test_dir, test_name=test_name) as ts:
+        for phase in CORE_PHASES[:-1]:
+            ts.set_status(phase, TEST_PASS_STATUS)
+        ts.set_status(CORE_PHASES[-1], last_core_status)
+    return test_dir
+
+def _finish_tests(test_dirs, delay):
+    time.sleep(delay)
+    for test_dir in test_dirs:
+        with TestStatus(test_dir=test_dir) as ts:
+            ts.set_status(RUN_PHASE, TEST_PASS_STATUS)
+
+class TestWaitForTests(unittest.TestCase):
+
+    def setUp(self):
+        self._testroot = tempfile.mkdtemp()
+        self._use_inotify = wait_for_tests.USE_INOTIFY
+        self._poll_interval = wait_for_tests.POLL_INTERVAL_SEC
+
+    def tearDown(self):
+        wait_for_tests.USE_INOTIFY = self._use_inotify
+        wait_for_tests.POLL_INTERVAL_SEC = self._poll_interval
+        shutil.rmtree(self._testroot, ignore_errors=True)
+
+    def test_no_wait(self):
+        """Current status of every test is reported, missing files included"""
+        passed = _make_test(self._testroot, "ERS.f19_g16.A.pass", TEST_PASS_STATUS)
+        failed = _make_test(self._testroot, "ERS.f19_g16.A.fail", TEST_FAIL_STATUS)
+        pending = _make_test(self._testroot, "ERS.f19_g16.A.pend", TEST_PEND_STATUS)
+        missing = os.path.join(self._testroot, "ERS.f19_g16.A.missing", TEST_STATUS_FILENAME)
+
+        results = wait_for_tests.wait_for_tests_impl([passed, failed, pending, missing], no_wait=True)
+        self.assertEqual(results["ERS.f19_g16.A.pass"], (passed, TEST_PASS_STATUS))
+        self.assertEqual(results["ERS.f19_g16.A.fail"], (failed, TEST_FAIL_STATUS))
+        self.assertEqual(results["ERS.f19_g16.A.pend"], (pending, TEST_PEND_STATUS))
+        self.assertTrue(results["ERS.f19_g16.A.missing"][1].startswith("File"))
+
+    def _wait_for_pending(self):
+        test_dirs = [_make_test(self._testroot, "ERS.f19_g16.A.{:d}".format(i), TEST_PEND_STATUS) for i in range(5)]
+        finisher = threading.Thread(target=_finish_tests, args=(test_dirs, 0.3))
+        finisher.start()
+        results = wait_for_tests.wait_for_tests_impl(test_dirs)
+        finisher.join()
+        self.assertEqual(results, dict((os.path.basename(test_dir), (test_dir, TEST_PASS_STATUS))
+                                       for test_dir in test_dirs))
+        with open(os.path.join(test_dirs[0], ".internal_test_status.log")) as fd:
+            self.assertIn("OVERALL: PASS", fd.read())
+
+    def test_wait(self):
+        """Pending tests are reported once they finish"""
+        self._wait_for_pending()
+
+    def test_wait_polling(self):
+        """Pending tests are reported once they finish without inotify"""
+        wait_for_tests.USE_INOTIFY = False
+        wait_for_tests.POLL_INTERVAL_SEC = 0.1
+        self._wait_for_pending()
+
+if __name__ == '__main__':
+    unittest.main()
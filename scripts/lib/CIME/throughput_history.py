@@ -0,0 +1,137 @@
+"""
+Rolling history of the throughput of a test, kept with its baselines.
+
+Comparing the throughput of a run with the single run that generated the
+baseline fails whenever either run was slowed down by other jobs on a shared
+machine. Instead the baseline directory of a test keeps the throughput of the
+last MAX_SAMPLES runs (the one generating the baseline and the runs that
+passed the comparison since) and a run is compared with the median of these,
+using the median absolute deviation (MAD) as a robust estimate of how noisy
+the throughput of the test is on the machine: a run fails only if it is
+slower than the median by more than the tolerance and by more than the
+noise allows at the requested confidence.
+"""
+from CIME.XML.standard_module_setup import *
+from CIME.utils import SharedArea, flock_exclusive, get_median
+
+import json, math, time
+
+logger = logging.getLogger(__name__)
+
+THROUGHPUT_HISTORY_NAME = "throughput_history.json"
+
+# Number of samples kept per coupler log
+MAX_SAMPLES = 20
+
+# Fewer samples than this give no meaningful MAD, only the tolerance is used
+MIN_SAMPLES = 3
+
+# Default one-sided confidence that a run failing the check is really slower
+DEFAULT_CONFIDENCE = 0.99
+
+# Scales the MAD to the standard deviation for normally distributed samples
+_MAD_TO_SIGMA = 1.4826
+
+def get_throughput_history_path(baseline_dir):
+    return os.path.join(baseline_dir, THROUGHPUT_HISTORY_NAME)
+
+def _read_history(baseline_dir):
+    path = get_throughput_history_path(baseline_dir)
+    if not os.path.isfile(path):
+        return {}
+
+    try:
+        with open(path, "r") as fd:
+            history = json.load(fd)
+    except (IOError, OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable throughput history {}: {}".format(path, e))
+        return {}
+
+    return history if isinstance(history, dict) else {}
+
+def get_throughput_history(baseline_dir, logname):
+    """
+    Returns the throughputs recorded for coupler log logname (e.g. cpl.log)
+    in baseline_dir, oldest first
+    """
+    return [sample["throughput"] for sample in _read_history(baseline_dir).get(logname, [])]
+
+def add_throughput_sample(baseline_dir, logname, throughput, source):
+    """
+    Record throughput of coupler log logname in the history in baseline_dir,
+    dropping the oldest samples beyond MAX_SAMPLES. source says where the
+    sample comes from (e.g. generate or compare).
+    """
+    path = get_throughput_history_path(baseline_dir)
+    tmp_path = "{}.{:d}".format(path, os.getpid())
+    # Use umask to make sure the history is group writable like the baselines
+    with SharedArea():
+        # The history is replaced by renaming, so concurrent runs lock a separate file
+        with open(path + ".lock", "a") as lock_fd:
+            flock_exclusive(lock_fd)
+            history = _read_history(baseline_dir)
+            samples = history.setdefault(logname, [])
+            samples.append({"throughput" : throughput, "time" : time.time(), "source" : source})
+            del samples[:-MAX_SAMPLES]
+
+            with open(tmp_path, "w") as fd:
+                json.dump(history, fd, indent=1, sort_keys=True)
+            os.rename(tmp_path, path)
+
+def _normal_quantile(p):
+    """
+    Returns the p quantile of the standard normal distribution
+
+    >>> abs(_normal_quantile(0.5)) < 1e-6
+    True
+    >>> round(_normal_quantile(0.975), 3), round(_normal_quantile(0.99), 3)
+    (1.96, 2.326)
+    """
+    expect(0.0 < p < 1.0, "Bad value {} for a probability".format(p))
+    low, high = -40.0, 40.0
+    while high - low > 1e-9:
+        mid = (low + high) / 2.0
+        if 0.5 * (1.0 + math.erf(mid / math.sqrt(2.0))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+def compare_throughput(current, samples, tolerance, confidence=DEFAULT_CONFIDENCE):
+    """
+    Compare throughput current with the throughputs samples of earlier runs.
+    Returns (success, comment): current fails if it is lower than the median
+    of samples by more than tolerance (a fraction of the median) and, with
+    at least MIN_SAMPLES samples, by more than the noise of the samples
+    allows at the one-sided confidence level confidence.
+
+    >>> compare_throughput(8.0, [10.0], 0.1)
+    (False, 'Error: Computation time increase > 10 pct from baseline: 8.00 vs 10.00 simulated years/day')
+    >>> compare_throughput(9.5, [10.0], 0.1)[0]
+    True
+    >>> noisy = [10.0, 7.5, 12.0, 9.0, 11.0, 8.0]
+    >>> compare_throughput(8.0, noisy, 0.1)
+    (True, 'throughput 8.00 within the noise of 6 samples: median 9.50, MAD 1.50 simulated years/day')
+    >>> compare_throughput(3.0, noisy, 0.1)[0]
+    False
+    >>> compare_throughput(9.0, [10.0, 10.0, 10.1, 9.9], 0.05)[0]
+    False
+    """
+    median = get_median(samples)
+    drop = (median - current) / median if median > 0 else 0.0
+    if drop < tolerance:
+        return True, None
+
+    if len(samples) < MIN_SAMPLES:
+        return False, "Error: Computation time increase > {:d} pct from baseline: {:.2f} vs {:.2f} simulated years/day".\
+            format(int(tolerance*100), current, median)
+
+    mad = get_median([abs(sample - median) for sample in samples])
+    limit = _normal_quantile(confidence) * _MAD_TO_SIGMA * mad
+    if median - current <= limit:
+        return True, "throughput {:.2f} within the noise of {:d} samples: median {:.2f}, MAD {:.2f} simulated years/day".\
+            format(current, len(samples), median, mad)
+
+    return False, "Error: Computation time increase > {:d} pct from baseline: {:.2f} vs median {:.2f} " \
+        "(MAD {:.2f}) of {:d} samples simulated years/day, significant at {:g} confidence".\
+        format(int(tolerance*100), current, median, mad, len(samples), confidence)
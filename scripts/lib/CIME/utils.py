@@ -3,7 +3,7 @@ Common functions used by cime python scripts
 Warning: you cannot use CIME Classes in this module as it causes circular dependencies
 """
 import io, logging, gzip, sys, os, time, re, shutil, glob, string, random, imp, fnmatch
-import errno, signal, warnings, filecmp
+import errno, signal, warnings, filecmp, fcntl
 import stat as statlib
 import six
 from contextlib import contextmanager
@@ -1556,6 +1556,27 @@ def wait_for_unlocked(filepath):
             if file_object:
                 file_object.close()
 
+def flock_exclusive(fd):
+    """
+    Take an exclusive flock on open file fd, waiting for other processes
+    holding it. It is released when fd is closed.
+    Filesystems without lock support are not locked.
+    """
+    try:
+        fcntl.flock(fd.fileno(), fcntl.LOCK_EX)
+    except (IOError, OSError) as e:
+        if e.errno not in (errno.ENOLCK, errno.EOPNOTSUPP, errno.EINVAL):
+            raise
+
+def get_median(values):
+    """
+    >>> get_median([3, 1, 2]), get_median([4, 1, 2, 3])
+    (2, 2.5)
+    """
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
 def gunzip_existing_file(filepath):
     with gzip.open(filepath, "rb") as fd:
         return fd.read()
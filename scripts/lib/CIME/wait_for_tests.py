@@ -1,6 +1,4 @@
-#pylint: disable=import-error
-from six.moves import queue
-import os, time, threading, socket, signal, shutil, glob
+import os, sys, time, socket, signal, shutil, glob, select, struct, errno, ctypes
 #pylint: disable=import-error
 from distutils.spawn import find_executable
 import logging
@@ -17,6 +15,11 @@ SIGNAL_RECEIVED           = False
 E3SM_MAIN_CDASH           = "E3SM"
 CDASH_DEFAULT_BUILD_GROUP = "ACME_Latest"
 SLEEP_INTERVAL_SEC        = .1
+POLL_INTERVAL_SEC         = 1     # stat sweep interval for tests not watched with inotify
+INOTIFY_SWEEP_SEC         = 30    # safety stat sweep interval for tests watched with inotify
+RACY_MTIME_SEC            = 2     # files modified this recently are reread even if their stamp is unchanged
+USE_INOTIFY               = True
+NETWORK_FILESYSTEMS       = ("nfs", "nfs4", "lustre", "gpfs", "cifs", "smbfs", "smb3", "panfs", "beegfs", "afs", "ceph", "fuse")
 
 ###############################################################################
 def signal_handler(*_):
@@ -342,75 +345,282 @@ NightlyStartTime: {5} UTC
     run_cmd_no_fail("ctest -VV -D NightlySubmit", verbose=True)
 
 ###############################################################################
-def wait_for_test(test_path, results, wait, check_throughput, check_memory, ignore_namelists, ignore_memleak, no_run):
+class _Inotify(object):
 ###############################################################################
-    if (os.path.isdir(test_path)):
-        test_status_filepath = os.path.join(test_path, TEST_STATUS_FILENAME)
-    else:
-        test_status_filepath = test_path
-
-    logging.debug("Watching file: '{}'".format(test_status_filepath))
-    test_log_path = os.path.join(os.path.dirname(test_status_filepath), ".internal_test_status.log")
+    """
+    Minimal ctypes binding of the Linux inotify API, lets the watcher wake up
+    when a TestStatus file is written instead of rereading every file.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO    = 0x00000080
+    IN_Q_OVERFLOW  = 0x00004000
+
+    _EVENT = struct.Struct("iIII") # wd, mask, cookie, len; followed by name
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    @classmethod
+    def create(cls):
+        """
+        Returns an _Inotify, or None if inotify is not available
+        """
+        if not USE_INOTIFY or not sys.platform.startswith("linux"):
+            return None
+        try:
+            return cls()
+        except (OSError, AttributeError):
+            return None
+
+    def add_watch(self, dirname):
+        """
+        Watch directory dirname for files written or moved into it, returns
+        the watch descriptor or None if dirname cannot be watched (e.g. it
+        does not exist or the user watch limit is reached)
+        """
+        if not isinstance(dirname, bytes):
+            dirname = dirname.encode(sys.getfilesystemencoding())
+        wd = self._libc.inotify_add_watch(self._fd, dirname, self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+        return wd if wd >= 0 else None
+
+    def read_events(self, timeout):
+        """
+        Wait up to timeout seconds for events, returns a list of
+        (watch descriptor, file name). A watch descriptor of None means
+        events were lost and every watched file should be checked.
+        """
+        try:
+            readable = select.select([self._fd], [], [], timeout)[0]
+        except (select.error, OSError, IOError):
+            # Interrupted by a signal
+            return []
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding(), "replace")
+            offset += length
+            events.append((None if mask & self.IN_Q_OVERFLOW else wd, name))
+
+        return events
+
+    def close(self):
+        os.close(self._fd)
 
-    # We don't want to make it a requirement that wait_for_tests has write access
-    # to all case directories
+###############################################################################
+def _get_network_mounts():
+###############################################################################
+    """
+    Returns the mount points of network filesystems, on which inotify does
+    not see files written by other hosts (e.g. the compute nodes)
+    """
+    mounts = []
     try:
-        fd = open(test_log_path, "w")
-        fd.close()
-    except (IOError, OSError):
-        test_log_path = "/dev/null"
-
-    prior_ts = None
-    with open(test_log_path, "w") as log_fd:
-        while (True):
-            if (os.path.exists(test_status_filepath)):
-                ts = TestStatus(test_dir=os.path.dirname(test_status_filepath))
-                test_name = ts.get_name()
-                test_status = ts.get_overall_test_status(wait_for_run=not no_run, # Important
-                                                         no_run=no_run,
-                                                         check_throughput=check_throughput,
-                                                         check_memory=check_memory, ignore_namelists=ignore_namelists,
-                                                         ignore_memleak=ignore_memleak)
-
-                if prior_ts is not None and prior_ts != ts:
+        with open("/proc/mounts") as fd:
+            for line in fd:
+                fields = line.split()
+                if len(fields) > 2 and fields[2].split(".")[0] in NETWORK_FILESYSTEMS:
+                    mounts.append(fields[1])
+    except IOError:
+        pass
+
+    return mounts
+
+###############################################################################
+def _is_on_mount(path, mounts):
+###############################################################################
+    """
+    >>> _is_on_mount("/gpfs/scratch/test", ["/gpfs", "/nfs"])
+    True
+    >>> _is_on_mount("/gpfsfoo/test", ["/gpfs", "/nfs"])
+    False
+    >>> _is_on_mount("/home/test", [])
+    False
+    """
+    path = os.path.realpath(path)
+    return any(path == mount or path.startswith(mount.rstrip("/") + "/") for mount in mounts)
+
+###############################################################################
+class _TestWatch(object):
+###############################################################################
+    """
+    The state of one test being waited on by wait_for_tests_impl
+    """
+
+    def __init__(self, test_path):
+        self.test_path = test_path
+        if (os.path.isdir(test_path)):
+            self.status_file = os.path.join(test_path, TEST_STATUS_FILENAME)
+        else:
+            self.status_file = test_path
+
+        self.test_dir = os.path.dirname(self.status_file)
+        self.notified = False # True if inotify reports changes to status_file
+        self.result = None    # (test_name, test_path, test_status) once done
+        self._stamp = None
+        self._prior_ts = None
+
+        logging.debug("Watching file: '{}'".format(self.status_file))
+
+        # We don't want to make it a requirement that wait_for_tests has write access
+        # to all case directories
+        self._log_path = os.path.join(self.test_dir, ".internal_test_status.log")
+        try:
+            fd = open(self._log_path, "w")
+            fd.close()
+        except (IOError, OSError):
+            self._log_path = None
+
+    def changed(self):
+        """
+        Returns True if the status file may have changed since it was last
+        checked. Only stats the file, files written within RACY_MTIME_SEC
+        of now are always considered changed since a second write within
+        the mtime resolution of the filesystem does not change the stamp.
+        """
+        try:
+            st = os.stat(self.status_file)
+        except OSError:
+            return self._stamp is not None
+
+        return (st.st_mtime, st.st_size, st.st_ino) != self._stamp or \
+            abs(time.time() - st.st_mtime) < RACY_MTIME_SEC
+
+    def check(self, final, status_args, ts=None):
+        """
+        Reread the status file, sets result if the test is done or final is True.
+        ts is the current TestStatus of the test if already known.
+        """
+        try:
+            st = os.stat(self.status_file)
+            self._stamp = (st.st_mtime, st.st_size, st.st_ino)
+        except OSError:
+            self._stamp = None
+
+        if self._stamp is not None:
+            if ts is None:
+                ts = TestStatus(test_dir=self.test_dir)
+            test_status = ts.get_overall_test_status(**status_args)
+
+            if self._prior_ts is not None and self._prior_ts != ts and self._log_path is not None:
+                with open(self._log_path, "a") as log_fd:
                     log_fd.write(ts.phase_statuses_dump())
                     log_fd.write("OVERALL: {}\n\n".format(test_status))
 
-                prior_ts = ts
+            self._prior_ts = ts
 
-                if (test_status == TEST_PEND_STATUS and (wait and not SIGNAL_RECEIVED)):
-                    time.sleep(SLEEP_INTERVAL_SEC)
-                    logging.debug("Waiting for test to finish")
-                else:
-                    results.put( (test_name, test_path, test_status) )
-                    break
+            if test_status != TEST_PEND_STATUS or final:
+                self.result = (ts.get_name(), self.test_path, test_status)
 
-            else:
-                if (wait and not SIGNAL_RECEIVED):
-                    logging.debug("File '{}' does not yet exist".format(test_status_filepath))
-                    time.sleep(SLEEP_INTERVAL_SEC)
-                else:
-                    test_name = os.path.abspath(test_status_filepath).split("/")[-2]
-                    results.put( (test_name, test_path, "File '{}' doesn't exist".format(test_status_filepath)) )
-                    break
+        elif final:
+            test_name = os.path.abspath(self.status_file).split("/")[-2]
+            self.result = (test_name, self.test_path, "File '{}' doesn't exist".format(self.status_file))
+
+        else:
+            logging.debug("File '{}' does not yet exist".format(self.status_file))
 
 ###############################################################################
 def wait_for_tests_impl(test_paths, no_wait=False, check_throughput=False, check_memory=False, ignore_namelists=False, ignore_memleak=False, no_run=False):
 ###############################################################################
-    results = queue.Queue()
+    """
+    Wait for all tests to finish from a single thread. Status files are
+    reread when inotify reports them written, or when a stat sweep (every
+    POLL_INTERVAL_SEC for files on network filesystems or where inotify is
+    not available, every INOTIFY_SWEEP_SEC otherwise) finds them changed.
+    """
+    status_args = dict(wait_for_run=not no_run, # Important
+                       no_run=no_run,
+                       check_throughput=check_throughput,
+                       check_memory=check_memory, ignore_namelists=ignore_namelists,
+                       ignore_memleak=ignore_memleak)
+
+    watches = [_TestWatch(test_path) for test_path in test_paths]
+
+    inotify = None if no_wait else _Inotify.create()
+    watch_descriptors = {} # wd -> [_TestWatch]
+    if inotify is not None:
+        network_mounts = _get_network_mounts()
+        for watch in watches:
+            if not _is_on_mount(watch.test_dir, network_mounts):
+                wd = inotify.add_watch(watch.test_dir)
+                if wd is not None:
+                    watch.notified = True
+                    watch_descriptors.setdefault(wd, []).append(watch)
+
+        logging.debug("Watching {:d} of {:d} tests with inotify".
+                      format(len([watch for watch in watches if watch.notified]), len(watches)))
+
+    # The first check of every test reads the suite status stores
+    existing = [watch for watch in watches if os.path.isfile(watch.status_file)]
+    known_statuses = dict(zip(existing, get_test_statuses([watch.status_file for watch in existing])))
+
+    completed = []
+    try:
+        pending = watches
+        to_check = watches
+        last_poll = last_sweep = time.time()
+        while True:
+            final = no_wait or SIGNAL_RECEIVED
+            for watch in to_check:
+                watch.check(final, status_args, ts=known_statuses.pop(watch, None))
+                if watch.result is not None:
+                    completed.append(watch.result)
+                    if not no_wait:
+                        logging.info("Test '{}' finished with status '{}' ({:d} of {:d})".
+                                     format(watch.result[0], watch.result[2], len(completed), len(watches)))
+
+            pending = [watch for watch in pending if watch.result is None]
+            if not pending:
+                break
+
+            if watch_descriptors:
+                events = inotify.read_events(SLEEP_INTERVAL_SEC)
+            else:
+                events = []
+                time.sleep(SLEEP_INTERVAL_SEC)
 
-    for test_path in test_paths:
-        t = threading.Thread(target=wait_for_test, args=(test_path, results, not no_wait, check_throughput, check_memory, ignore_namelists, ignore_memleak, no_run))
-        t.daemon = True
-        t.start()
+            if SIGNAL_RECEIVED:
+                to_check = pending
+                continue
 
-    while threading.active_count() > 1:
-        time.sleep(1)
+            to_check = set()
+            for wd, name in events:
+                if wd is None:
+                    last_sweep = 0
+                else:
+                    to_check.update(watch for watch in watch_descriptors.get(wd, [])
+                                    if watch.result is None and os.path.basename(watch.status_file) == name)
+
+            now = time.time()
+            poll = now - last_poll >= POLL_INTERVAL_SEC
+            sweep = now - last_sweep >= INOTIFY_SWEEP_SEC
+            if poll or sweep:
+                to_check.update(watch for watch in pending
+                                if (sweep if watch.notified else poll) and watch not in to_check and watch.changed())
+                last_poll = now if poll else last_poll
+                last_sweep = now if sweep else last_sweep
+    finally:
+        if inotify is not None:
+            inotify.close()
 
     test_results = {}
     completed_test_paths = []
-    while (not results.empty()):
-        test_name, test_path, test_status = results.get()
+    for test_name, test_path, test_status in completed:
         if (test_name in test_results):
             prior_path, prior_status = test_results[test_name]
             if (test_status == prior_status):
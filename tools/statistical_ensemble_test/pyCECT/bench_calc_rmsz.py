@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark of pyEnsLib.calc_rmsz, the ensemble summary computation of pyEnsSum.
+
+Usage: bench_calc_rmsz.py [--nfiles N] [--nlev N] [--ncol N] [--nvar3d N]
+                          [--nvar2d N] [--dir DIR] [--legacy]
+
+Writes a synthetic CAM-SE ensemble of nfiles netCDF history files (random
+fields around a common state, with a variable without any variance and a
+variable where a single member differs, like the ensembles of pyEnsSum),
+then reports the time calc_rmsz takes to compute the ensemble mean, stddev
+and RMSZ scores. With --legacy, the member by member computation calc_rmsz
+used before is also timed, and the largest relative difference of the RMSZ
+scores of both is reported.
+"""
+import sys, os, time, shutil, tempfile, argparse
+import numpy as np
+import Nio
+import pyEnsLib
+
+#
+# Write the synthetic ensemble into directory, returns the file names and
+# the names of the 3d and 2d variables
+#
+def make_ensemble(directory,nfiles,nlev,ncol,nvar3d,nvar2d,seed=0):
+    rng = np.random.RandomState(seed)
+    base3d = (rng.rand(nvar3d,nlev,ncol)*100.).astype(np.float32)
+    base2d = (rng.rand(nvar2d,ncol)*10.).astype(np.float32)
+    area = rng.rand(ncol)+0.5
+    var_name3d = ['V3D_%03d' % i for i in range(nvar3d)]
+    var_name2d = ['V2D_%03d' % i for i in range(nvar2d)]
+    fnames = []
+    for fcount in range(nfiles):
+        fname = os.path.join(directory,'ens.%04d.cam.h0.nc' % fcount)
+        f = Nio.open_file(fname,'c')
+        f.create_dimension('time',2)
+        f.create_dimension('lev',nlev)
+        f.create_dimension('ncol',ncol)
+        v = f.create_variable('area','d',('ncol',))
+        v.assign_value(area)
+        for i,vname in enumerate(var_name3d):
+            data = base3d[i]+(rng.randn(nlev,ncol)*0.01*(i+1)).astype(np.float32)
+            if i == 0:
+                # no variance at all
+                data = base3d[i]
+            elif i == 1:
+                # a single member differs on the first level
+                data[0] = base3d[i][0]+(5. if fcount == 0 else 0.)
+            v = f.create_variable(vname,'f',('time','lev','ncol'))
+            v.assign_value(np.array([data,data]))
+        for i,vname in enumerate(var_name2d):
+            data = base2d[i]+(rng.randn(ncol)*0.1).astype(np.float32)
+            v = f.create_variable(vname,'f',('time','ncol'))
+            v.assign_value(np.array([data,data]))
+        f.close()
+        fnames.append(fname)
+    return fnames,var_name3d,var_name2d
+
+#
+# RMSZ scores as calc_rmsz computed them before: for each member, the mean
+# and stddev of the other members recomputed from all their values
+#
+def legacy_rmsz(o_files,var_names,tslice,npts):
+    zscores = np.zeros((len(var_names),len(o_files)),dtype=np.float32)
+    indices = np.arange(0,len(o_files),1)
+    for vcount,vname in enumerate(var_names):
+        output = np.array([f.variables[vname][tslice] for f in o_files],dtype=np.float32)
+        for fcount in range(len(o_files)):
+            ensemble = output[np.where(indices!=fcount)]
+            avg = np.average(ensemble,axis=0)
+            stddev = np.std(ensemble,axis=0,dtype=np.float64)
+            count,ret_val = pyEnsLib.calc_Z(output[fcount].astype(np.float64),avg.astype(np.float64),stddev,0,False)
+            if count < npts:
+                zscores[vcount,fcount] = np.sqrt(np.sum(np.square(ret_val))/(npts-count))
+    return zscores
+
+def _main():
+    parser = argparse.ArgumentParser(description='Benchmark of pyEnsLib.calc_rmsz')
+    parser.add_argument('--nfiles',type=int,default=60,help='ensemble members')
+    parser.add_argument('--nlev',type=int,default=30,help='levels')
+    parser.add_argument('--ncol',type=int,default=48602,help='columns (48602 is ne30)')
+    parser.add_argument('--nvar3d',type=int,default=8,help='3d variables')
+    parser.add_argument('--nvar2d',type=int,default=8,help='2d variables')
+    parser.add_argument('--dir',help='keep the ensemble in this directory rather than a temporary one')
+    parser.add_argument('--legacy',action='store_true',help='also time the previous computation')
+    args = parser.parse_args()
+
+    directory = args.dir if args.dir else tempfile.mkdtemp()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    try:
+        fnames,var_name3d,var_name2d = make_ensemble(directory,args.nfiles,args.nlev,args.ncol,args.nvar3d,args.nvar2d)
+        o_files = [Nio.open_file(fname,'r') for fname in fnames]
+        opts_dict = {'popens':False,'tslice':1,'cumul':False}
+        print('%d members, %d levels, %d columns, %d 3d and %d 2d variables' %
+              (args.nfiles,args.nlev,args.ncol,args.nvar3d,args.nvar2d))
+
+        start = time.time()
+        zscore3d,zscore2d = pyEnsLib.calc_rmsz(o_files,var_name3d,var_name2d,True,opts_dict)[:2]
+        print('calc_rmsz        %8.2f s' % (time.time()-start))
+
+        if args.legacy:
+            start = time.time()
+            legacy3d = legacy_rmsz(o_files,var_name3d,1,args.nlev*args.ncol)
+            legacy2d = legacy_rmsz(o_files,var_name2d,1,args.ncol)
+            print('legacy           %8.2f s' % (time.time()-start))
+            diff = 0.
+            for new,old in [(zscore3d,legacy3d),(zscore2d,legacy2d)]:
+                nonzero = old != 0
+                if np.any(nonzero):
+                    diff = max(diff,np.max(np.abs(new[nonzero]-old[nonzero])/old[nonzero]))
+            print('max relative difference of the RMSZ scores %.2e' % diff)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory,ignore_errors=True)
+
+if __name__ == '__main__':
+    _main()
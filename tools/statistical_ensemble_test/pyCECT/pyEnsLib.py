@@ -27,6 +27,24 @@ def parse_header_file(filename):
     
     retvalue=(os.popen(command).readline())
     print(retvalue)  
+#
+# Bytes of member data calc_rmsz works on at once for one variable: the
+# members are read a chunk of columns (or latitudes) at a time
+#
+RMSZ_CHUNK_BYTES = 256*1024*1024
+
+#
+# Bytes needed per value of a member in a chunk: the float32 data, the
+# float64 zscores and leave-one-out stddevs and two masks
+#
+_RMSZ_BYTES_PER_VALUE = 22
+
+#
+# Leave-one-out sums of squared deviations smaller than this fraction of the
+# ensemble's are recomputed from the members rather than downdated
+#
+_LOO_RTOL = 1e-6
+
 #
 # Create RMSZ zscores for ensemble file sets 
 #
@@ -51,12 +69,7 @@ def calc_rmsz(o_files,var_name3d,var_name2d,is_SE,opts_dict):
       ncol=input_dims["ncol"]
       npts2d=ncol
       npts3d=nlev*ncol
-      output3d = np.zeros((len(o_files),nlev,ncol),dtype=np.float32)
-      output2d = np.zeros((len(o_files),ncol),dtype=np.float32)
-      ens_avg3d=np.zeros((len(var_name3d),nlev,ncol),dtype=np.float32)
-      ens_stddev3d=np.zeros((len(var_name3d),nlev,ncol),dtype=np.float32)
-      ens_avg2d=np.zeros((len(var_name2d),ncol),dtype=np.float32)
-      ens_stddev2d=np.zeros((len(var_name2d),ncol),dtype=np.float32)
+      shape2d=(ncol,)
     else: #not SE
       if 'nlon' in input_dims:
          nlon = input_dims["nlon"]
@@ -68,23 +81,20 @@ def calc_rmsz(o_files,var_name3d,var_name2d,is_SE,opts_dict):
 
       npts2d=nlat*nlon
       npts3d=nlev*nlat*nlon
-      output3d = np.zeros((len(o_files),nlev,nlat,nlon),dtype=np.float32)
-      output2d = np.zeros((len(o_files),nlat,nlon),dtype=np.float32)
-      ens_avg3d=np.zeros((len(var_name3d),nlev,nlat,nlon),dtype=np.float32)
-      ens_stddev3d=np.zeros((len(var_name3d),nlev,nlat,nlon),dtype=np.float32)
-      ens_avg2d=np.zeros((len(var_name2d),nlat,nlon),dtype=np.float32)
-      ens_stddev2d=np.zeros((len(var_name2d),nlat,nlon),dtype=np.float32)
+      shape2d=(nlat,nlon)
+    ens_avg3d=np.zeros((len(var_name3d),nlev)+shape2d,dtype=np.float32)
+    ens_stddev3d=np.zeros((len(var_name3d),nlev)+shape2d,dtype=np.float32)
+    ens_avg2d=np.zeros((len(var_name2d),)+shape2d,dtype=np.float32)
+    ens_stddev2d=np.zeros((len(var_name2d),)+shape2d,dtype=np.float32)
     if popens:
+      # POP zscores need the whole fields of all members
+      output3d = np.zeros((len(o_files),nlev)+shape2d,dtype=np.float32)
+      output2d = np.zeros((len(o_files),)+shape2d,dtype=np.float32)
       Zscore3d = np.zeros((len(var_name3d),len(o_files),(nbin)),dtype=np.float32) 
       Zscore2d = np.zeros((len(var_name2d),len(o_files),(nbin)),dtype=np.float32) 
     else:
       Zscore3d = np.zeros((len(var_name3d),len(o_files)),dtype=np.float32) 
       Zscore2d = np.zeros((len(var_name2d),len(o_files)),dtype=np.float32) 
-    avg3d={}
-    stddev3d={}
-    avg2d={}
-    stddev2d={}
-    indices = np.arange(0,len(o_files),1)
     gm3d=[]
     gm2d=[]
         
@@ -95,106 +105,156 @@ def calc_rmsz(o_files,var_name3d,var_name2d,is_SE,opts_dict):
 
     #lOOP THROUGH 3D  
     for vcount,vname in enumerate(var_name3d):
+      if not popens: #CAM
+         ens_avg3d[vcount],ens_stddev3d[vcount],zsum,count3d=calc_ens_stats(o_files,vname,tslice,True,not cumul,threshold)
+         if cumul:
+            gm3d[vcount],temp3=calc_global_mean_for_onefile(o_files[-1],area_wgt,[vname],[],ens_avg3d[vcount],temp2,tslice,is_SE,nlev,opts_dict)
+         else:
+            Zscore3d[vcount]=calc_rmsz_from_sums(zsum,count3d,npts3d,vname)
+         continue
+
       #Read in vname's data of all files
       for fcount, this_file in enumerate(o_files):
         data=this_file.variables[vname]
-        if (is_SE == True):
-          output3d[fcount,:,:]=data[tslice,:,:]
-      
-        else:
-          output3d[fcount,:,:,:]=data[tslice,:,:,:]
+        output3d[fcount]=data[tslice]
 
       #Generate ens_avg and ens_stddev to store in the ensemble summary file
-      if popens:#POP
-         moutput3d=np.ma.masked_values(output3d,data._FillValue)
-         ens_avg3d[vcount]=np.ma.average(moutput3d,axis=0)
-         ens_stddev3d[vcount]=np.ma.std(moutput3d,axis=0,dtype=np.float32)
-      else: #CAM
-         ens_avg3d[vcount]=np.average(output3d,axis=0).astype(np.float32)
-         ens_stddev3d[vcount]=np.std(output3d.astype(np.float64),axis=0,dtype=np.float64).astype(np.float32)
-         if cumul:
-            gm3d[vcount],temp3=calc_global_mean_for_onefile(this_file,area_wgt,[vname],[],ens_avg3d[vcount],temp2,tslice,is_SE,nlev,opts_dict)
+      moutput3d=np.ma.masked_values(output3d,data._FillValue)
+      ens_avg3d[vcount]=np.ma.average(moutput3d,axis=0)
+      ens_stddev3d[vcount]=np.ma.std(moutput3d,axis=0,dtype=np.float32)
 
       if not cumul:
-         #Generate avg, stddev and zscore for 3d variable
+         #Generate zscore for 3d variable
          for fcount,this_file in enumerate(o_files):
            data=this_file.variables[vname]
-           if not popens:
-              new_index=np.where(indices!=fcount)
-              ensemble3d = output3d[new_index] 
-              avg3d=np.average(ensemble3d,axis=0)
-              stddev3d=np.std(ensemble3d,axis=0,dtype=np.float64) 
-
-              flag3d = False
-              count3d = 0
-              count3d,ret_val=calc_Z(output3d[fcount].astype(np.float64),avg3d.astype(np.float64),stddev3d.astype(np.float64),count3d,flag3d)
-              Zscore=np.sum(np.square(ret_val))
-
-              if (count3d < npts3d):
-                Zscore3d[vcount,fcount]=np.sqrt(Zscore/(npts3d-count3d))
-              else:
-                print "WARNING: no variance in "+vname
-           else: #POP
-              #rmask contains a number for each grid point indicating it's region 
-              rmask=this_file.variables['REGION_MASK']
-              Zscore=pop_zpdf(output3d[fcount],nbin,(minrange,maxrange),ens_avg3d[vcount],ens_stddev3d[vcount],data._FillValue,threshold,rmask,opts_dict)
-              #if fcount == 0 & vcount ==0:
-              #   time_val = this_file.variables['time'][0]
-              #   fout = "Zscore_"+str(time_val)+".txt"
-              #   print Zscore.shape
-              #   np.savetxt(fout,Zscore[0,3,:], fmt='%.3e')
-              Zscore3d[vcount,fcount,:]=Zscore[:]
-              #print 'zscore3d vcount,fcount=',vcount,fcount,Zscore3d[vcount,fcount]
+           #rmask contains a number for each grid point indicating it's region 
+           rmask=this_file.variables['REGION_MASK']
+           Zscore=pop_zpdf(output3d[fcount],nbin,(minrange,maxrange),ens_avg3d[vcount],ens_stddev3d[vcount],data._FillValue,threshold,rmask,opts_dict)
+           Zscore3d[vcount,fcount,:]=Zscore[:]
 
     #LOOP THROUGH 2D
     for vcount,vname in enumerate(var_name2d):
+      if not popens: #CAM
+         ens_avg2d[vcount],ens_stddev2d[vcount],zsum,count2d=calc_ens_stats(o_files,vname,tslice,False,not cumul,threshold)
+         if cumul:
+            temp3,gm2d[vcount]=calc_global_mean_for_onefile(o_files[-1],area_wgt,[],[vname],temp1,ens_avg2d[vcount],tslice,is_SE,nlev,opts_dict)
+         else:
+            Zscore2d[vcount]=calc_rmsz_from_sums(zsum,count2d,npts2d,vname)
+         continue
+
       #Read in vname's data of all files
       for fcount, this_file in enumerate(o_files):
         data=this_file.variables[vname]
-        if (is_SE == True):
-          output2d[fcount,:]=data[tslice,:]
-      
-        else:
-          output2d[fcount,:,:]=data[tslice,:,:]
+        output2d[fcount]=data[tslice]
 
       #Generate ens_avg and esn_stddev to store in the ensemble summary file
-      if popens: #POP
-         moutput2d=np.ma.masked_values(output2d,data._FillValue)
-         ens_avg2d[vcount]=np.ma.average(moutput2d,axis=0)
-         ens_stddev2d[vcount]=np.ma.std(moutput2d,axis=0,dtype=np.float32)
-      else:#CAM
-         ens_avg2d[vcount]=np.average(output2d,axis=0).astype(np.float32)
-         ens_stddev2d[vcount]=np.std(output2d,axis=0,dtype=np.float64).astype(np.float32)
-         if cumul:
-            temp3,gm2d[vcount]=calc_global_mean_for_onefile(this_file,area_wgt,[],[vname],temp1,ens_avg2d[vcount],tslice,is_SE,nlev,opts_dict)
+      moutput2d=np.ma.masked_values(output2d,data._FillValue)
+      ens_avg2d[vcount]=np.ma.average(moutput2d,axis=0)
+      ens_stddev2d[vcount]=np.ma.std(moutput2d,axis=0,dtype=np.float32)
 
       if not cumul:
-         #Generate avg, stddev and zscore for 3d variable
+         #Generate zscore for 2d variable
          for fcount,this_file in enumerate(o_files):
-
            data=this_file.variables[vname]
-           if not popens:
-              new_index=np.where(indices!=fcount)
-              ensemble2d = output2d[new_index] 
-              avg2d=np.average(ensemble2d,axis=0)
-              stddev2d=np.std(ensemble2d,axis=0,dtype=np.float64) 
-
-              flag2d = False
-              count2d = 0
-              count2d,ret_val=calc_Z(output2d[fcount].astype(np.float64),avg2d.astype(np.float64),stddev2d.astype(np.float64),count2d,flag2d)
-              Zscore=np.sum(np.square(ret_val))
-
-              if (count2d < npts2d):
-                Zscore2d[vcount,fcount]=np.sqrt(Zscore/(npts2d-count2d))
-              else:
-                print "WARNING: no variance in "+vname
-           else:#POP
-              rmask=this_file.variables['REGION_MASK']
-              Zscore=pop_zpdf(output2d[fcount],nbin,(minrange,maxrange),ens_avg2d[vcount],ens_stddev2d[vcount],data._FillValue,threshold,rmask,opts_dict)
-              Zscore2d[vcount,fcount,:]=Zscore[:]
+           rmask=this_file.variables['REGION_MASK']
+           Zscore=pop_zpdf(output2d[fcount],nbin,(minrange,maxrange),ens_avg2d[vcount],ens_stddev2d[vcount],data._FillValue,threshold,rmask,opts_dict)
+           Zscore2d[vcount,fcount,:]=Zscore[:]
      
     return Zscore3d,Zscore2d,ens_avg3d,ens_stddev3d,ens_avg2d,ens_stddev2d,gm3d,gm2d
 
+#
+# Ensemble mean and stddev of CAM variable vname at tslice, and for each
+# member the sum of its squared zscores against the other members and the
+# number of points where their stddev is below threshold (see calc_Z).
+# The members are read a chunk of columns (or latitudes) at a time, the mean
+# and stddev are accumulated over the members with Welford's algorithm.
+#
+def calc_ens_stats(o_files,vname,tslice,is3d,with_zscores=True,threshold=1e-12):
+    nfiles = len(o_files)
+    shape = tuple(o_files[0].variables[vname].shape[1:])
+    # Chunk along the first horizontal dimension: ncol (SE) or lat (FV)
+    haxis = 1 if is3d else 0
+    nrows = shape[haxis]
+    row_size = int(np.prod(shape))//nrows
+    rows_per_chunk = max(1,RMSZ_CHUNK_BYTES//(nfiles*row_size*_RMSZ_BYTES_PER_VALUE))
+
+    ens_avg = np.zeros(shape,dtype=np.float32)
+    ens_stddev = np.zeros(shape,dtype=np.float32)
+    zsum = np.zeros(nfiles,dtype=np.float64)
+    count = np.zeros(nfiles,dtype=np.int64)
+    for start in range(0,nrows,rows_per_chunk):
+        rows = [slice(None)]*len(shape)
+        rows[haxis] = slice(start,min(nrows,start+rows_per_chunk))
+        rows = tuple(rows)
+        members = None
+        for fcount,this_file in enumerate(o_files):
+            x = np.asarray(this_file.variables[vname][(tslice,)+rows],dtype=np.float32)
+            if members is None:
+                members = np.empty((nfiles,)+x.shape,dtype=np.float32)
+                mean = np.zeros(x.shape,dtype=np.float64)
+                m2 = np.zeros(x.shape,dtype=np.float64)
+            members[fcount] = x
+            delta = x - mean
+            mean += delta/(fcount+1)
+            m2 += delta*(x - mean)
+        ens_avg[rows] = mean
+        ens_stddev[rows] = np.sqrt(m2/nfiles)
+        if with_zscores and nfiles > 1:
+            chunk_zsum,chunk_count = calc_loo_zscores(members,mean,m2,threshold)
+            zsum += chunk_zsum
+            count += chunk_count
+
+    return ens_avg,ens_stddev,zsum,count
+
+#
+# For each member of members (along the first axis), whose mean is mean and
+# sum of squared deviations from it m2, the sum of the squared zscores of
+# the member against the mean and stddev of the other members, and the
+# number of points where that stddev is <= threshold (their zscore is 0).
+# The statistics of the other members are the ensemble's with the member
+# removed, rather than recomputed for each member.
+#
+def calc_loo_zscores(members,mean,m2,threshold=1e-12):
+    n = members.shape[0]
+    scale = float(n)/(n-1)
+    # Work in place, this runs on the largest arrays of calc_rmsz
+    dev = members - mean
+    stddev_loo = np.square(dev)
+    stddev_loo *= -scale
+    stddev_loo += m2
+    np.maximum(stddev_loo,0.,out=stddev_loo)
+
+    # Downdating loses precision where the other members vary much less than
+    # the whole ensemble (e.g. a single member differs), recompute those
+    inexact = stddev_loo < _LOO_RTOL*m2
+    stddev_loo /= (n-1)
+    np.sqrt(stddev_loo,out=stddev_loo)
+    for i in np.nonzero(inexact.reshape(n,-1).any(axis=1))[0]:
+        pts = inexact[i]
+        others = np.delete(members[:,pts],i,axis=0).astype(np.float64)
+        stddev_loo[i][pts] = np.std(others,axis=0)
+
+    valid = stddev_loo > threshold
+    dev *= scale
+    np.divide(dev,stddev_loo,out=dev,where=valid)
+    dev[~valid] = 0.
+    np.square(dev,out=dev)
+    zsum = np.sum(dev.reshape(n,-1),axis=1)
+    count = valid[0].size - np.sum(valid.reshape(n,-1),axis=1)
+    return zsum,count
+
+#
+# RMSZ scores of the members from their sums of squared zscores
+#
+def calc_rmsz_from_sums(zsum,count,npts,vname):
+    rmsz = np.zeros(len(zsum),dtype=np.float32)
+    for fcount in range(len(zsum)):
+        if (count[fcount] < npts):
+            rmsz[fcount]=np.sqrt(zsum[fcount]/(npts-count[fcount]))
+        else:
+            print "WARNING: no variance in "+vname
+    return rmsz
+
 #
 # Calculate pop zscore pass rate (ZPR) or pop zpdf values
 #
@@ -545,6 +605,21 @@ def area_avg(data_orig, weight, is_SE):
     return a
 
 
+#
+# Calculate weighted global means of all levels of CAM output at once
+#
+def area_avg_levels(data_orig, weight, is_SE):
+
+    data = np.asarray(data_orig, dtype=np.float64)
+    if (is_SE == True):
+        # data is (nlev,ncol)
+        a = np.dot(data, weight) / np.sum(weight)
+    else: #FV
+        # data is (nlev,nlat,nlon), weights are for lat
+        a = np.einsum('kjl,j->k', data, weight) / (np.sum(weight) * data.shape[-1])
+    return a
+
+
 #
 # Calculate weighted global mean for one level of OCN output
 #
@@ -738,27 +813,10 @@ def calc_global_mean_for_onefile(fname, area_wgt,var_name3d, var_name2d,output3d
             print "ERROR: "+vname+ " data contains NaNs - please check input."
             nan_flag = True
             continue
-        if (is_SE == True):
-            if not cumul: 
-               temp=data[tslice].shape[0]
-               gm_lev = np.zeros(temp)
-               for k in range(temp):
-                   gm_lev[k] = area_avg(data[tslice,k,:], area_wgt, is_SE)
-            else:
-               gm_lev = np.zeros(nlev)
-               for k in range(nlev):
-                   gm_lev[k] = area_avg(output3d[k,:], area_wgt, is_SE)
+        if not cumul:
+            gm_lev = area_avg_levels(data[tslice], area_wgt, is_SE)
         else:
-            if not cumul:
-               temp=data[tslice].shape[0]
-               gm_lev = np.zeros(temp)
-               for k in range(temp):
-                   gm_lev[k] = area_avg(data[tslice,k,:,:], area_wgt, is_SE)
-                #output3d[:,:,:] = data[tslice,:,:,:] 
-            else:
-               gm_lev=np.zeros(nlev)
-               for k in range(nlev):
-                   gm_lev[k] = area_avg(output3d[k,:,:], area_wgt, is_SE)
+            gm_lev = area_avg_levels(output3d[:nlev], area_wgt, is_SE)
         #note: averaging over levels should probably be pressure-weighted(TO DO)        
         gm3d[count] = np.mean(gm_lev)         
 